@@ -34,6 +34,9 @@ class Settings(BaseSettings):
         default="image/jpeg,image/png,image/webp,application/pdf",
         env="FILE_UPLOAD_ALLOWED_MIME",
     )
+    # Импорт каталога лекарств: строк в одной транзакции
+    medication_import_batch_size: int = Field(default=500, env="MEDICATION_IMPORT_BATCH_SIZE")
+
     file_download_token_ttl_seconds: int = Field(default=900, env="FILE_DOWNLOAD_TOKEN_TTL_SECONDS")
 
     # External API integration (ЛР4)
@@ -50,6 +53,41 @@ class Settings(BaseSettings):
     external_api_retry_count: int = Field(default=2, env="EXTERNAL_API_RETRY_COUNT")
     external_api_rate_limit_per_minute: int = Field(default=30, env="EXTERNAL_API_RATE_LIMIT_PER_MINUTE")
 
+    # Архивация приемов: строки старше N дней (целыми месяцами) переносятся в appointments_archive.
+    # В PostgreSQL с помесячным секционированием — отсоединением партиций; заранее создается N месяцев вперед.
+    appointments_archive_after_days: int = Field(default=365, env="APPOINTMENTS_ARCHIVE_AFTER_DAYS")
+    appointments_partitions_ahead_months: int = Field(default=3, env="APPOINTMENTS_PARTITIONS_AHEAD_MONTHS")
+
+    # Календарная ICS-подписка: скользящее окно в днях от сегодняшней даты
+    ics_feed_past_days: int = Field(default=7, env="ICS_FEED_PAST_DAYS")
+    ics_feed_ahead_days: int = Field(default=60, env="ICS_FEED_AHEAD_DAYS")
+
+    # Напоминания о приемах (для пользователей с sms_notifications): фоновая рассылка в процессе API
+    reminders_enabled: bool = Field(default=False, env="REMINDERS_ENABLED")
+    reminders_interval_seconds: float = Field(default=30.0, env="REMINDERS_INTERVAL_SECONDS")
+    # Насколько давние дозы досылаются после простоя; сколько раз повторяется неудачная отправка
+    reminders_max_catchup_seconds: float = Field(default=3600.0, env="REMINDERS_MAX_CATCHUP_SECONDS")
+    reminders_max_attempts: int = Field(default=5, env="REMINDERS_MAX_ATTEMPTS")
+    sms_gateway: str = Field(default="log", env="SMS_GATEWAY")
+
+    # Push-канал изменений приемов (SSE): брокер событий, размер очереди подписчика, интервал keep-alive
+    event_broker: str = Field(default="memory", env="EVENT_BROKER")
+    events_max_pending: int = Field(default=100, env="EVENTS_MAX_PENDING")
+    events_heartbeat_seconds: float = Field(default=15.0, env="EVENTS_HEARTBEAT_SECONDS")
+
+    # Кэш ответов GET (лекарства, профиль, семья, расписания): memory — LRU процесса; file — общий
+    # для воркеров каталог с LRU процесса перед ним; off — выключен. TTL — страховка от пропущенной инвалидации.
+    response_cache_backend: str = Field(default="memory", env="RESPONSE_CACHE_BACKEND")
+    response_cache_path: str = Field(default="./response_cache", env="RESPONSE_CACHE_PATH")
+    response_cache_max_entries: int = Field(default=2048, env="RESPONSE_CACHE_MAX_ENTRIES")
+    response_cache_ttl_seconds: float = Field(default=300.0, env="RESPONSE_CACHE_TTL_SECONDS")
+
+    # Логирование: уровень логгера "app" и доля DEBUG/INFO-трассировки по маршрутам
+    # (например "get_day_appointments=0.1,delete_appointment=1"); WARNING и выше пишутся всегда.
+    log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    trace_sample_rate: float = Field(default=1.0, env="TRACE_SAMPLE_RATE")
+    trace_sample_rates: str = Field(default="", env="TRACE_SAMPLE_RATES")
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
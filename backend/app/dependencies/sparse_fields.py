@@ -0,0 +1,24 @@
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+
+from app.utils.projection import parse_fields
+
+
+def sparse_fields(model: type[BaseModel]) -> Callable[..., Optional[tuple[str, ...]]]:
+    """Зависимость для параметра fields= (через запятую) с полями model; None — все поля."""
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=f"Вернуть только перечисленные поля: {', '.join(model.model_fields)}",
+            max_length=300,
+        ),
+    ) -> Optional[tuple[str, ...]]:
+        try:
+            return parse_fields(fields, model)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    return dependency
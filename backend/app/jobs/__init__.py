@@ -0,0 +1 @@
+"""Периодические задачи обслуживания (запуск по расписанию: cron / systemd timer / k8s CronJob)."""
@@ -0,0 +1,31 @@
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.appointment_archive import archive_cutoff, run_maintenance
+
+
+def main() -> None:
+    """
+    Перенести приемы старше APPOINTMENTS_ARCHIVE_AFTER_DAYS в appointments_archive
+    и (PostgreSQL с секционированием) заранее создать партиции на
+    APPOINTMENTS_PARTITIONS_AHEAD_MONTHS месяцев вперед. Запускать раз в сутки.
+    """
+    engine = create_engine(settings.database_url)
+    today = date.today()
+    with Session(engine) as db, db.begin():
+        moved, created = run_maintenance(
+            db,
+            today=today,
+            after_days=settings.appointments_archive_after_days,
+            months_ahead=settings.appointments_partitions_ahead_months,
+        )
+    print(f"[ARCHIVE] Перенесено в архив приемов до {archive_cutoff(today, settings.appointments_archive_after_days)}: {moved}")
+    if created is not None:
+        print(f"[ARCHIVE] Создано партиций: {', '.join(created) or 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Логирование приложения: уровни, выборочная трассировка по маршрутам и неблокирующий вывод.
+
+Записи логгеров "app.*" попадают в QueueHandler и пишутся в поток фоновым
+QueueListener, поэтому обработчик запроса не ждет синхронного I/O.
+DEBUG/INFO-записи с атрибутом route проходят с вероятностью из TRACE_SAMPLE_RATES;
+WARNING и выше не сэмплируются.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import IO, Optional
+
+from app.config import settings
+
+APP_LOGGER = "app"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """'get_day_appointments=0.1,delete_appointment=1' -> {'get_day_appointments': 0.1, ...}"""
+    rates = {}
+    for part in value.split(","):
+        name, sep, rate = part.partition("=")
+        if sep and name.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class RouteSamplingFilter(logging.Filter):
+    def __init__(self, rates: dict[str, float], default_rate: float = 1.0) -> None:
+        super().__init__()
+        self.rates = rates
+        self.default_rate = default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        route = getattr(record, "route", None)
+        if route is None:
+            return True
+        rate = self.rates.get(route, self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+def route_logger(name: str, route: str) -> logging.LoggerAdapter:
+    """Логгер маршрута: к каждой записи добавляется route для сэмплирования и фильтрации."""
+    return logging.LoggerAdapter(logging.getLogger(name), {"route": route})
+
+
+def configure_logging(stream: Optional[IO[str]] = None, level: Optional[str] = None) -> None:
+    """Настроить логгер "app" (повторный вызов перенастраивает вывод)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(
+        RouteSamplingFilter(parse_sample_rates(settings.trace_sample_rates), settings.trace_sample_rate)
+    )
+    logger = logging.getLogger(APP_LOGGER)
+    logger.handlers = [queue_handler]
+    logger.setLevel((level or settings.log_level).upper())
+    logger.propagate = False
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _listener is not None:
+        _listener.stop()
@@ -1,3 +1,5 @@
+import logging
+import time
 from datetime import date
 from pathlib import Path
 
@@ -9,6 +11,7 @@ from fastapi.responses import PlainTextResponse, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.config import settings
+from app.logging_setup import configure_logging
 from app.routers import (
     appointments,
     auth,
@@ -19,7 +22,12 @@ from app.routers import (
     schedules,
     users,
 )
-from app.database import Base, engine
+from app.database import Base, SessionLocal, engine
+from app.services.reminder_dispatcher import start_background_dispatcher, stop_background_dispatcher
+from app.services.sms_gateway import get_sms_gateway
+
+configure_logging()
+_request_log = logging.getLogger("app.requests")
 
 _SWAGGER_STATIC_DIR = Path(__file__).resolve().parent / "static" / "swagger-ui"
 
@@ -39,12 +47,35 @@ if _SWAGGER_STATIC_DIR.is_dir():
         name="swagger-ui-static",
     )
 
+@app.on_event("startup")
+async def start_reminders() -> None:
+    if settings.reminders_enabled:
+        start_background_dispatcher(
+            SessionLocal,
+            get_sms_gateway(),
+            settings.reminders_interval_seconds,
+            max_catchup_seconds=settings.reminders_max_catchup_seconds,
+            max_attempts=settings.reminders_max_attempts,
+        )
+
+
+@app.on_event("shutdown")
+async def stop_reminders() -> None:
+    await stop_background_dispatcher()
+
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
-        print(f"[REQUEST] {request.method} {request.url.path}")
-        print(f"[REQUEST] Headers: {dict(request.headers)}")
+        started = time.perf_counter()
         response = await call_next(request)
-        print(f"[REQUEST] Response status: {response.status_code}")
+        # Заголовки не логируются: в них Authorization и cookies
+        _request_log.info(
+            "%s %s -> %s (%.1f ms)",
+            request.method,
+            request.url.path,
+            response.status_code,
+            (time.perf_counter() - started) * 1000,
+        )
         return response
 
 app.add_middleware(LoggingMiddleware)
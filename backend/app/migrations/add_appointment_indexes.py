@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, inspect
+
+from app.config import settings
+from app.models import db_models
+
+
+def main() -> None:
+    """
+    Создать индексы таблицы appointments, объявленные в db_models, если их ещё нет.
+    create_all добавляет индексы только вместе с новой таблицей, поэтому для
+    существующих БД нужен этот скрипт.
+    """
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if "appointments" not in inspector.get_table_names():
+            print("[MIGRATION] Таблица appointments не найдена. Нечего мигрировать.")
+            return
+
+        existing = {ix["name"] for ix in inspector.get_indexes("appointments")}
+        for index in db_models.Appointment.__table__.indexes:
+            if index.unique:
+                # Уникальный индекс требует очистки дублей: python -m app.migrations.dedupe_appointments
+                continue
+            if index.name in existing:
+                print(f"[MIGRATION] Индекс {index.name} уже существует.")
+                continue
+            print(f"[MIGRATION] Создаем индекс {index.name}...")
+            index.create(bind=conn)
+        print("[MIGRATION] Индексы appointments в актуальном состоянии.")
+
+
+if __name__ == "__main__":
+    main()
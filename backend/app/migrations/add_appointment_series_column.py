@@ -0,0 +1,40 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.config import settings
+from app.database import Base
+from app.models import db_models
+
+
+def main() -> None:
+    """
+    Миграция для виртуальных курсов: создать таблицу appointment_series
+    и добавить в appointments колонку series_id (строки-исключения серии).
+    """
+    engine = create_engine(settings.database_url)
+
+    Base.metadata.create_all(bind=engine, tables=[db_models.AppointmentSeries.__table__])
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if "appointments" not in inspector.get_table_names():
+            print("[MIGRATION] Таблица appointments не найдена. Нечего мигрировать.")
+            return
+
+        columns = inspector.get_columns("appointments")
+        if any(col["name"] == "series_id" for col in columns):
+            print("[MIGRATION] Колонка series_id уже существует. Миграция не требуется.")
+            return
+
+        print("[MIGRATION] Добавляем колонку series_id в таблицу appointments...")
+        conn.execute(
+            text(
+                "ALTER TABLE appointments ADD COLUMN series_id INTEGER "
+                "REFERENCES appointment_series(id) ON DELETE CASCADE"
+            )
+        )
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_appointments_series_id ON appointments (series_id)"))
+        print("[MIGRATION] Колонка series_id успешно добавлена.")
+
+
+if __name__ == "__main__":
+    main()
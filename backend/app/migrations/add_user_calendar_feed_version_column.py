@@ -0,0 +1,30 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.config import settings
+
+
+def main() -> None:
+    """
+    Добавить в users колонку calendar_feed_version (версия ссылок на ICS-подписку), если ее нет.
+    Ссылки, выданные раньше, соответствуют версии 0 и продолжают работать до первой ротации.
+    """
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if "users" not in inspector.get_table_names():
+            print("[MIGRATION] Таблица users не найдена. Нечего мигрировать.")
+            return
+
+        columns = inspector.get_columns("users")
+        if any(col["name"] == "calendar_feed_version" for col in columns):
+            print("[MIGRATION] Колонка calendar_feed_version уже существует. Миграция не требуется.")
+            return
+
+        print("[MIGRATION] Добавляем колонку calendar_feed_version в таблицу users...")
+        conn.execute(text("ALTER TABLE users ADD COLUMN calendar_feed_version INTEGER NOT NULL DEFAULT 0"))
+        print("[MIGRATION] Колонка calendar_feed_version успешно добавлена.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.models import db_models
+from app.services.adherence import rebuild_rollups
+
+
+def main() -> None:
+    """
+    Создать таблицы adherence_daily / adherence_weekly и заполнить их по текущим
+    приемам (сохраненным строкам и виртуальным курсам) для каждого пользователя.
+    Повторный запуск пересчитывает счетчики с нуля.
+    """
+    engine = create_engine(settings.database_url)
+    Base.metadata.create_all(
+        bind=engine,
+        tables=[db_models.AdherenceDaily.__table__, db_models.AdherenceWeekly.__table__],
+    )
+
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        user_ids = [row[0] for row in session.query(db_models.User.id).order_by(db_models.User.id)]
+        for user_id in user_ids:
+            rebuild_rollups(session, user_id)
+            session.commit()
+            print(f"[MIGRATION] Rollup-таблицы пересчитаны для user_id={user_id}")
+        print(f"[MIGRATION] Готово, пользователей: {len(user_ids)}")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
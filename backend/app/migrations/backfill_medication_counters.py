@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Base
+from app.models import db_models
+
+
+def main() -> None:
+    """
+    Создать user_medication_counters и заполнить по текущему каталогу одним INSERT ... SELECT,
+    а также keyset-индексы medications (user_id, колонка сортировки, id), если их нет.
+    Одноколоночный ix_medications_user_id удаляется: его покрывает ix_medications_user_id_id.
+    Повторный запуск пересчитывает счетчики с нуля.
+    """
+    engine = create_engine(settings.database_url)
+    Base.metadata.create_all(bind=engine, tables=[db_models.UserMedicationCounter.__table__])
+
+    med = db_models.Medication
+    counters = db_models.UserMedicationCounter.__table__
+    with Session(engine) as db, db.begin():
+        db.execute(text("DROP INDEX IF EXISTS ix_medications_user_id"))
+        for index in med.__table__.indexes:
+            index.create(bind=db.connection(), checkfirst=True)
+        db.execute(counters.delete())
+        filled = db.execute(
+            insert(counters).from_select(
+                ["user_id", "count"],
+                select(med.user_id, func.count()).group_by(med.user_id),
+            )
+        ).rowcount
+        print(f"[MIGRATION] Счетчики лекарств заполнены для пользователей: {filled}")
+
+
+if __name__ == "__main__":
+    main()
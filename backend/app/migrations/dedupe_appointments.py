@@ -0,0 +1,65 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+
+from app.config import settings
+from app.models import db_models
+from app.services.adherence import rebuild_rollups
+
+# Из группы дублей остается строка с отмеченным статусом (taken/skipped), затем — с меньшим id
+_DUPLICATES_SQL = """
+    SELECT id, user_id FROM (
+        SELECT id, user_id, ROW_NUMBER() OVER (
+            PARTITION BY user_id, medication_id, COALESCE(family_member_id, 0), date, time
+            ORDER BY CASE WHEN status = 'pending' THEN 1 ELSE 0 END, id
+        ) AS rn
+        FROM appointments
+    ) ranked
+    WHERE rn > 1
+"""
+
+
+def _dose_index():
+    return next(ix for ix in db_models.Appointment.__table__.indexes if ix.name == "uq_appointments_dose")
+
+
+def main() -> None:
+    """
+    Удалить дубликаты приемов (одинаковые пользователь, лекарство, член семьи, дата и время)
+    и создать уникальный индекс uq_appointments_dose. Rollup-таблицы затронутых
+    пользователей пересчитываются.
+    """
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if "appointments" not in inspector.get_table_names():
+            print("[MIGRATION] Таблица appointments не найдена. Нечего мигрировать.")
+            return
+
+        duplicates = conn.execute(text(_DUPLICATES_SQL)).all()
+        affected_users = sorted({user_id for _, user_id in duplicates})
+        ids = [row_id for row_id, _ in duplicates]
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start : start + 1000]
+            conn.execute(db_models.Appointment.__table__.delete().where(db_models.Appointment.id.in_(chunk)))
+        print(f"[MIGRATION] Удалено дубликатов: {len(ids)}")
+
+        # Индекс по выражению не отражается инспектором SQLite, поэтому IF NOT EXISTS
+        print("[MIGRATION] Создаем индекс uq_appointments_dose (если его нет)...")
+        conn.execute(CreateIndex(_dose_index(), if_not_exists=True))
+
+    if not affected_users:
+        return
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        for user_id in affected_users:
+            rebuild_rollups(session, user_id)
+            session.commit()
+            print(f"[MIGRATION] Rollup-таблицы пересчитаны для user_id={user_id}")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from datetime import date
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import db_models
+from app.services.appointment_archive import (
+    DEFAULT_PARTITION,
+    create_dose_index,
+    ensure_month_partitions,
+    is_partitioned,
+    month_start,
+    next_month,
+)
+
+_LEGACY_TABLE = "appointments_unpartitioned"
+
+
+def main() -> None:
+    """
+    PostgreSQL: преобразовать appointments в таблицу, секционированную по месяцам (RANGE по date).
+    Старая таблица переименовывается, строки копируются в партиции одним INSERT ... SELECT,
+    затем старая таблица удаляется. Первичный ключ становится (id, date) — ключ секционирования
+    обязан входить в уникальные ограничения; id по-прежнему берется из той же последовательности.
+    Выполняется в одной транзакции; на время миграции приложение стоит остановить.
+    """
+    engine = create_engine(settings.database_url)
+    if engine.dialect.name != "postgresql":
+        print("[MIGRATION] Секционирование поддерживается только для PostgreSQL. Пропускаем.")
+        return
+
+    with Session(engine) as db, db.begin():
+        if "appointments" not in inspect(db.connection()).get_table_names():
+            print("[MIGRATION] Таблица appointments не найдена. Нечего мигрировать.")
+            return
+        if is_partitioned(db):
+            print("[MIGRATION] Таблица appointments уже секционирована.")
+            return
+
+        sequence = db.execute(text("SELECT pg_get_serial_sequence('appointments', 'id')")).scalar_one()
+        bounds = db.execute(text("SELECT min(date), max(date) FROM appointments")).one()
+
+        print("[MIGRATION] Создаем секционированную таблицу appointments...")
+        db.execute(text(f"ALTER TABLE appointments RENAME TO {_LEGACY_TABLE}"))
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        db.execute(
+            text(
+                f"""
+                CREATE TABLE appointments (
+                    id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+                    user_id INTEGER NOT NULL,
+                    medication_id INTEGER NOT NULL,
+                    family_member_id INTEGER,
+                    date DATE NOT NULL,
+                    time TIME WITHOUT TIME ZONE NOT NULL,
+                    status VARCHAR,
+                    series_id INTEGER
+                ) PARTITION BY RANGE (date)
+                """
+            )
+        )
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY appointments.id"))
+        db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF appointments DEFAULT"))
+        create_dose_index(db, DEFAULT_PARTITION)
+
+        today = month_start(date.today())
+        first = month_start(bounds[0]) if bounds[0] else today
+        last = today
+        for _ in range(settings.appointments_partitions_ahead_months):
+            last = next_month(last)
+        if bounds[1] and month_start(bounds[1]) > last:
+            last = month_start(bounds[1])
+        created = ensure_month_partitions(db, first, last)
+        print(f"[MIGRATION] Создано партиций: {len(created)} ({first:%Y-%m} .. {last:%Y-%m})")
+
+        moved = db.execute(
+            text(
+                "INSERT INTO appointments (id, user_id, medication_id, family_member_id, date, time, status, series_id) "
+                f"SELECT id, user_id, medication_id, family_member_id, date, time, status, series_id FROM {_LEGACY_TABLE}"
+            )
+        ).rowcount
+        print(f"[MIGRATION] Перенесено строк: {moved}")
+        db.execute(text(f"DROP TABLE {_LEGACY_TABLE}"))
+
+        db.execute(text("ALTER TABLE appointments ADD PRIMARY KEY (id, date)"))
+        db.execute(text("ALTER TABLE appointments ADD FOREIGN KEY (user_id) REFERENCES users (id)"))
+        db.execute(text("ALTER TABLE appointments ADD FOREIGN KEY (medication_id) REFERENCES medications (id)"))
+        db.execute(text("ALTER TABLE appointments ADD FOREIGN KEY (family_member_id) REFERENCES family_members (id)"))
+        db.execute(
+            text(
+                "ALTER TABLE appointments ADD FOREIGN KEY (series_id) "
+                "REFERENCES appointment_series (id) ON DELETE CASCADE"
+            )
+        )
+        # Обычные индексы создаются на родительской таблице и наследуются партициями;
+        # уникальность дозы — индексами на каждой партиции (create_dose_index)
+        for index in db_models.Appointment.__table__.indexes:
+            if not index.unique:
+                index.create(bind=db.connection())
+        db.execute(text("ANALYZE appointments"))
+        print("[MIGRATION] Таблица appointments секционирована по месяцам.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import db_models
+from app.services.medication_search import rebuild_search_index
+
+
+def main() -> None:
+    """
+    Индекс полнотекстового поиска по лекарствам для существующей БД.
+    SQLite: создать FTS5-таблицу medications_fts с триггерами и заполнить ее из medications.
+    PostgreSQL: включить pg_trgm и создать GIN-индексы ix_medications_search (tsvector),
+    ix_medications_quantity_trgm / ix_medications_dosage_trgm и индекс (user_id, id), если их нет.
+    Повторный запуск безопасен; для SQLite он же перестраивает индекс заново.
+    """
+    engine = create_engine(settings.database_url)
+
+    with Session(engine) as db, db.begin():
+        if "medications" not in inspect(db.connection()).get_table_names():
+            print("[MIGRATION] Таблица medications не найдена. Нечего мигрировать.")
+            return
+        if engine.dialect.name == "postgresql":
+            db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for index in db_models.Medication.__table__.indexes:
+            # checkfirst пропускает существующие, ddl_if — индексы другого диалекта
+            index.create(bind=db.connection(), checkfirst=True)
+        if engine.dialect.name == "sqlite":
+            print("[MIGRATION] Перестраиваем medications_fts...")
+            rebuild_search_index(db)
+        count = db.query(db_models.Medication).count()
+        print(f"[MIGRATION] Индекс поиска по лекарствам готов (строк: {count}).")
+
+
+if __name__ == "__main__":
+    main()
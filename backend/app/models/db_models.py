@@ -1,6 +1,7 @@
 from datetime import date, datetime, timezone
 
-from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String, Time, DateTime
+from sqlalchemy import DDL, Boolean, Column, Date, ForeignKey, Index, Integer, String, Time, DateTime, event, func, text
+from sqlalchemy.dialects import postgresql  # noqa: F401 — регистрирует func.to_tsvector для PostgreSQL
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -17,6 +18,8 @@ class User(Base):
     # Роль пользователя в системе (RBAC)
     # Возможные значения: "user" (по умолчанию), "admin"
     role = Column(String, nullable=False, default="user")
+    # Версия ссылок на ICS-подписку: входит в токен ленты, увеличение отзывает все выданные ссылки
+    calendar_feed_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     family_members = relationship("FamilyMember", back_populates="user", cascade="all, delete")
     medications = relationship("Medication", back_populates="user", cascade="all, delete")
@@ -35,6 +38,7 @@ class FamilyMember(Base):
     user = relationship("User", back_populates="family_members")
     schedules = relationship("Schedule", back_populates="family_member", cascade="all, delete")
     appointments = relationship("Appointment", back_populates="family_member", cascade="all, delete")
+    appointment_series = relationship("AppointmentSeries", back_populates="family_member", cascade="all, delete")
 
 
 class Medication(Base):
@@ -50,6 +54,7 @@ class Medication(Base):
 
     user = relationship("User", back_populates="medications")
     appointments = relationship("Appointment", back_populates="medication", cascade="all, delete")
+    appointment_series = relationship("AppointmentSeries", back_populates="medication", cascade="all, delete")
     schedules = relationship("Schedule", back_populates="medication", cascade="all, delete")
     files = relationship(
         "MedicationFile",
@@ -57,6 +62,81 @@ class Medication(Base):
         cascade="all, delete-orphan",
     )
 
+    # Keyset-страницы списка: (user_id, колонка сортировки, id) — одно чтение диапазона на страницу
+    __table_args__ = (
+        Index("ix_medications_user_id_id", "user_id", "id"),
+        Index("ix_medications_user_name_id", "user_id", "name", "id"),
+        Index("ix_medications_user_dosage_id", "user_id", "dosage", "id"),
+        Index("ix_medications_user_quantity_id", "user_id", "quantity", "id"),
+    )
+
+
+def medication_search_vector():
+    """
+    PostgreSQL: tsvector полнотекстового поиска по лекарству (название > дозировка > описание).
+    Конфигурация и веса — литералы: выражение запроса должно совпадать с выражением GIN-индекса.
+    """
+    config = text("'simple'::regconfig")
+
+    def part(column, weight: str):
+        return func.setweight(func.to_tsvector(config, func.coalesce(column, text("''"))), text(f"'{weight}'"))
+
+    return (
+        part(Medication.name, "A")
+        .op("||")(part(Medication.dosage, "B"))
+        .op("||")(part(Medication.description, "C"))
+    )
+
+
+Index("ix_medications_search", medication_search_vector(), postgresql_using="gin").ddl_if(dialect="postgresql")
+
+# PostgreSQL: триграммные индексы (pg_trgm) для фильтров-подстрок quantity_contains / dosage_contains —
+# ILIKE '%...%' использует их вместо последовательного сканирования
+for _column in ("quantity", "dosage"):
+    Index(
+        f"ix_medications_{_column}_trgm",
+        Medication.__table__.c[_column],
+        postgresql_using="gin",
+        postgresql_ops={_column: "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+event.listen(
+    Medication.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+# SQLite: внешний FTS5-индекс (триграммы — поиск подстрок без учета регистра) синхронизируется триггерами,
+# поэтому любая запись в medications (CRUD, импорт, каскадное удаление) сразу видна в поиске.
+# quantity в поиск q не входит, но индексируется для фильтра quantity_contains (запрос с фильтром по колонке).
+MEDICATIONS_FTS_COLUMNS = ("name", "dosage", "description", "quantity")
+_FTS_COLUMNS = ", ".join(MEDICATIONS_FTS_COLUMNS)
+_FTS_NEW = ", ".join(f"new.{c}" for c in MEDICATIONS_FTS_COLUMNS)
+_FTS_OLD = ", ".join(f"old.{c}" for c in MEDICATIONS_FTS_COLUMNS)
+MEDICATIONS_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS medications_fts USING fts5("
+    f"{_FTS_COLUMNS}, content='medications', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS medications_fts_ai AFTER INSERT ON medications BEGIN "
+    f"INSERT INTO medications_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW}); END",
+    "CREATE TRIGGER IF NOT EXISTS medications_fts_ad AFTER DELETE ON medications BEGIN "
+    f"INSERT INTO medications_fts(medications_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD}); END",
+    f"CREATE TRIGGER IF NOT EXISTS medications_fts_au AFTER UPDATE OF {_FTS_COLUMNS} ON medications BEGIN "
+    f"INSERT INTO medications_fts(medications_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD}); "
+    f"INSERT INTO medications_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW}); END",
+]
+MEDICATIONS_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS medications_fts_ai",
+    "DROP TRIGGER IF EXISTS medications_fts_ad",
+    "DROP TRIGGER IF EXISTS medications_fts_au",
+    "DROP TABLE IF EXISTS medications_fts",
+]
+for _statement in MEDICATIONS_FTS_DDL:
+    event.listen(Medication.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(
+    Medication.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS medications_fts").execute_if(dialect="sqlite"),
+)
+
 
 class MedicationFile(Base):
     __tablename__ = "medication_files"
@@ -75,6 +155,22 @@ class MedicationFile(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Дневной вид: WHERE user_id = ? AND date = ? AND family_member_id = ? / IS NULL
+        Index("ix_appointments_user_date_member", "user_id", "date", "family_member_id"),
+        # Keyset-список за диапазон: WHERE user_id = ? AND (date, time, id) > курсора ORDER BY date, time, id.
+        # В PostgreSQL колонки фильтров включены в индекс (index-only scan)
+        Index(
+            "ix_appointments_user_date_time_id",
+            "user_id",
+            "date",
+            "time",
+            "id",
+            postgresql_include=["status", "medication_id", "family_member_id", "series_id"],
+        ),
+        # Рассылка напоминаний: WHERE status = 'pending' AND (date, time) в окне тика
+        Index("ix_appointments_due", "status", "date", "time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -83,10 +179,69 @@ class Appointment(Base):
     date = Column(Date, nullable=False)
     time = Column(Time, nullable=False)
     status = Column(String, default="pending")
+    # Для виртуальных курсов: строка-исключение (статус отличается от pending) для дозы серии
+    series_id = Column(Integer, ForeignKey("appointment_series.id", ondelete="CASCADE"), nullable=True, index=True)
 
     medication = relationship("Medication", back_populates="appointments")
     family_member = relationship("FamilyMember", back_populates="appointments")
     user = relationship("User")
+    series = relationship("AppointmentSeries", back_populates="exceptions")
+
+
+# Идентичность дозы: одна строка на (пользователь, лекарство, член семьи, дата, время).
+# NULL family_member_id (сам пользователь) сводится к 0, иначе NULL-ы не считались бы равными.
+Index(
+    "uq_appointments_dose",
+    Appointment.user_id,
+    Appointment.medication_id,
+    func.coalesce(Appointment.family_member_id, 0),
+    Appointment.date,
+    Appointment.time,
+    unique=True,
+)
+
+
+class AppointmentArchive(Base):
+    """
+    Холодный архив приемов старше APPOINTMENTS_ARCHIVE_AFTER_DAYS (см. app.jobs.archive_appointments).
+    Без внешних ключей: архив переживает удаление лекарств и членов семьи.
+    """
+
+    __tablename__ = "appointments_archive"
+    __table_args__ = (Index("ix_appointments_archive_user_date", "user_id", "date"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    medication_id = Column(Integer, nullable=False)
+    family_member_id = Column(Integer, nullable=True)
+    date = Column(Date, nullable=False)
+    time = Column(Time, nullable=False)
+    status = Column(String, nullable=True)
+    series_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+
+class AppointmentSeries(Base):
+    """
+    Правило повторения курса (режим virtual): приемы не хранятся построчно,
+    а разворачиваются на лету для запрошенного окна дат.
+    """
+
+    __tablename__ = "appointment_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    family_member_id = Column(Integer, ForeignKey("family_members.id"), nullable=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    period_type = Column(String, nullable=False)
+    # Времена приема через запятую, HH:MM
+    times = Column(String, nullable=False)
+
+    medication = relationship("Medication", back_populates="appointment_series")
+    family_member = relationship("FamilyMember", back_populates="appointment_series")
+    exceptions = relationship("Appointment", back_populates="series", cascade="all, delete", passive_deletes=True)
 
 
 class Schedule(Base):
@@ -114,6 +269,89 @@ class TimeSlot(Base):
     schedule = relationship("Schedule", back_populates="time_slots")
 
 
+class UserDataVersion(Base):
+    """
+    Версия данных приемов пользователя: увеличивается при каждом изменении,
+    служит ключом кэша отчетов и ETag без обращения к таблице appointments.
+    """
+
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
+
+class ReminderDispatchState(Base):
+    """
+    Состояние рассылки напоминаний (одна строка): до какого момента дозы уже поставлены в очередь
+    и какой процесс сейчас рассылает (аренда до lease_until).
+    """
+
+    __tablename__ = "reminder_dispatch_state"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+
+
+class ReminderOutbox(Base):
+    """Напоминание, поставленное в очередь и еще не доставленное; неудачные отправки повторяются."""
+
+    __tablename__ = "reminder_outbox"
+
+    id = Column(Integer, primary_key=True)
+    phone = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+    # Конец окна, в котором наступили дозы: устаревшие напоминания не досылаются
+    due_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+
+
+class UserMedicationCounter(Base):
+    """
+    Число лекарств в каталоге пользователя: поддерживается при создании и удалении,
+    чтобы total в списке не требовал COUNT(*) по medications.
+    """
+
+    __tablename__ = "user_medication_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AdherenceDaily(Base):
+    """
+    Дневные счетчики приемов по статусам (rollup), обновляются инкрементально
+    в той же транзакции, что и изменения appointments.
+    member_key = family_member_id или 0 для самого пользователя (NULL нельзя в первичном ключе).
+    """
+
+    __tablename__ = "adherence_daily"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    member_key = Column(Integer, primary_key=True, default=0)
+    date = Column(Date, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    pending = Column(Integer, nullable=False, default=0)
+    taken = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+
+
+class AdherenceWeekly(Base):
+    """Недельные счетчики (week_start — понедельник), ведутся вместе с AdherenceDaily."""
+
+    __tablename__ = "adherence_weekly"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    member_key = Column(Integer, primary_key=True, default=0)
+    week_start = Column(Date, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    pending = Column(Integer, nullable=False, default=0)
+    taken = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+
+
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
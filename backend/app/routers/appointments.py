@@ -1,22 +1,144 @@
-from datetime import date, datetime, timedelta
+import json
+from datetime import date, timedelta
 from typing import Optional
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 
+from app.config import settings
 from app.database import get_db
+from app.logging_setup import route_logger
 from app.dependencies.auth import get_current_user
+from app.dependencies.medication_scope import resolve_target_user_id
 from app.models import db_models
 from app.schemas.appointments import (
+    AdherenceTrendPoint,
+    AdherenceTrendsResponse,
     AppointmentsCalendarResponse,
+    AppointmentsPageResponse,
     AppointmentResponse,
+    BatchStatusItemResult,
+    BatchUpdateAppointmentStatusRequest,
+    BatchUpdateAppointmentStatusResponse,
+    CalendarDaySummary,
+    CalendarFeedUrlResponse,
+    CalendarMemberSummary,
+    CourseOperationResponse,
+    CourseScopeRequest,
     CreateAppointmentRequest,
+    CreateAppointmentsSummaryResponse,
     DailyAppointmentsResponse,
+    ShiftCourseRequest,
     UpdateAppointmentStatusRequest,
 )
+from app.services.adherence import AdherenceDelta, member_key, week_start
+from app.services.appointment_calendar import STATUSES, calendar_window, count_by_day
+from app.services.appointment_course_ops import (
+    CourseScope,
+    DoseConflictError,
+    delete_pending_doses,
+    shift_future_doses,
+)
+from app.services.appointment_generation import (
+    PERIOD_STEPS,
+    build_appointment_rows,
+    bulk_insert_appointments,
+    parse_times,
+)
+from app.services.appointment_occurrences import (
+    ALL_MEMBERS,
+    Occurrence,
+    is_series_occurrence,
+    iter_occurrences,
+    merge_occurrences,
+    stored_occurrence,
+)
+from app.services.appointment_range import RangeCursor, page_occurrences
+from app.services.data_version import bump_data_version, get_data_version
+from app.services.event_broker import get_event_broker, publish_appointments_changed, publish_event
+from app.services.ics_feed import (
+    feed_cache,
+    feed_etag,
+    feed_window,
+    get_feed_version,
+    iter_feed_events,
+    render_calendar,
+    rotate_feed_version,
+)
+from app.services.pdf_report import (
+    MAX_CACHED_REPORT_BYTES,
+    format_appointment_line,
+    render_appointments_pdf,
+    report_cache,
+)
+from app.utils.file_token import create_calendar_feed_token, parse_calendar_feed_token
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 
+_day_log = route_logger(__name__, "get_day_appointments")
+_status_log = route_logger(__name__, "update_appointment_status")
+_delete_log = route_logger(__name__, "delete_appointment")
+
+
+def _occurrence_response(o: Occurrence) -> AppointmentResponse:
+    return AppointmentResponse(
+        id=o.id,
+        medication_id=o.medication_id,
+        medication_name=o.medication_name,
+        date=o.date,
+        time=o.time.strftime("%H:%M"),
+        status=o.status,
+        family_member_id=o.family_member_id,
+        series_id=o.series_id,
+    )
+
+
+def _status_counts(model, statuses: dict[str, int], **extra):
+    return model(
+        total=sum(statuses.values()),
+        pending=statuses.get("pending", 0),
+        taken=statuses.get("taken", 0),
+        skipped=statuses.get("skipped", 0),
+        **extra,
+    )
+
+
+# События push-канала (/appointments/events) публикуются после commit
+async def _publish_created(user_id: int, summary: CreateAppointmentsSummaryResponse) -> None:
+    await publish_event(
+        user_id,
+        {
+            "type": "appointments.created",
+            "medication_id": summary.medication_id,
+            "family_member_id": summary.family_member_id,
+            "start_date": summary.start_date.isoformat(),
+            "end_date": summary.end_date.isoformat(),
+            "series_id": summary.series_id,
+        },
+    )
+
+
+async def _publish_updated(user_id: int, appointments: list[AppointmentResponse]) -> None:
+    if appointments:
+        await publish_event(
+            user_id,
+            {"type": "appointment.updated", "appointments": [a.model_dump(mode="json") for a in appointments]},
+        )
+
+
+async def _publish_changed(user_id: int, request: CourseScopeRequest) -> None:
+    await publish_appointments_changed(
+        user_id,
+        medication_id=request.medication_id,
+        family_member_id=None if request.all_members else request.family_member_id,
+        start_date=request.start_date,
+        end_date=request.end_date,
+    )
+
 
 @router.get("/calendar", response_model=AppointmentsCalendarResponse)
 async def get_appointments_calendar(
@@ -24,13 +146,15 @@ async def get_appointments_calendar(
     selected_date: Optional[date] = None,
     view_type: str = Query("month", description="month/week"),
     selected_family_member: Optional[int] = None,
+    breakdown_by_member: bool = Query(False, description="Разбивка дневных счетчиков по членам семьи"),
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
 ):
     """
     Получить календарь приемов
-    view_type: month (месяц) или week (неделя)
+    view_type: month (месяц) или week (неделя) — days содержит счетчики по каждому дню окна
     selected_family_member: ID члена семьи для отображения его приемов
+    appointments — приемы на selected_date
     """
     if view_type not in {"month", "week"}:
         raise HTTPException(
@@ -41,6 +165,7 @@ async def get_appointments_calendar(
     target_user_id = user_id or current_user.id
     appointments = (
         db.query(db_models.Appointment)
+        .options(joinedload(db_models.Appointment.medication))
         .filter(db_models.Appointment.user_id == target_user_id)
         .filter(db_models.Appointment.date == current)
         .filter(
@@ -50,25 +175,166 @@ async def get_appointments_calendar(
         )
         .all()
     )
-    total = len(appointments)
-    completed = len([a for a in appointments if a.status == "taken"])
+    occurrences = merge_occurrences(
+        db,
+        user_id=target_user_id,
+        start=current,
+        end=current,
+        stored=appointments,
+        family_member_id=selected_family_member if selected_family_member else ALL_MEMBERS,
+    )
+    total = len(occurrences)
+    completed = len([o for o in occurrences if o.status == "taken"])
+
+    range_start, range_end = calendar_window(current, view_type)
+    counts = count_by_day(
+        db,
+        user_id=target_user_id,
+        start=range_start,
+        end=range_end,
+        family_member_id=selected_family_member if selected_family_member else ALL_MEMBERS,
+    )
+    per_day: dict = {}
+    for (day, member_id), statuses in counts.items():
+        per_day.setdefault(day, []).append(_status_counts(CalendarMemberSummary, statuses, family_member_id=member_id))
+    days = []
+    day = range_start
+    while day <= range_end:
+        members = sorted(per_day.get(day, []), key=lambda m: (m.family_member_id is not None, m.family_member_id or 0))
+        summary = CalendarDaySummary(date=day, members=members if breakdown_by_member else None)
+        for member in members:
+            summary.total += member.total
+            summary.pending += member.pending
+            summary.taken += member.taken
+            summary.skipped += member.skipped
+        days.append(summary)
+        day += timedelta(days=1)
+
     return AppointmentsCalendarResponse(
         current_date=current,
         selected_date=current,
         total_appointments=total,
         completed_today=f"{completed}/{total or 0}",
-        appointments=[
-            AppointmentResponse(
-                id=a.id,
-                medication_id=a.medication_id,
-                medication_name=a.medication.name if a.medication else "",
-                date=a.date,
-                time=a.time.strftime("%H:%M"),
-                status=a.status,
-                family_member_id=a.family_member_id,
+        appointments=[_occurrence_response(o) for o in occurrences],
+        view_type=view_type,
+        range_start=range_start,
+        range_end=range_end,
+        days=days,
+    )
+
+
+@router.get("/adherence/trends", response_model=AdherenceTrendsResponse)
+async def get_adherence_trends(
+    start_date: date,
+    end_date: date,
+    granularity: str = Query("day", description="day/week"),
+    family_member_id: Optional[int] = Query(None, description="ID члена семьи (без него — сам пользователь)"),
+    all_members: bool = Query(False, description="Суммировать по пользователю и всем членам семьи"),
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Динамика соблюдения режима по дням или неделям
+    Читает только rollup-таблицы adherence_daily / adherence_weekly, без обхода appointments
+    """
+    if granularity not in {"day", "week"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="granularity должен быть day или week",
+        )
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date позже end_date")
+    if granularity == "day":
+        model, period = db_models.AdherenceDaily, db_models.AdherenceDaily.date
+    else:
+        model, period = db_models.AdherenceWeekly, db_models.AdherenceWeekly.week_start
+        start_date = week_start(start_date)
+
+    query = (
+        db.query(
+            period,
+            func.sum(model.total),
+            func.sum(model.pending),
+            func.sum(model.taken),
+            func.sum(model.skipped),
+        )
+        .filter(model.user_id == current_user.id)
+        .filter(period >= start_date, period <= end_date)
+    )
+    if not all_members:
+        query = query.filter(model.member_key == member_key(family_member_id))
+    rows = query.group_by(period).order_by(period).all()
+
+    points = []
+    for period_start, total, pending, taken, skipped in rows:
+        if not total:
+            continue
+        resolved = taken + skipped
+        points.append(
+            AdherenceTrendPoint(
+                period_start=period_start,
+                total=total,
+                pending=pending,
+                taken=taken,
+                skipped=skipped,
+                adherence=round(taken / resolved, 4) if resolved else None,
             )
-            for a in appointments
-        ],
+        )
+    return AdherenceTrendsResponse(
+        granularity=granularity,
+        start_date=start_date,
+        end_date=end_date,
+        points=points,
+    )
+
+
+@router.get("/range", response_model=AppointmentsPageResponse)
+async def list_appointments_range(
+    start_date: date,
+    end_date: date,
+    status_filter: Optional[str] = Query(None, alias="status", description="pending/taken/skipped"),
+    medication_id: Optional[int] = Query(None, description="ID лекарства"),
+    family_member_id: Optional[int] = Query(None, description="ID члена семьи (без него — сам пользователь)"),
+    all_members: bool = Query(False, description="Приемы пользователя и всех членов семьи"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Приемы за диапазон дат постранично в порядке (date, time, id)
+    Пагинация по курсору (keyset), а не OFFSET: стоимость страницы не зависит от ее номера.
+    """
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date позже end_date")
+    if status_filter is not None and status_filter not in STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="status должен быть pending, taken или skipped",
+        )
+    after = None
+    if cursor:
+        try:
+            after = RangeCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор")
+
+    occurrences, next_cursor = page_occurrences(
+        db,
+        user_id=current_user.id,
+        start=start_date,
+        end=end_date,
+        limit=limit,
+        after=after,
+        status=status_filter,
+        medication_id=medication_id,
+        family_member_id=ALL_MEMBERS if all_members else family_member_id,
+    )
+    return AppointmentsPageResponse(
+        items=[_occurrence_response(o) for o in occurrences],
+        limit=limit,
+        next_cursor=next_cursor.encode() if next_cursor else None,
+        has_more=next_cursor is not None,
     )
 
 
@@ -85,102 +351,65 @@ async def get_day_appointments(
     """
     target_user_id = user_id or current_user.id
     
-    # КРИТИЧЕСКОЕ ЛОГИРОВАНИЕ - должно появиться при каждом запросе
-    print("=" * 80)
-    print(f"[CRITICAL] get_day_appointments CALLED")
-    print(f"[CRITICAL] date={date}, user_id={target_user_id}")
-    print(f"[CRITICAL] family_member_id={family_member_id}, type={type(family_member_id)}")
-    print(f"[CRITICAL] family_member_id is None: {family_member_id is None}")
-    print(f"[CRITICAL] family_member_id == None: {family_member_id == None}")
-    print("=" * 80)
-    
-    # СНАЧАЛА получаем ВСЕ назначения для пользователя и даты
-    # Затем фильтруем на уровне Python для гарантии правильной работы
-    all_appointments = db.query(db_models.Appointment).filter(
-        db_models.Appointment.user_id == target_user_id
-    ).filter(
-        db_models.Appointment.date == date
-    ).all()
-    
-    print(f"[DEBUG] SQL query returned {len(all_appointments)} appointments (before family_member_id filter)")
-    
-    # ФИЛЬТРАЦИЯ НА УРОВНЕ PYTHON - это гарантирует правильную работу
-    appointments = []
+    _day_log.debug("date=%s user_id=%s family_member_id=%s", date, target_user_id, family_member_id)
+
+    # Фильтр по члену семьи выполняется в SQL (индекс user_id, date, family_member_id):
+    # без family_member_id — только приемы самого пользователя (family_member_id IS NULL)
+    query = (
+        db.query(db_models.Appointment)
+        .options(joinedload(db_models.Appointment.medication))
+        .filter(db_models.Appointment.user_id == target_user_id)
+        .filter(db_models.Appointment.date == date)
+    )
     if family_member_id is not None:
-        # Если передан family_member_id, фильтруем по нему
-        print(f"[DEBUG] Filtering by family_member_id={family_member_id}")
-        for apt in all_appointments:
-            if apt.family_member_id == family_member_id:
-                appointments.append(apt)
-            else:
-                print(f"[DEBUG] Skipping appointment {apt.id} (family_member_id={apt.family_member_id} != {family_member_id})")
+        query = query.filter(db_models.Appointment.family_member_id == family_member_id)
     else:
-        # Если family_member_id не передан, показываем только приемы без привязки к члену семьи (для главного пользователя)
-        print(f"[DEBUG] Filtering by family_member_id IS NULL (family_member_id was not provided)")
-        for apt in all_appointments:
-            if apt.family_member_id is None:
-                appointments.append(apt)
-            else:
-                print(f"[DEBUG] Skipping appointment {apt.id} (family_member_id={apt.family_member_id} is not None)")
-    
-    print(f"[DEBUG] After Python filter: {len(appointments)} appointments")
-    for apt in appointments:
-        print(f"[DEBUG] Appointment {apt.id}: family_member_id={apt.family_member_id}, medication={apt.medication.name if apt.medication else 'None'}")
-    
-    # ФИНАЛЬНАЯ ПРОВЕРКА - убеждаемся, что фильтрация работает правильно
-    if family_member_id is None:
-        # Для главного пользователя - проверяем, что все назначения имеют family_member_id = None
-        invalid_appointments = [apt for apt in appointments if apt.family_member_id is not None]
-        if invalid_appointments:
-            print(f"[ERROR] CRITICAL: Found {len(invalid_appointments)} appointments with non-null family_member_id for main user!")
-            for apt in invalid_appointments:
-                print(f"[ERROR] Appointment {apt.id} has family_member_id={apt.family_member_id}")
-            # Удаляем невалидные назначения
-            appointments = [apt for apt in appointments if apt.family_member_id is None]
-            print(f"[ERROR] Fixed: Now returning {len(appointments)} appointments")
-    
+        query = query.filter(db_models.Appointment.family_member_id.is_(None))
+    appointments = query.all()
+
+    _day_log.debug("stored rows=%d", len(appointments))
+
+    occurrences = merge_occurrences(
+        db,
+        user_id=target_user_id,
+        start=date,
+        end=date,
+        stored=appointments,
+        family_member_id=family_member_id,
+    )
+
     # Создаем stats из отфильтрованных appointments
     final_stats = {"pending": 0, "taken": 0, "skipped": 0}
-    for a in appointments:
-        if a.status in final_stats:
-            final_stats[a.status] += 1
-    final_stats["total"] = len(appointments)
-    
-    print(f"[DEBUG] ========== RETURNING {len(appointments)} appointments (family_member_id={family_member_id}) ==========")
-    
+    for o in occurrences:
+        if o.status in final_stats:
+            final_stats[o.status] += 1
+    final_stats["total"] = len(occurrences)
+
+    _day_log.debug("returning %d appointments", len(occurrences))
+
     return DailyAppointmentsResponse(
         date=date,
-        appointments=[
-            AppointmentResponse(
-                id=a.id,
-                medication_id=a.medication_id,
-                medication_name=a.medication.name if a.medication else "",
-                date=a.date,
-                time=a.time.strftime("%H:%M"),
-                status=a.status,
-                family_member_id=a.family_member_id,
-            )
-            for a in appointments
-        ],
+        appointments=[_occurrence_response(o) for o in occurrences],
         stats=final_stats,
     )
 
 
-@router.post("/", response_model=AppointmentResponse)
+@router.post("/", response_model=CreateAppointmentsSummaryResponse)
 async def create_appointment(
     appointment_data: CreateAppointmentRequest,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
 ):
     """
-    Создать прием лекарства
+    Создать приемы лекарства на весь курс
+    Строки вставляются одним пакетом; в ответе — количество и диапазон id созданных приемов
     """
     medication = db.get(db_models.Medication, appointment_data.medication_id)
     if not medication:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лекарство не найдено")
     if medication.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя создавать приемы для чужого лекарства")
-    if appointment_data.period_type not in {"daily", "every_other_day"}:
+    if appointment_data.period_type not in PERIOD_STEPS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="period_type должен быть одним из ['daily', 'every_other_day']",
@@ -192,39 +421,81 @@ async def create_appointment(
         if not family_member or family_member.user_id != current_user.id:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Член семьи не найден")
 
-    step = 1 if appointment_data.period_type == "daily" else 2
-    current = appointment_data.start_date
-    last_created = None
-    while current <= appointment_data.end_date:
-        for tm in appointment_data.times:
-            try:
-                parsed_time = datetime.strptime(tm, "%H:%M").time()
-            except ValueError:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат времени HH:MM")
-            appointment = db_models.Appointment(
-                user_id=current_user.id,
-                medication_id=medication.id,
-                family_member_id=family_member_id,
-                date=current,
-                time=parsed_time,
-                status="pending",
-            )
-            db.add(appointment)
-            last_created = appointment
-        current = current + timedelta(days=step)
-    db.commit()
-    if last_created:
-        db.refresh(last_created)
-        return AppointmentResponse(
-            id=last_created.id,
-            medication_id=last_created.medication_id,
+    if appointment_data.mode not in {"materialized", "virtual"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="mode должен быть одним из ['materialized', 'virtual']",
+        )
+
+    try:
+        times = parse_times(appointment_data.times)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат времени HH:MM")
+
+    if appointment_data.mode == "virtual":
+        if not times or appointment_data.start_date > appointment_data.end_date:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Приемы не были созданы")
+        series = db_models.AppointmentSeries(
+            user_id=current_user.id,
+            medication_id=medication.id,
+            family_member_id=family_member_id,
+            start_date=appointment_data.start_date,
+            end_date=appointment_data.end_date,
+            period_type=appointment_data.period_type,
+            times=",".join(t.strftime("%H:%M") for t in times),
+        )
+        db.add(series)
+        rollup = AdherenceDelta()
+        rollup.add_series(series)
+        rollup.apply(db, current_user.id)
+        bump_data_version(db, current_user.id)
+        db.commit()
+        response = CreateAppointmentsSummaryResponse(
+            created=0,
+            medication_id=medication.id,
             medication_name=medication.name,
-            date=last_created.date,
-            time=last_created.time.strftime("%H:%M"),
-            status=last_created.status,
-            family_member_id=last_created.family_member_id,
+            family_member_id=family_member_id,
+            start_date=series.start_date,
+            end_date=series.end_date,
+            series_id=series.id,
         )
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Приемы не были созданы")
+        await _publish_created(current_user.id, response)
+        return response
+
+    rows = build_appointment_rows(
+        user_id=current_user.id,
+        medication_id=medication.id,
+        family_member_id=family_member_id,
+        start_date=appointment_data.start_date,
+        end_date=appointment_data.end_date,
+        period_type=appointment_data.period_type,
+        times=times,
+    )
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Приемы не были созданы")
+    # Уже существующие дозы пропускаются (ON CONFLICT DO NOTHING): повтор запроса ничего не удваивает
+    result = bulk_insert_appointments(db, rows)
+    if result.count:
+        rollup = AdherenceDelta()
+        for (member_id, day), count in result.inserted_by_day.items():
+            rollup.add(member_id, day, "pending", count)
+        rollup.apply(db, current_user.id)
+        bump_data_version(db, current_user.id)
+    db.commit()
+    response = CreateAppointmentsSummaryResponse(
+        created=result.count,
+        skipped=result.skipped,
+        first_id=result.first_id,
+        last_id=result.last_id,
+        medication_id=medication.id,
+        medication_name=medication.name,
+        family_member_id=family_member_id,
+        start_date=appointment_data.start_date,
+        end_date=appointment_data.end_date,
+    )
+    if result.count:
+        await _publish_created(current_user.id, response)
+    return response
 
 
 @router.put("/status", response_model=AppointmentResponse)
@@ -243,7 +514,15 @@ async def update_appointment_status(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="status должен быть одним из ['pending', 'taken', 'skipped']",
         )
-    appointment = db.get(db_models.Appointment, status_data.appointment_id)
+    if status_data.appointment_id is None:
+        response = _update_virtual_occurrence_status(status_data, family_member_id, db, current_user)
+        await _publish_updated(current_user.id, [response])
+        return response
+    appointment = db.get(
+        db_models.Appointment,
+        status_data.appointment_id,
+        options=[joinedload(db_models.Appointment.medication)],
+    )
     if not appointment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Прием не найден")
     if appointment.user_id != current_user.id:
@@ -252,12 +531,20 @@ async def update_appointment_status(
     # КРИТИЧЕСКАЯ ПРОВЕРКА: убеждаемся, что назначение принадлежит правильному пользователю/члену семьи
     # Если family_member_id не передан (главный пользователь), назначение должно иметь family_member_id = None
     # Если family_member_id передан (член семьи), назначение должно иметь family_member_id = family_member_id
-    print(f"[CRITICAL] update_appointment_status: appointment_id={status_data.appointment_id}, family_member_id param={family_member_id}, appointment.family_member_id={appointment.family_member_id}")
+    _status_log.debug(
+        "appointment_id=%s family_member_id=%s appointment.family_member_id=%s",
+        status_data.appointment_id,
+        family_member_id,
+        appointment.family_member_id,
+    )
     
     if family_member_id is None:
         # Главный пользователь - назначение должно иметь family_member_id = None
         if appointment.family_member_id is not None:
-            print(f"[ERROR] Главный пользователь пытается изменить назначение для члена семьи (family_member_id={appointment.family_member_id})")
+            _status_log.warning(
+                "Главный пользователь пытается изменить назначение члена семьи (family_member_id=%s)",
+                appointment.family_member_id,
+            )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нельзя изменять статус приема, назначенного для члена семьи"
@@ -265,26 +552,325 @@ async def update_appointment_status(
     else:
         # Член семьи - назначение должно иметь family_member_id = family_member_id
         if appointment.family_member_id != family_member_id:
-            print(f"[ERROR] Член семьи {family_member_id} пытается изменить назначение для другого пользователя (family_member_id={appointment.family_member_id})")
+            _status_log.warning(
+                "Член семьи %s пытается изменить назначение другого пользователя (family_member_id=%s)",
+                family_member_id,
+                appointment.family_member_id,
+            )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нельзя изменять статус приема другого члена семьи"
             )
     
+    if appointment.series_id is not None and status_data.status == "pending":
+        # Доза серии вернулась в pending — исключение больше не нужно, доза снова виртуальная
+        occurrence = stored_occurrence(appointment)
+        occurrence.id, occurrence.status = None, "pending"
+        rollup = AdherenceDelta()
+        rollup.move(appointment.family_member_id, appointment.date, appointment.status, "pending")
+        rollup.apply(db, current_user.id)
+        db.delete(appointment)
+        bump_data_version(db, current_user.id)
+        db.commit()
+        response = _occurrence_response(occurrence)
+        await _publish_updated(current_user.id, [response])
+        return response
+
+    rollup = AdherenceDelta()
+    rollup.move(appointment.family_member_id, appointment.date, appointment.status, status_data.status)
+    rollup.apply(db, current_user.id)
     appointment.status = status_data.status
+    # Ответ собирается до commit: после него объект истекает и refresh/ленивая загрузка дали бы лишние запросы
+    response = _occurrence_response(stored_occurrence(appointment))
+    bump_data_version(db, current_user.id)
     db.commit()
-    db.refresh(appointment)
-    return AppointmentResponse(
-        id=appointment.id,
-        medication_id=appointment.medication_id,
-        medication_name=appointment.medication.name if appointment.medication else "",
-        date=appointment.date,
-        time=appointment.time.strftime("%H:%M"),
-        status=appointment.status,
-        family_member_id=appointment.family_member_id,
+    await _publish_updated(current_user.id, [response])
+    return response
+
+
+def _update_virtual_occurrence_status(
+    status_data: UpdateAppointmentStatusRequest,
+    family_member_id: Optional[int],
+    db: Session,
+    current_user: db_models.User,
+) -> AppointmentResponse:
+    """Смена статуса виртуальной дозы: сохраняется только строка-исключение."""
+    if status_data.series_id is None or status_data.occurrence_date is None or status_data.occurrence_time is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите appointment_id или series_id, occurrence_date и occurrence_time",
+        )
+    try:
+        (occurrence_time,) = parse_times([status_data.occurrence_time])
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат времени HH:MM")
+    series = db.get(
+        db_models.AppointmentSeries,
+        status_data.series_id,
+        options=[joinedload(db_models.AppointmentSeries.medication)],
+    )
+    if not series or not is_series_occurrence(series, status_data.occurrence_date, occurrence_time):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Прием не найден")
+    if series.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя изменять чужой прием")
+    if series.family_member_id != family_member_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нельзя изменять статус приема другого члена семьи",
+        )
+
+    exception = (
+        db.query(db_models.Appointment)
+        .filter(db_models.Appointment.series_id == series.id)
+        .filter(db_models.Appointment.date == status_data.occurrence_date)
+        .filter(db_models.Appointment.time == occurrence_time)
+        .first()
+    )
+    rollup = AdherenceDelta()
+    rollup.move(
+        series.family_member_id,
+        status_data.occurrence_date,
+        exception.status if exception is not None else "pending",
+        status_data.status,
+    )
+    rollup.apply(db, current_user.id)
+    if status_data.status == "pending":
+        if exception is not None:
+            db.delete(exception)
+        exception_id = None
+    else:
+        if exception is None:
+            exception = db_models.Appointment(
+                user_id=series.user_id,
+                medication_id=series.medication_id,
+                family_member_id=series.family_member_id,
+                date=status_data.occurrence_date,
+                time=occurrence_time,
+                series_id=series.id,
+            )
+            db.add(exception)
+        exception.status = status_data.status
+        try:
+            db.flush()
+        except IntegrityError:
+            # Та же доза уже записана обычным приемом (uq_appointments_dose)
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Этот прием уже существует как отдельная запись",
+            )
+        exception_id = exception.id
+    response = AppointmentResponse(
+        id=exception_id,
+        medication_id=series.medication_id,
+        medication_name=series.medication.name if series.medication else "",
+        date=status_data.occurrence_date,
+        time=occurrence_time.strftime("%H:%M"),
+        status=status_data.status,
+        family_member_id=series.family_member_id,
+        series_id=series.id,
+    )
+    bump_data_version(db, current_user.id)
+    db.commit()
+    return response
+
+
+@router.put("/status/batch", response_model=BatchUpdateAppointmentStatusResponse)
+async def update_appointments_status_batch(
+    batch: BatchUpdateAppointmentStatusRequest,
+    family_member_id: Optional[int] = Query(None, description="ID члена семьи для проверки"),
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Обновить статусы нескольких приемов за один запрос (например, весь утренний прием)
+    Владелец и член семьи проверяются одним запросом IN, изменения применяются одним
+    UPDATE ... CASE в одной транзакции. Результат возвращается по каждому элементу.
+    """
+    # Повторный id в пакете: действует последний статус
+    requested = {item.appointment_id: item.status for item in batch.items}
+    table = db_models.Appointment.__table__
+    rows = db.execute(
+        select(
+            table.c.id,
+            table.c.user_id,
+            table.c.series_id,
+            table.c.medication_id,
+            db_models.Medication.name,
+            table.c.family_member_id,
+            table.c.date,
+            table.c.time,
+            table.c.status,
+        )
+        .join(db_models.Medication, db_models.Medication.id == table.c.medication_id)
+        .where(table.c.id.in_(requested))
+    ).all()
+    found = {row.id: row for row in rows}
+
+    results = []
+    rollup = AdherenceDelta()
+    to_update: dict[int, str] = {}
+    to_delete: list[int] = []
+    for appointment_id, new_status in requested.items():
+        row = found.get(appointment_id)
+        detail = None
+        if new_status not in {"pending", "taken", "skipped"}:
+            detail = "status должен быть одним из ['pending', 'taken', 'skipped']"
+        elif row is None:
+            detail = "Прием не найден"
+        elif row.user_id != current_user.id:
+            detail = "Нельзя изменять чужой прием"
+        elif family_member_id is None and row.family_member_id is not None:
+            detail = "Нельзя изменять статус приема, назначенного для члена семьи"
+        elif row.family_member_id != family_member_id:
+            detail = "Нельзя изменять статус приема другого члена семьи"
+        if detail:
+            results.append(BatchStatusItemResult(appointment_id=appointment_id, success=False, detail=detail))
+            continue
+
+        # Доза виртуального курса, вернувшаяся в pending, снова становится виртуальной
+        reverted = row.series_id is not None and new_status == "pending"
+        rollup.move(row.family_member_id, row.date, row.status, new_status)
+        if reverted:
+            to_delete.append(appointment_id)
+        else:
+            to_update[appointment_id] = new_status
+        occurrence = Occurrence(
+            None if reverted else row.id,
+            row.series_id,
+            row.medication_id,
+            row.name,
+            row.family_member_id,
+            row.date,
+            row.time,
+            new_status,
+        )
+        results.append(
+            BatchStatusItemResult(
+                appointment_id=appointment_id,
+                success=True,
+                appointment=_occurrence_response(occurrence),
+            )
+        )
+
+    if to_update:
+        db.execute(
+            update(table)
+            .where(table.c.id.in_(to_update))
+            .values(status=case(to_update, value=table.c.id))
+        )
+    if to_delete:
+        db.execute(delete(table).where(table.c.id.in_(to_delete)))
+    if to_update or to_delete:
+        rollup.apply(db, current_user.id)
+        bump_data_version(db, current_user.id)
+        db.commit()
+        await _publish_updated(current_user.id, [r.appointment for r in results if r.success])
+
+    updated = len(to_update) + len(to_delete)
+    return BatchUpdateAppointmentStatusResponse(
+        updated=updated,
+        failed=len(results) - updated,
+        results=results,
     )
 
 
+def _course_scope(request: CourseScopeRequest, db: Session, current_user: db_models.User) -> CourseScope:
+    medication = db.get(db_models.Medication, request.medication_id)
+    if not medication:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лекарство не найдено")
+    if medication.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя изменять приемы чужого лекарства")
+    if request.start_date > request.end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date позже end_date")
+    try:
+        times = parse_times(request.times or [])
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат времени HH:MM")
+    return CourseScope(
+        user_id=current_user.id,
+        medication_id=medication.id,
+        start=request.start_date,
+        end=request.end_date,
+        family_member_id=ALL_MEMBERS if request.all_members else request.family_member_id,
+        times=times,
+    )
+
+
+@router.post("/course/delete-pending", response_model=CourseOperationResponse)
+async def delete_course_pending(
+    request: CourseScopeRequest,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Удалить все предстоящие (pending) приемы курса за диапазон одним запросом
+    Отмеченные приемы (taken/skipped) сохраняются
+    """
+    scope = _course_scope(request, db, current_user)
+    affected = delete_pending_doses(db, scope)
+    if affected:
+        bump_data_version(db, current_user.id)
+    db.commit()
+    if affected:
+        await _publish_changed(current_user.id, request)
+    return CourseOperationResponse(affected=affected)
+
+
+@router.post("/course/shift", response_model=CourseOperationResponse)
+async def shift_course(
+    request: ShiftCourseRequest,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Сдвинуть все будущие предстоящие приемы курса за диапазон на minutes минут
+    """
+    scope = _course_scope(request, db, current_user)
+    try:
+        affected = shift_future_doses(db, scope, request.minutes)
+    except DoseConflictError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="После сдвига прием совпадет с уже существующим",
+        )
+    if affected:
+        bump_data_version(db, current_user.id)
+    db.commit()
+    if affected:
+        await _publish_changed(current_user.id, request)
+    return CourseOperationResponse(affected=affected)
+
+
+@router.delete("/series/{series_id}")
+async def delete_appointment_series(
+    series_id: int,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Удалить виртуальный курс вместе с сохраненными исключениями
+    """
+    series = db.get(db_models.AppointmentSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
+    if series.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя удалять чужой курс")
+    rollup = AdherenceDelta()
+    rollup.remove_scope(db, current_user.id, series_id=series_id)
+    rollup.apply(db, current_user.id)
+    start_date, end_date, member_id = series.start_date, series.end_date, series.family_member_id
+    medication_id = series.medication_id
+    db.delete(series)
+    bump_data_version(db, current_user.id)
+    db.commit()
+    await publish_appointments_changed(
+        current_user.id, medication_id=medication_id, family_member_id=member_id, start_date=start_date, end_date=end_date
+    )
+    return {"status": "deleted", "series_id": series_id}
+
+
 @router.delete("/{appointment_id}")
 async def delete_appointment(
     appointment_id: int,
@@ -302,12 +888,20 @@ async def delete_appointment(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя удалять чужой прием")
     
     # КРИТИЧЕСКАЯ ПРОВЕРКА: убеждаемся, что назначение принадлежит правильному пользователю/члену семьи
-    print(f"[CRITICAL] delete_appointment: appointment_id={appointment_id}, family_member_id param={family_member_id}, appointment.family_member_id={appointment.family_member_id}")
+    _delete_log.debug(
+        "appointment_id=%s family_member_id=%s appointment.family_member_id=%s",
+        appointment_id,
+        family_member_id,
+        appointment.family_member_id,
+    )
     
     if family_member_id is None:
         # Главный пользователь - назначение должно иметь family_member_id = None
         if appointment.family_member_id is not None:
-            print(f"[ERROR] Главный пользователь пытается удалить назначение для члена семьи (family_member_id={appointment.family_member_id})")
+            _delete_log.warning(
+                "Главный пользователь пытается удалить назначение члена семьи (family_member_id=%s)",
+                appointment.family_member_id,
+            )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нельзя удалять прием, назначенный для члена семьи"
@@ -315,47 +909,225 @@ async def delete_appointment(
     else:
         # Член семьи - назначение должно иметь family_member_id = family_member_id
         if appointment.family_member_id != family_member_id:
-            print(f"[ERROR] Член семьи {family_member_id} пытается удалить назначение для другого пользователя (family_member_id={appointment.family_member_id})")
+            _delete_log.warning(
+                "Член семьи %s пытается удалить назначение другого пользователя (family_member_id=%s)",
+                family_member_id,
+                appointment.family_member_id,
+            )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Нельзя удалять прием другого члена семьи"
             )
     
+    rollup = AdherenceDelta()
+    if appointment.series_id is not None:
+        # Удаление исключения возвращает дозу курса в виртуальное состояние pending
+        rollup.move(appointment.family_member_id, appointment.date, appointment.status, "pending")
+    else:
+        rollup.remove(appointment.family_member_id, appointment.date, appointment.status)
+    rollup.apply(db, current_user.id)
+    event = {
+        "type": "appointment.deleted",
+        "appointment_id": appointment_id,
+        "date": appointment.date.isoformat(),
+        "family_member_id": appointment.family_member_id,
+        "series_id": appointment.series_id,
+    }
     db.delete(appointment)
+    bump_data_version(db, current_user.id)
     db.commit()
+    await publish_event(current_user.id, event)
     return {"status": "deleted", "appointment_id": appointment_id}
 
 
-@router.get("/pdf")
+@router.get("/pdf", response_class=StreamingResponse)
 async def print_appointments_pdf(
-    user_id: int,
     start_date: date,
     end_date: date,
     family_member_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(get_current_user),
+    target_user_id: int = Depends(resolve_target_user_id),
 ):
     """
     Печать списка приемов в PDF формате
+    Строки читаются порциями, документ отдается постранично по мере генерации.
+    Готовый отчет кэшируется по (пользователь, член семьи, период, версия данных).
+    Чужие приемы (user_id / X-User-Id) — только для администратора.
     """
-    target_user_id = user_id or current_user.id
-    query = db.query(db_models.Appointment).filter(db_models.Appointment.user_id == target_user_id)
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date позже end_date")
+    cache_key = (target_user_id, family_member_id, start_date, end_date, get_data_version(db, target_user_id))
+    headers = {"Content-Disposition": f'attachment; filename="appointments_{start_date}_{end_date}.pdf"'}
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/pdf", headers=headers)
+
+    members = dict(
+        db.query(db_models.FamilyMember.id, db_models.FamilyMember.name)
+        .filter(db_models.FamilyMember.user_id == target_user_id)
+        .all()
+    )
+    occurrences = iter_occurrences(
+        db,
+        user_id=target_user_id,
+        start=start_date,
+        end=end_date,
+        family_member_id=family_member_id if family_member_id else ALL_MEMBERS,
+    )
+    lines = (
+        format_appointment_line(
+            o.date,
+            o.time.strftime("%H:%M"),
+            o.medication_name,
+            o.status,
+            members.get(o.family_member_id, "") if o.family_member_id else "",
+        )
+        for o in occurrences
+    )
+    header = [f"Приемы лекарств: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"]
     if family_member_id:
-        query = query.filter(db_models.Appointment.family_member_id == family_member_id)
-    appointments = query.filter(db_models.Appointment.date.between(start_date, end_date)).all()
-    return {
-        "message": "PDF генерация упрощена для лабораторной работы",
-        "count": len(appointments),
-        "appointments": [
-            {
-                "id": a.id,
-                "medication_id": a.medication_id,
-                "medication_name": a.medication.name if a.medication else "",
-                "family_member_id": a.family_member_id,
-                "date": a.date.isoformat(),
-                "time": a.time.strftime("%H:%M"),
-                "status": a.status,
-            }
-            for a in appointments
-        ],
-    }
+        header.append(f"Член семьи: {members.get(family_member_id, family_member_id)}")
+
+    def _stream():
+        # Синхронный генератор: Starlette итерирует его в пуле потоков, event loop не блокируется
+        parts: Optional[list[bytes]] = []
+        size = 0
+        for chunk in render_appointments_pdf(header, lines):
+            size += len(chunk)
+            if size > MAX_CACHED_REPORT_BYTES:
+                parts = None  # слишком большой для кэша: не копим части
+            elif parts is not None:
+                parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            report_cache.set(cache_key, b"".join(parts))
+
+    return StreamingResponse(_stream(), media_type="application/pdf", headers=headers)
+
+
+def _calendar_feed_url(db: Session, user: db_models.User, family_member_id: Optional[int]) -> CalendarFeedUrlResponse:
+    if family_member_id is not None:
+        member = db.get(db_models.FamilyMember, family_member_id)
+        if not member or member.user_id != user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Член семьи не найден")
+    token = create_calendar_feed_token(
+        settings.secret_key,
+        user_id=user.id,
+        version=get_feed_version(db, user.id),
+        family_member_id=family_member_id,
+    )
+    base = settings.public_base_url.rstrip("/")
+    prefix = settings.api_v1_prefix.rstrip("/")
+    return CalendarFeedUrlResponse(
+        url=f"{base}{prefix}/appointments/feed.ics?{urlencode({'token': token})}",
+        past_days=settings.ics_feed_past_days,
+        ahead_days=settings.ics_feed_ahead_days,
+    )
+
+
+@router.get("/feed-url", response_model=CalendarFeedUrlResponse)
+async def get_calendar_feed_url(
+    family_member_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Ссылка на ICS-подписку для календарного приложения.
+    Без family_member_id — приемы всей семьи, иначе — только указанного члена семьи.
+    """
+    return _calendar_feed_url(db, current_user, family_member_id)
+
+
+@router.post("/feed-url/rotate", response_model=CalendarFeedUrlResponse)
+async def rotate_calendar_feed_url(
+    family_member_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Отозвать все выданные ссылки на ICS-подписку (всей семьи и членов семьи) и вернуть новую.
+    """
+    rotate_feed_version(db, current_user.id)
+    db.commit()
+    return _calendar_feed_url(db, current_user, family_member_id)
+
+
+@router.get("/feed.ics", response_class=StreamingResponse)
+def get_calendar_feed(
+    token: str = Query(..., min_length=8, description="Токен из /appointments/feed-url"),
+    if_none_match: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """
+    ICS-лента приемов за скользящее окно.
+    ETag строится из версии данных пользователя: совпавший If-None-Match дает 304
+    без чтения appointments; готовый календарь отдается из кэша до следующего изменения данных.
+    Токен с устаревшей версией ссылок (после ротации или отзыва администратором) — 401.
+    """
+    parsed = parse_calendar_feed_token(settings.secret_key, token)
+    # Версия сверяется до ETag и кэша: отозванная ссылка не получает даже 304
+    if not parsed or get_feed_version(db, parsed[0]) != parsed[2]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Ссылка на календарь недействительна")
+    user_id, family_member_id, _ = parsed
+    start, end = feed_window(date.today(), settings.ics_feed_past_days, settings.ics_feed_ahead_days)
+    etag = feed_etag(user_id, family_member_id, get_data_version(db, user_id), start)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = "text/calendar; charset=utf-8"
+    cached = feed_cache.get(etag)
+    if cached is not None:
+        return Response(content=cached, media_type=media_type, headers=headers)
+
+    name = "Приемы лекарств"
+    if family_member_id is not None:
+        member = db.get(db_models.FamilyMember, family_member_id)
+        if not member or member.user_id != user_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Член семьи не найден")
+        name = f"Приемы лекарств: {member.name}"
+    events = iter_feed_events(db, user_id=user_id, start=start, end=end, family_member_id=family_member_id)
+
+    def _stream():
+        parts = []
+        for chunk in render_calendar(name, events):
+            parts.append(chunk)
+            yield chunk
+        feed_cache.set(etag, b"".join(parts))
+
+    return StreamingResponse(_stream(), media_type=media_type, headers=headers)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_appointment_events(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: db_models.User = Depends(get_current_user),
+):
+    """
+    Push-канал изменений приемов пользователя (Server-Sent Events) вместо опроса /appointments/day/{date}.
+    События: appointments.created, appointment.updated, appointment.deleted, appointments.changed
+    и resync (клиент отстал — перечитать данные); при простое шлется комментарий keep-alive.
+    """
+    user_id = current_user.id
+    # Соединение с БД не держится на все время подписки
+    db.close()
+    broker = get_event_broker()
+    heartbeat = settings.events_heartbeat_seconds
+
+    async def _stream():
+        async with broker.subscribe(user_id) as subscription:
+            yield "retry: 3000\n: connected\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next(timeout=heartbeat)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -7,6 +7,8 @@ from app.models import db_models
 from app.schemas.medications import MedicationResponse
 from app.schemas.external_api import DrugInfoImportRequest, DrugInfoResponse
 from app.services.external_drug_api import ExternalApiRateLimitError, search_drug_info
+from app.services.medication_counters import adjust_medication_count
+from app.services.response_cache import invalidate, medications_tag
 
 router = APIRouter(prefix="/external", tags=["External API"])
 
@@ -66,8 +68,10 @@ def import_drug_info_to_catalog(
         take_with_food="with",
     )
     db.add(medication)
+    adjust_medication_count(db, current_user.id, 1)
     db.commit()
     db.refresh(medication)
+    invalidate(medications_tag(current_user.id))
     return MedicationResponse(
         id=medication.id,
         name=medication.name,
@@ -4,6 +4,10 @@ from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.database import engine
+from app.services.ics_feed import feed_cache
+from app.services.pdf_report import report_cache
+from app.services.reminder_dispatcher import background_metrics
+from app.services.response_cache import get_response_cache
 
 router = APIRouter()
 
@@ -26,6 +30,16 @@ async def health_check():
     )
 
 
+def _lru_metrics(cache) -> dict:
+    return {
+        "entries": len(cache),
+        "bytes": cache.size_bytes,
+        "hits": cache.hits,
+        "misses": cache.misses,
+        "evictions": cache.evictions,
+    }
+
+
 @router.get("/health/detailed")
 async def detailed_health_check():
     """
@@ -45,6 +59,12 @@ async def detailed_health_check():
         "service": "fullstack-api",
         "components": {
             "database": db_status,
-            "api": "running"
+            "api": "running",
+            "reminders": background_metrics() or "disabled",
+            "caches": {
+                "responses": get_response_cache().metrics(),
+                "pdf_reports": _lru_metrics(report_cache),
+                "ics_feeds": _lru_metrics(feed_cache),
+            },
         }
     }
@@ -2,35 +2,95 @@
 
 from __future__ import annotations
 
-import io
-from typing import List
+from typing import Callable, List, Optional
 from urllib.parse import urlencode
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.routing import APIRoute
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.database import get_db
 from app.dependencies.auth import get_current_user
 from app.dependencies.medication_scope import assert_medication_readable, assert_medication_writable
+from app.dependencies.sparse_fields import sparse_fields
 from app.models import db_models
 from app.schemas.medications import MedicationFileResponse, PresignedDownloadResponse
-from app.services.object_storage import LocalFilesystemStorage, build_object_key, get_object_storage, is_s3_storage
+from app.services.object_storage import (
+    LocalFilesystemStorage,
+    ObjectTooLargeError,
+    build_object_key,
+    get_object_storage,
+    is_s3_storage,
+    purge_objects,
+)
+from app.utils.file_response import RangeFileResponse
 from app.utils.file_token import create_file_download_token, parse_file_download_token
+from app.utils.projection import json_response, project_rows, selected_fields
 
-router = APIRouter(prefix="/medications", tags=["Medication files"])
+# Запас на заголовки частей и границы multipart поверх самого файла
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Максимальный размер файла: {settings.file_upload_max_bytes} байт",
+    )
+
+
+class _UploadSizeLimitRoute(APIRoute):
+    """
+    Лимит тела запроса до разбора multipart. Starlette целиком складывает UploadFile во временный
+    файл еще до вызова обработчика, поэтому запрос с заведомо большим Content-Length отклоняется сразу,
+    а тело без Content-Length (chunked) обрывается, как только превысит лимит. Точный размер файла
+    по-прежнему проверяет put_stream.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = settings.file_upload_max_bytes + _MULTIPART_OVERHEAD_BYTES
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise _too_large()
+            receive = request.receive
+            received = 0
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise _too_large()
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/medications", tags=["Medication files"], route_class=_UploadSizeLimitRoute)
 
 
 def _allowed_mime() -> set[str]:
     return {m.strip().lower() for m in settings.file_upload_allowed_mime.split(",") if m.strip()}
 
 
-@router.get("/files/access", response_class=StreamingResponse)
+@router.get("/files/access", response_class=RangeFileResponse)
 def download_file_by_token(
+    request: Request,
     token: str = Query(..., min_length=8, description="Токен из presigned-ответа (локальный режим)"),
     db: Session = Depends(get_db),
 ):
+    """
+    Скачать вложение по токену (локальное хранилище). Поддерживаются Range (в том числе несколько
+    диапазонов), If-Range и условные запросы: ETag и Last-Modified берутся из метаданных файла в БД,
+    на 304 файл не читается.
+    """
     parsed = parse_file_download_token(settings.secret_key, token)
     if not parsed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Ссылка недействительна или истекла")
@@ -46,12 +106,26 @@ def download_file_by_token(
     storage = get_object_storage()
     if not isinstance(storage, LocalFilesystemStorage):
         raise HTTPException(status_code=500, detail="Конфигурация хранилища не поддержана")
-    data = storage.read_bytes(row.object_key)
+    path = storage.local_path(row.object_key)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл не найден")
+    # Ключ объекта уникален для каждой загрузки: содержимое под ним не меняется, ETag строгий
+    etag = f'"{row.object_key.rsplit("/", 1)[-1]}-{row.size_bytes}"'
     filename = row.original_filename.replace('"', "'")
-    return StreamingResponse(
-        io.BytesIO(data),
+    headers = {
+        "Content-Disposition": f'inline; filename="{filename}"',
+        "Cache-Control": f"private, max-age={settings.file_download_token_ttl_seconds}",
+    }
+    return RangeFileResponse(
+        path,
+        size=size,
+        etag=etag,
+        last_modified=row.created_at,
+        request_headers=request.headers,
         media_type=row.content_type,
-        headers={"Content-Disposition": f'inline; filename="{filename}"'},
+        headers=headers,
     )
 
 
@@ -60,18 +134,19 @@ def list_medication_files(
     medication_id: int,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
+    fields: Optional[tuple[str, ...]] = Depends(sparse_fields(MedicationFileResponse)),
 ):
     med = db.get(db_models.Medication, medication_id)
     if not med:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лекарство не найдено")
     assert_medication_readable(med, current_user)
-    rows = (
-        db.query(db_models.MedicationFile)
-        .filter(db_models.MedicationFile.medication_id == medication_id)
-        .order_by(db_models.MedicationFile.created_at.desc())
-        .all()
+    mf = db_models.MedicationFile
+    rows = db.execute(
+        select(*(getattr(mf, name) for name in selected_fields(MedicationFileResponse, fields)))
+        .where(mf.medication_id == medication_id)
+        .order_by(mf.created_at.desc())
     )
-    return rows
+    return json_response(project_rows(rows, MedicationFileResponse, fields))
 
 
 @router.post("/{medication_id}/files", response_model=MedicationFileResponse, status_code=status.HTTP_201_CREATED)
@@ -93,16 +168,13 @@ def upload_medication_file(
             detail=f"Допустимые типы: {settings.file_upload_allowed_mime}",
         )
 
-    raw = file.file.read(settings.file_upload_max_bytes + 1)
-    if len(raw) > settings.file_upload_max_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"Максимальный размер файла: {settings.file_upload_max_bytes} байт",
-        )
-
     key = build_object_key(med.user_id, medication_id)
     storage = get_object_storage()
-    storage.put_object(key, raw, ctype)
+    try:
+        # Файл пишется в хранилище кусками; лимит проверяется по мере чтения
+        size = storage.put_stream(key, file.file, ctype, max_bytes=settings.file_upload_max_bytes)
+    except ObjectTooLargeError:
+        raise _too_large()
 
     safe_name = (file.filename or "upload").replace("\x00", "")[:255]
     row = db_models.MedicationFile(
@@ -111,7 +183,7 @@ def upload_medication_file(
         object_key=key,
         original_filename=safe_name,
         content_type=ctype,
-        size_bytes=len(raw),
+        size_bytes=size,
     )
     db.add(row)
     db.commit()
@@ -158,6 +230,7 @@ def get_download_url(
 def delete_medication_file(
     medication_id: int,
     file_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
 ):
@@ -170,7 +243,8 @@ def delete_medication_file(
     if not row or row.medication_id != medication_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл не найден")
 
-    get_object_storage().delete_object(row.object_key)
+    object_key = row.object_key
     db.delete(row)
     db.commit()
+    background_tasks.add_task(purge_objects, [object_key])
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,10 +1,11 @@
 import math
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import or_
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import get_db
 from app.dependencies.auth import get_current_user
 from app.dependencies.medication_scope import (
@@ -12,16 +13,46 @@ from app.dependencies.medication_scope import (
     assert_medication_writable,
     resolve_target_user_id,
 )
+from app.dependencies.sparse_fields import sparse_fields
 from app.models import db_models
 from app.schemas.medications import (
+    CatalogFormat,
     CreateMedicationRequest,
+    MedicationImportResponse,
+    MedicationPagination,
     MedicationResponse,
     MedicationSortField,
     PaginatedMedicationsResponse,
     SortOrder,
+    TotalMode,
     UpdateMedicationRequest,
 )
-from app.services.object_storage import get_object_storage
+from app.services.adherence import AdherenceDelta
+from app.services.data_version import bump_data_version
+from app.services.event_broker import publish_appointments_changed
+from app.services.medication_counters import adjust_medication_count, get_medication_count
+from app.services.medication_listing import MedicationCursor, page_medications
+from app.services.medication_search import apply_search
+from app.services.medication_transfer import (
+    ImportFormatError,
+    detect_format,
+    import_medications,
+    iter_csv_rows,
+    iter_export,
+    iter_ndjson_rows,
+)
+from app.services.object_storage import purge_objects
+from app.services.response_cache import (
+    cache_json,
+    cached_json,
+    get_response_cache,
+    invalidate,
+    medication_tag,
+    medications_tag,
+    schedules_tag,
+    user_tag,
+)
+from app.utils.projection import project_rows, selected_fields
 
 router = APIRouter(prefix="/medications", tags=["Medications"])
 
@@ -39,7 +70,7 @@ def get_medications(
     target_user_id: int = Depends(resolve_target_user_id),
     q: Optional[str] = Query(
         None,
-        description="Поиск по названию, описанию и дозировке",
+        description="Полнотекстовый поиск по названию, описанию и дозировке (должны совпасть все слова)",
         max_length=200,
     ),
     take_with_food: Optional[str] = Query(
@@ -49,84 +80,223 @@ def get_medications(
     ),
     quantity_contains: Optional[str] = Query(None, max_length=120, description="Подстрока в поле quantity"),
     dosage_contains: Optional[str] = Query(None, max_length=120, description="Подстрока в поле dosage"),
-    sort_by: MedicationSortField = Query(MedicationSortField.id, description="Поле сортировки"),
+    sort_by: Optional[MedicationSortField] = Query(
+        None,
+        description="Поле сортировки; по умолчанию relevance при заданном q, иначе id",
+    ),
     sort_order: SortOrder = Query(SortOrder.desc, description="Порядок: asc или desc"),
     page: int = Query(1, ge=1, le=10_000),
     page_size: int = Query(20, ge=1, le=100),
+    pagination: MedicationPagination = Query(
+        MedicationPagination.offset,
+        description="offset — по номеру страницы; cursor — по next_cursor (включается и самим cursor)",
+    ),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    total_mode: Optional[TotalMode] = Query(
+        None,
+        alias="total",
+        description="exact — COUNT(*); cached — счетчик пользователя (без фильтров); none — без total. "
+        "По умолчанию exact для offset и none для cursor",
+    ),
+    fields: Optional[tuple[str, ...]] = Depends(sparse_fields(MedicationResponse)),
 ):
+    """
+    Список лекарств. В режиме cursor страница — одно чтение диапазона по индексу (колонка сортировки, id)
+    без OFFSET; total считается только по запросу. Выбираются только колонки полей ответа (fields=).
+    Ответ кэшируется до изменения каталога target_user_id.
+    """
+    cache_key = get_response_cache().key(
+        "medications.list",
+        {
+            "user": target_user_id,
+            "q": q,
+            "take_with_food": take_with_food,
+            "quantity_contains": quantity_contains,
+            "dosage_contains": dosage_contains,
+            "sort_by": sort_by,
+            "sort_order": sort_order,
+            "page": page,
+            "page_size": page_size,
+            "pagination": pagination,
+            "cursor": cursor,
+            "total": total_mode,
+            "fields": fields,
+        },
+        [user_tag(target_user_id), medications_tag(target_user_id)],
+    )
+    hit = cached_json(cache_key)
+    if hit is not None:
+        return hit
 
-    query = db.query(db_models.Medication).filter(db_models.Medication.user_id == target_user_id)
+    if cursor:
+        pagination = MedicationPagination.cursor
+    if total_mode is None:
+        total_mode = TotalMode.exact if pagination == MedicationPagination.offset else TotalMode.none
 
-    if q:
-        term = f"%{q.strip().lower()}%"
-        query = query.filter(
-            or_(
-                db_models.Medication.name.ilike(term),
-                db_models.Medication.description.ilike(term),
-                db_models.Medication.dosage.ilike(term),
-            )
-        )
+    # id и колонка сортировки нужны keyset-курсору, даже если их нет в fields
+    names = dict.fromkeys(
+        selected_fields(MedicationResponse, fields)
+        + ("id",)
+        + ((sort_by.value,) if sort_by not in (None, MedicationSortField.relevance) else ())
+    )
+    query = db.query(*(getattr(db_models.Medication, name) for name in names)).filter(
+        db_models.Medication.user_id == target_user_id
+    )
+
+    query, rank = apply_search(
+        db,
+        query,
+        q,
+        quantity_contains=quantity_contains,
+        dosage_contains=dosage_contains,
+    )
 
     if take_with_food:
         query = query.filter(db_models.Medication.take_with_food == take_with_food)
 
-    if quantity_contains:
-        query = query.filter(db_models.Medication.quantity.ilike(f"%{quantity_contains}%"))
+    total = None
+    if total_mode == TotalMode.cached and not (q or take_with_food or quantity_contains or dosage_contains):
+        total = get_medication_count(db, target_user_id)
+    if total is None and total_mode != TotalMode.none:
+        # Счетчик покрывает только весь каталог; с фильтрами (или до миграции) — точный подсчет
+        total = query.count()
 
-    if dosage_contains:
-        query = query.filter(db_models.Medication.dosage.ilike(f"%{dosage_contains}%"))
+    if sort_by is None:
+        sort_by = MedicationSortField.relevance if rank is not None else MedicationSortField.id
+    next_cursor = None
+    if pagination == MedicationPagination.cursor:
+        if sort_by == MedicationSortField.relevance:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Режим cursor не поддерживает сортировку relevance: укажите sort_by",
+            )
+        try:
+            after = MedicationCursor.decode(cursor) if cursor else None
+            rows, following = page_medications(
+                query,
+                sort_by=sort_by.value,
+                descending=sort_order == SortOrder.desc,
+                limit=page_size,
+                after=after,
+            )
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+        next_cursor = following.encode() if following else None
+    else:
+        if sort_by == MedicationSortField.relevance:
+            # Релевантность всегда от лучших совпадений; без q — как сортировка по id
+            if rank is not None:
+                query = query.order_by(rank.asc(), db_models.Medication.id.desc())
+            else:
+                query = query.order_by(db_models.Medication.id.desc())
+        else:
+            sort_col = _SORT_COLUMNS[sort_by]
+            if sort_order == SortOrder.asc:
+                query = query.order_by(sort_col.asc(), db_models.Medication.id.asc())
+            else:
+                query = query.order_by(sort_col.desc(), db_models.Medication.id.desc())
 
-    total = query.count()
+        offset = (page - 1) * page_size
+        rows = query.offset(offset).limit(page_size).all()
 
-    sort_col = _SORT_COLUMNS[sort_by]
-    if sort_order == SortOrder.asc:
-        query = query.order_by(sort_col.asc())
-    else:
-        query = query.order_by(sort_col.desc())
+    is_cursor = pagination == MedicationPagination.cursor
+    envelope = PaginatedMedicationsResponse(
+        items=[],
+        total=total,
+        page=None if is_cursor else page,
+        page_size=page_size,
+        pages=(max(1, math.ceil(total / page_size)) if total is not None and not is_cursor else None),
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None if is_cursor else None,
+    )
+    # При fields= элементы — словари с частью полей, поэтому конверт собирается без повторной валидации
+    return cache_json(
+        cache_key,
+        {"items": project_rows(rows, MedicationResponse, fields), **envelope.model_dump(exclude={"items"})},
+    )
 
-    offset = (page - 1) * page_size
-    rows = query.offset(offset).limit(page_size).all()
 
-    pages = math.ceil(total / page_size) if total > 0 else 1
+_EXPORT_MEDIA_TYPES = {
+    CatalogFormat.csv: "text/csv; charset=utf-8",
+    CatalogFormat.ndjson: "application/x-ndjson",
+}
 
-    items = [
-        MedicationResponse(
-            id=m.id,
-            name=m.name,
-            quantity=m.quantity,
-            dosage=m.dosage,
-            description=m.description,
-            take_with_food=m.take_with_food,
-        )
-        for m in rows
-    ]
 
-    return PaginatedMedicationsResponse(
-        items=items,
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=pages,
+@router.get("/export", response_class=StreamingResponse)
+def export_medications(
+    format: CatalogFormat = Query(CatalogFormat.csv, description="csv или ndjson"),
+    db: Session = Depends(get_db),
+    target_user_id: int = Depends(resolve_target_user_id),
+):
+    """
+    Выгрузить каталог target_user_id потоком, в порядке id. Колонки: id, name, quantity, dosage,
+    description, take_with_food; файл можно загрузить обратно через POST /medications/import.
+    """
+    return StreamingResponse(
+        iter_export(db, target_user_id, format.value),
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="medications.{format.value}"'},
     )
 
 
+@router.post("/import", response_model=MedicationImportResponse)
+def import_medications_file(
+    file: UploadFile = File(..., description="CSV с заголовком или NDJSON (объект на строку)"),
+    format: Optional[CatalogFormat] = Query(None, description="csv или ndjson; по умолчанию — по расширению файла"),
+    db: Session = Depends(get_db),
+    target_user_id: int = Depends(resolve_target_user_id),
+):
+    """
+    Массово создать лекарства из файла. Строки читаются по одной и вставляются пачками
+    (MEDICATION_IMPORT_BATCH_SIZE строк на транзакцию); ошибочные строки пропускаются и
+    перечисляются в errors с номером строки.
+    """
+    fmt = detect_format(format.value if format else None, file.filename)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Не удалось определить формат: укажите format=csv или format=ndjson",
+        )
+    rows = iter_csv_rows(file.file) if fmt == "csv" else iter_ndjson_rows(file.file)
+    try:
+        report = import_medications(db, target_user_id, rows, batch_size=settings.medication_import_batch_size)
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    finally:
+        # Пачки, закоммиченные до ошибки, уже в каталоге
+        invalidate(medications_tag(target_user_id))
+    return MedicationImportResponse(created=report.created, failed=report.failed, errors=report.errors)
+
+
 @router.get("/{medication_id}", response_model=MedicationResponse)
 def get_medication(
     medication_id: int,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
 ):
+    # Ключ привязан к запрашивающему: попадание в кэш значит, что проверка доступа уже пройдена им
+    cache_key = get_response_cache().key(
+        "medications.item",
+        {"medication": medication_id, "requester": current_user.id, "role": current_user.role},
+        [user_tag(current_user.id), medication_tag(medication_id)],
+    )
+    hit = cached_json(cache_key)
+    if hit is not None:
+        return hit
     medication = db.get(db_models.Medication, medication_id)
     if not medication:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лекарство не найдено")
     assert_medication_readable(medication, current_user)
-    return MedicationResponse(
-        id=medication.id,
-        name=medication.name,
-        quantity=medication.quantity,
-        dosage=medication.dosage,
-        description=medication.description,
-        take_with_food=medication.take_with_food,
+    return cache_json(
+        cache_key,
+        MedicationResponse(
+            id=medication.id,
+            name=medication.name,
+            quantity=medication.quantity,
+            dosage=medication.dosage,
+            description=medication.description,
+            take_with_food=medication.take_with_food,
+        ),
     )
 
 
@@ -149,8 +319,10 @@ def create_medication(
         take_with_food=medication_data.take_with_food,
     )
     db.add(medication)
+    adjust_medication_count(db, target_user_id, 1)
     db.commit()
     db.refresh(medication)
+    invalidate(medications_tag(target_user_id))
     return MedicationResponse(
         id=medication.id,
         name=medication.name,
@@ -177,8 +349,12 @@ def update_medication(
         value = getattr(medication_data, field)
         if value is not None:
             setattr(medication, field, value)
+    # Название лекарства входит в отчеты о приемах
+    bump_data_version(db, medication.user_id)
     db.commit()
     db.refresh(medication)
+    # Название лекарства входит и в ответы GET /schedules
+    invalidate(medications_tag(medication.user_id), medication_tag(medication.id), schedules_tag(medication.user_id))
     return MedicationResponse(
         id=medication.id,
         name=medication.name,
@@ -192,6 +368,7 @@ def update_medication(
 @router.delete("/{medication_id}")
 def delete_medication(
     medication_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
 ):
@@ -200,10 +377,19 @@ def delete_medication(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лекарство не найдено")
     assert_medication_writable(medication, current_user)
 
-    storage = get_object_storage()
-    for f in list(medication.files):
-        storage.delete_object(f.object_key)
+    # Коллекция все равно загружается для каскадного удаления строк
+    object_keys = [f.object_key for f in medication.files]
 
+    rollup = AdherenceDelta()
+    rollup.remove_scope(db, medication.user_id, medication_id=medication.id)
+    rollup.apply(db, medication.user_id)
     db.delete(medication)
+    adjust_medication_count(db, medication.user_id, -1)
+    bump_data_version(db, medication.user_id)
     db.commit()
+    invalidate(medications_tag(medication.user_id), medication_tag(medication_id), schedules_tag(medication.user_id))
+    # Приемы лекарства удалены каскадом: клиентам перечитать их по всем датам и членам семьи
+    background_tasks.add_task(publish_appointments_changed, medication.user_id, medication_id=medication_id)
+    # Файлы удаляются из хранилища после ответа, одним пакетом
+    background_tasks.add_task(purge_objects, object_keys)
     return {"status": "deleted", "medication_id": medication_id}
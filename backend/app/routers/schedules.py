@@ -1,13 +1,18 @@
 from datetime import time as dt_time
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.dependencies.auth import get_current_user
+from app.dependencies.sparse_fields import sparse_fields
 from app.models import db_models
 from app.schemas.schedules import CreateScheduleRequest, MedicationScheduleResponse, TimeSlotResponse
+from app.services.data_version import bump_data_version
+from app.services.event_broker import publish_appointments_changed
+from app.services.schedule_listing import list_schedules
+from app.services.response_cache import cache_json, cached_json, get_response_cache, invalidate, schedules_tag, user_tag
 
 router = APIRouter(prefix="/schedules", tags=["Schedules"])
 
@@ -60,9 +65,12 @@ async def create_schedule(
         time_slot = db_models.TimeSlot(schedule_id=schedule.id, time=slot_time)
         db.add(time_slot)
         slots.append(time_slot)
+    # Расписания входят в ICS-ленту: ее ETag держится на версии данных
+    bump_data_version(db, current_user.id)
     db.commit()
     for slot in slots:
         db.refresh(slot)
+    invalidate(schedules_tag(current_user.id))
 
     return MedicationScheduleResponse(
         id=schedule.id,
@@ -82,36 +90,23 @@ async def get_schedules(
     family_member_id: int,
     db: Session = Depends(get_db),
     current_user: db_models.User = Depends(get_current_user),
+    fields: Optional[tuple[str, ...]] = Depends(sparse_fields(MedicationScheduleResponse)),
 ):
     """
-    Получить список расписаний для члена семьи
+    Получить список расписаний для члена семьи (fields= — только перечисленные поля)
     """
-    schedules = (
-        db.query(db_models.Schedule)
-        .join(db_models.FamilyMember, db_models.FamilyMember.id == db_models.Schedule.family_member_id)
-        .filter(db_models.FamilyMember.user_id == current_user.id)
-        .filter(db_models.Schedule.family_member_id == family_member_id)
-        .all()
+    cache_key = get_response_cache().key(
+        "schedules.list",
+        {"user": current_user.id, "family_member_id": family_member_id, "fields": fields},
+        [user_tag(current_user.id), schedules_tag(current_user.id)],
+    )
+    hit = cached_json(cache_key)
+    if hit is not None:
+        return hit
+    return cache_json(
+        cache_key,
+        list_schedules(db, user_id=current_user.id, family_member_id=family_member_id, fields=fields),
     )
-    response = []
-    for schedule in schedules:
-        medication = db.get(db_models.Medication, schedule.medication_id)
-        member = db.get(db_models.FamilyMember, schedule.family_member_id)
-        time_slots = db.query(db_models.TimeSlot).filter_by(schedule_id=schedule.id).all()
-        response.append(
-            MedicationScheduleResponse(
-                id=schedule.id,
-                medication_id=schedule.medication_id,
-                medication_name=medication.name if medication else "Unknown",
-                family_member_id=schedule.family_member_id,
-                family_member_name=member.name if member else "Unknown",
-                start_date=schedule.start_date,
-                end_date=schedule.end_date,
-                time_slots=[TimeSlotResponse(id=slot.id, time=slot.time.strftime("%H:%M")) for slot in time_slots],
-                period_type=schedule.period_type,
-            )
-        )
-    return response
 
 
 @router.delete("/{schedule_id}")
@@ -127,6 +122,16 @@ async def delete_schedule(
     owner = db.get(db_models.FamilyMember, schedule.family_member_id)
     if not owner or owner.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя удалять чужое расписание")
+    scope = {
+        "medication_id": schedule.medication_id,
+        "family_member_id": schedule.family_member_id,
+        "start_date": schedule.start_date,
+        "end_date": schedule.end_date,
+    }
     db.delete(schedule)
+    bump_data_version(db, current_user.id)
     db.commit()
+    invalidate(schedules_tag(current_user.id))
+    # Дозы расписания пропадают из календаря и ICS-ленты
+    await publish_appointments_changed(current_user.id, **scope)
     return {"status": "deleted", "schedule_id": schedule_id}
@@ -1,10 +1,27 @@
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models import db_models
 from app.dependencies.auth import get_current_user, require_admin
+from app.dependencies.sparse_fields import sparse_fields
+from app.services.adherence import AdherenceDelta
+from app.services.data_version import bump_data_version
+from app.services.event_broker import publish_appointments_changed
+from app.services.ics_feed import rotate_feed_version
+from app.services.response_cache import (
+    cache_json,
+    cached_json,
+    family_tag,
+    get_response_cache,
+    invalidate,
+    profile_tag,
+    schedules_tag,
+    user_tag,
+)
+from app.utils.projection import json_response, project_rows, selected_fields
 from app.schemas.users import (
     AddFamilyMemberRequest,
     FamilyMemberResponse,
@@ -27,17 +44,26 @@ async def get_profile(
     Возвращает информацию о пользователе и всех членах семьи
     """
     user = current_user
+    cache_key = get_response_cache().key(
+        "users.me", {"user": user.id}, [user_tag(user.id), profile_tag(user.id), family_tag(user.id)]
+    )
+    hit = cached_json(cache_key)
+    if hit is not None:
+        return hit
     family_members = db.query(db_models.FamilyMember).filter_by(user_id=user.id).all()
-    return UserFullProfileResponse(
-        user=UserProfileResponse(
-            id=user.id, phone=user.phone, name=user.name, sms_notifications=user.sms_notifications
+    return cache_json(
+        cache_key,
+        UserFullProfileResponse(
+            user=UserProfileResponse(
+                id=user.id, phone=user.phone, name=user.name, sms_notifications=user.sms_notifications
+            ),
+            family_members=[
+                FamilyMemberResponse(
+                    id=member.id, name=member.name, phone=member.phone, relation=member.relation
+                )
+                for member in family_members
+            ],
         ),
-        family_members=[
-            FamilyMemberResponse(
-                id=member.id, name=member.name, phone=member.phone, relation=member.relation
-            )
-            for member in family_members
-        ],
     )
 
 
@@ -58,6 +84,7 @@ async def update_profile(
         user.sms_notifications = data.sms_notifications
     db.commit()
     db.refresh(user)
+    invalidate(profile_tag(user.id))
     return UserProfileResponse(
         id=user.id,
         phone=user.phone,
@@ -82,6 +109,7 @@ async def add_family_member(
     db.add(member)
     db.commit()
     db.refresh(member)
+    invalidate(family_tag(user.id))
     return FamilyMemberResponse(
         id=member.id,
         name=member.name,
@@ -104,8 +132,15 @@ async def remove_family_member(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Член семьи не найден")
     if deleted.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нельзя удалить чужого члена семьи")
+    rollup = AdherenceDelta()
+    rollup.remove_scope(db, current_user.id, family_member_id=member_id)
+    rollup.apply(db, current_user.id)
     db.delete(deleted)
+    bump_data_version(db, current_user.id)
     db.commit()
+    # Расписания члена семьи удаляются вместе с ним
+    invalidate(family_tag(current_user.id), schedules_tag(current_user.id))
+    await publish_appointments_changed(current_user.id, family_member_id=member_id)
     return {"status": "deleted", "member_id": member_id}
 
 
@@ -113,21 +148,25 @@ async def remove_family_member(
 async def get_family_members(
     current_user: db_models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    fields: Optional[tuple[str, ...]] = Depends(sparse_fields(FamilyMemberResponse)),
 ):
     """
     Получить список членов семьи
     """
     user = current_user
-    members = db.query(db_models.FamilyMember).filter_by(user_id=user.id).all()
-    return [
-        FamilyMemberResponse(
-            id=member.id,
-            name=member.name,
-            phone=member.phone,
-            relation=member.relation,
-        )
-        for member in members
-    ]
+    cache_key = get_response_cache().key(
+        "users.family", {"user": user.id, "fields": fields}, [user_tag(user.id), family_tag(user.id)]
+    )
+    hit = cached_json(cache_key)
+    if hit is not None:
+        return hit
+    fm = db_models.FamilyMember
+    rows = db.execute(
+        select(*(getattr(fm, name) for name in selected_fields(FamilyMemberResponse, fields)))
+        .where(fm.user_id == user.id)
+        .order_by(fm.id)
+    )
+    return cache_json(cache_key, project_rows(rows, FamilyMemberResponse, fields))
 
 
 # ======================= АДМИНИСТРАТИВНЫЕ ENDPOINT'Ы (RBAC) =======================
@@ -137,15 +176,17 @@ async def get_family_members(
 async def list_users_admin(
     db: Session = Depends(get_db),
     current_admin: db_models.User = Depends(require_admin),
+    fields: Optional[tuple[str, ...]] = Depends(sparse_fields(UserAdminItem)),
 ):
     """
     Получить список всех пользователей (только для администратора).
     """
-    users = db.query(db_models.User).order_by(db_models.User.id).all()
-    return [
-        UserAdminItem(id=u.id, phone=u.phone, name=u.name, role=u.role)
-        for u in users
-    ]
+    rows = db.execute(
+        select(*(getattr(db_models.User, name) for name in selected_fields(UserAdminItem, fields))).order_by(
+            db_models.User.id
+        )
+    )
+    return json_response(project_rows(rows, UserAdminItem, fields))
 
 
 @router.patch("/{user_id}/role", response_model=UserAdminItem)
@@ -173,6 +214,8 @@ async def update_user_role(
     user.role = new_role
     db.commit()
     db.refresh(user)
+    # Роль определяет доступ к чужим лекарствам: все закэшированные ответы пользователя устаревают
+    invalidate(user_tag(user.id))
 
     return UserAdminItem(id=user.id, phone=user.phone, name=user.name, role=user.role)
 
@@ -184,8 +227,8 @@ async def revoke_user_tokens(
     current_admin: db_models.User = Depends(require_admin),
 ):
     """
-    Отозвать все refresh-токены пользователя (сбросить все активные сессии).
-    Доступно только администратору.
+    Отозвать все refresh-токены пользователя (сбросить все активные сессии)
+    и все ссылки на его ICS-подписку. Доступно только администратору.
     """
     user = db.get(db_models.User, user_id)
     if not user:
@@ -196,11 +239,12 @@ async def revoke_user_tokens(
         .filter(db_models.RefreshToken.user_id == user_id, db_models.RefreshToken.revoked.is_(False))
         .update({db_models.RefreshToken.revoked: True})
     )
+    rotate_feed_version(db, user_id)
     db.commit()
 
     return {
         "status": "ok",
         "user_id": user_id,
         "revoked_tokens": updated,
-        "message": "Все refresh-токены пользователя отозваны",
+        "message": "Все refresh-токены и ссылки на календарь пользователя отозваны",
     }
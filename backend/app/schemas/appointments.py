@@ -11,21 +11,87 @@ class CreateAppointmentRequest(BaseModel):
     times: List[str] = Field(..., description="Список времен приема в формате HH:MM")
     period_type: str = Field(..., description="Период приема: daily/every_other_day")
     family_member_id: Optional[int] = Field(None, description="ID члена семьи")
+    mode: str = Field(
+        "materialized",
+        description="materialized — строка на каждую дозу; virtual — только правило повторения",
+    )
+
+
+class CreateAppointmentsSummaryResponse(BaseModel):
+    """Итог пакетного создания курса: без загрузки созданных строк обратно в ORM."""
+
+    created: int
+    skipped: int = Field(0, description="Дозы, которые уже существовали и не были вставлены повторно")
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+    medication_id: int
+    medication_name: str
+    family_member_id: Optional[int] = None
+    start_date: date
+    end_date: date
+    series_id: Optional[int] = None
 
 
 class UpdateAppointmentStatusRequest(BaseModel):
+    appointment_id: Optional[int] = Field(None, description="ID приема")
+    status: str = Field(..., description="Статус: pending/taken/skipped")
+    series_id: Optional[int] = Field(None, description="ID серии (для виртуального приема без id)")
+    occurrence_date: Optional[date] = Field(None, description="Дата виртуального приема")
+    occurrence_time: Optional[str] = Field(None, description="Время виртуального приема HH:MM")
+
+
+class BatchStatusItem(BaseModel):
     appointment_id: int = Field(..., description="ID приема")
     status: str = Field(..., description="Статус: pending/taken/skipped")
 
 
+class BatchUpdateAppointmentStatusRequest(BaseModel):
+    items: List[BatchStatusItem] = Field(..., min_length=1, max_length=500, description="Пары (appointment_id, status)")
+
+
+class CourseScopeRequest(BaseModel):
+    medication_id: int = Field(..., description="ID лекарства")
+    start_date: date = Field(..., description="Начало диапазона")
+    end_date: date = Field(..., description="Конец диапазона")
+    family_member_id: Optional[int] = Field(None, description="ID члена семьи (без него — сам пользователь)")
+    all_members: bool = Field(False, description="Пользователь и все члены семьи")
+    times: Optional[List[str]] = Field(None, description="Только указанные времена HH:MM")
+
+
+class ShiftCourseRequest(CourseScopeRequest):
+    minutes: int = Field(..., ge=-7 * 24 * 60, le=7 * 24 * 60, description="Сдвиг в минутах (может быть отрицательным)")
+
+
+class CourseOperationResponse(BaseModel):
+    affected: int
+
+
 class AppointmentResponse(BaseModel):
-    id: int
+    id: Optional[int] = None
     medication_id: int
     medication_name: str
     date: date
     time: str
     status: str
     family_member_id: Optional[int] = None
+    series_id: Optional[int] = None
+
+
+class CalendarFeedUrlResponse(BaseModel):
+    """Ссылка на ICS-подписку: токен в ссылке заменяет заголовок Authorization."""
+
+    url: str
+    past_days: int
+    ahead_days: int
+
+
+class AppointmentsPageResponse(BaseModel):
+    """Страница keyset-списка: next_cursor передается в cursor следующего запроса."""
+
+    items: List[AppointmentResponse]
+    limit: int
+    next_cursor: Optional[str] = None
+    has_more: bool
 
 
 class DailyAppointmentsResponse(BaseModel):
@@ -34,10 +100,59 @@ class DailyAppointmentsResponse(BaseModel):
     stats: dict
 
 
+class CalendarStatusCounts(BaseModel):
+    total: int = 0
+    pending: int = 0
+    taken: int = 0
+    skipped: int = 0
+
+
+class CalendarMemberSummary(CalendarStatusCounts):
+    family_member_id: Optional[int] = None
+
+
+class CalendarDaySummary(CalendarStatusCounts):
+    date: date
+    members: Optional[List[CalendarMemberSummary]] = None
+
+
 class AppointmentsCalendarResponse(BaseModel):
     current_date: date
     selected_date: date
     total_appointments: int
     completed_today: str
     appointments: List[AppointmentResponse]
+    view_type: str = "month"
+    range_start: Optional[date] = None
+    range_end: Optional[date] = None
+    days: List[CalendarDaySummary] = []
+
+
+
+class BatchStatusItemResult(BaseModel):
+    appointment_id: int
+    success: bool
+    detail: Optional[str] = None
+    appointment: Optional[AppointmentResponse] = None
+
+
+class BatchUpdateAppointmentStatusResponse(BaseModel):
+    updated: int
+    failed: int
+    results: List[BatchStatusItemResult]
+
+
+class AdherenceTrendPoint(BaseModel):
+    period_start: date
+    total: int
+    pending: int
+    taken: int
+    skipped: int
+    adherence: Optional[float] = Field(None, description="taken / (taken + skipped)")
+
 
+class AdherenceTrendsResponse(BaseModel):
+    granularity: str
+    start_date: date
+    end_date: date
+    points: List[AdherenceTrendPoint]
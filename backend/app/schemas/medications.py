@@ -60,6 +60,7 @@ class MedicationSortField(str, Enum):
     name = "name"
     dosage = "dosage"
     quantity = "quantity"
+    relevance = "relevance"
 
 
 class SortOrder(str, Enum):
@@ -67,12 +68,45 @@ class SortOrder(str, Enum):
     desc = "desc"
 
 
+class MedicationPagination(str, Enum):
+    offset = "offset"
+    cursor = "cursor"
+
+
+class TotalMode(str, Enum):
+    exact = "exact"
+    cached = "cached"
+    none = "none"
+
+
+class CatalogFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class MedicationImportError(BaseModel):
+    line: int = Field(..., description="Номер строки файла (для CSV заголовок — строка 1)")
+    error: str
+
+
+class MedicationImportResponse(BaseModel):
+    """errors — первые ошибки строк; failed — общее число отклоненных строк."""
+
+    created: int
+    failed: int
+    errors: List[MedicationImportError]
+
+
 class PaginatedMedicationsResponse(BaseModel):
+    """total/pages — None, если total не запрошен; page/pages — только в режиме offset."""
+
     items: List[MedicationResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    has_more: Optional[bool] = None
 
 
 class MedicationFileResponse(BaseModel):
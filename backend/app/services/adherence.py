@@ -0,0 +1,144 @@
+"""
+Инкрементальные rollup-таблицы соблюдения режима (adherence_daily / adherence_weekly).
+
+Обработчики записи собирают изменения счетчиков в AdherenceDelta и применяют их
+в своей транзакции: одна пачка UPSERT ... counter = counter + excluded.counter
+на каждую таблицу. Тренды читают только rollup-таблицы.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.services.appointment_occurrences import ALL_MEMBERS, expand_series
+from app.utils.sql import dialect_insert
+
+COUNTERS = ("total", "pending", "taken", "skipped")
+
+
+def member_key(family_member_id: Optional[int]) -> int:
+    return family_member_id or 0
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+class AdherenceDelta:
+    """Накопитель изменений счетчиков {(family_member_id, date): Counter(status -> delta)}."""
+
+    def __init__(self) -> None:
+        self._days: dict[tuple[Optional[int], date], Counter] = defaultdict(Counter)
+
+    def add(self, family_member_id: Optional[int], day: date, status: str, count: int = 1) -> None:
+        if count:
+            self._days[(family_member_id, day)][status] += count
+
+    def remove(self, family_member_id: Optional[int], day: date, status: str, count: int = 1) -> None:
+        self.add(family_member_id, day, status, -count)
+
+    def move(self, family_member_id: Optional[int], day: date, old_status: str, new_status: str) -> None:
+        if old_status != new_status:
+            self.remove(family_member_id, day, old_status)
+            self.add(family_member_id, day, new_status)
+
+    def add_series(self, series: db_models.AppointmentSeries, sign: int = 1) -> None:
+        for day, _ in expand_series(series, series.start_date, series.end_date):
+            self.add(series.family_member_id, day, "pending", sign)
+
+    def remove_scope(self, db: Session, user_id: int, **scope) -> None:
+        """Вычесть все приемы, которые будут удалены каскадом (лекарство, член семьи, курс)."""
+        self.add_scope(db, user_id, sign=-1, **scope)
+
+    def add_scope(
+        self,
+        db: Session,
+        user_id: int,
+        *,
+        sign: int = 1,
+        medication_id: Optional[int] = None,
+        family_member_id=ALL_MEMBERS,
+        series_id: Optional[int] = None,
+    ) -> None:
+        """
+        Учесть все приемы области со знаком sign: сохраненные строки — одним GROUP BY,
+        виртуальные дозы — разворачиванием серий (кроме доз с исключениями).
+        """
+        appt, series_model = db_models.Appointment, db_models.AppointmentSeries
+        appt_filters = [appt.user_id == user_id]
+        series_filters = [series_model.user_id == user_id]
+        if medication_id is not None:
+            appt_filters.append(appt.medication_id == medication_id)
+            series_filters.append(series_model.medication_id == medication_id)
+        if family_member_id is not ALL_MEMBERS:
+            appt_filters.append(appt.family_member_id == family_member_id)
+            series_filters.append(series_model.family_member_id == family_member_id)
+        if series_id is not None:
+            appt_filters.append(appt.series_id == series_id)
+            series_filters.append(series_model.id == series_id)
+
+        grouped = db.execute(
+            select(appt.family_member_id, appt.date, appt.status, func.count(appt.id))
+            .where(*appt_filters)
+            .group_by(appt.family_member_id, appt.date, appt.status)
+        ).all()
+        for member_id, day, status, count in grouped:
+            self.add(member_id, day, status, sign * count)
+
+        series_list = db.query(series_model).filter(*series_filters).all()
+        if not series_list:
+            return
+        overridden = set(
+            db.execute(
+                select(appt.series_id, appt.date, appt.time).where(appt.series_id.in_([s.id for s in series_list]))
+            ).all()
+        )
+        for series in series_list:
+            for day, tm in expand_series(series, series.start_date, series.end_date):
+                if (series.id, day, tm) not in overridden:
+                    self.add(series.family_member_id, day, "pending", sign)
+
+    def apply(self, db: Session, user_id: int) -> None:
+        daily: dict[tuple[int, date], Counter] = defaultdict(Counter)
+        weekly: dict[tuple[int, date], Counter] = defaultdict(Counter)
+        for (family_member_id, day), statuses in self._days.items():
+            key = member_key(family_member_id)
+            for status, count in statuses.items():
+                daily[(key, day)][status] += count
+                daily[(key, day)]["total"] += count
+                weekly[(key, week_start(day))][status] += count
+                weekly[(key, week_start(day))]["total"] += count
+        _upsert(db, db_models.AdherenceDaily.__table__, "date", user_id, daily)
+        _upsert(db, db_models.AdherenceWeekly.__table__, "week_start", user_id, weekly)
+        self._days.clear()
+
+
+def _upsert(db: Session, table, period_column: str, user_id: int, counters: dict) -> None:
+    params = [
+        {"user_id": user_id, "member_key": key, period_column: period, **{c: delta.get(c, 0) for c in COUNTERS}}
+        for (key, period), delta in counters.items()
+        if any(delta.values())
+    ]
+    if not params:
+        return
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.member_key, table.c[period_column]],
+        set_={c: table.c[c] + stmt.excluded[c] for c in COUNTERS},
+    )
+    db.execute(stmt, params)
+
+
+def rebuild_rollups(db: Session, user_id: int) -> None:
+    """Пересчитать rollup-таблицы пользователя с нуля (миграция / восстановление после сбоя)."""
+    for model in (db_models.AdherenceDaily, db_models.AdherenceWeekly):
+        db.execute(delete(model).where(model.user_id == user_id))
+    delta = AdherenceDelta()
+    delta.add_scope(db, user_id)
+    delta.apply(db, user_id)
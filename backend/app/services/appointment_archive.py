@@ -0,0 +1,230 @@
+"""
+Помесячное секционирование appointments (PostgreSQL) и перенос старых приемов в appointments_archive.
+
+В PostgreSQL после миграции partition_appointments таблица appointments секционирована
+по date (RANGE, партиция на месяц: appointments_pYYYY_MM, плюс appointments_default).
+Все горячие запросы ограничены датой, поэтому планировщик читает только нужные партиции.
+Архивация отсоединяет целые партиции старше порога и переносит их строки в архив одним
+INSERT ... SELECT; на SQLite и несекционированной таблице строки переносятся по условию date < порога.
+
+Строки-исключения виртуальных курсов (series_id) остаются в appointments: без них старые
+дозы серии снова развернулись бы как pending. В секционированной таблице они возвращаются
+в новую партицию своего месяца (в ней только исключения), а не в appointments_default:
+партиция по умолчанию не растет от архивации, и запросы по свежим датам ее не читают.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.services.data_version import bump_data_version
+
+PARTITION_PREFIX = "appointments_p"
+DEFAULT_PARTITION = "appointments_default"
+_COLUMNS = ("id", "user_id", "medication_id", "family_member_id", "date", "time", "status", "series_id")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def archive_cutoff(today: date, after_days: int) -> date:
+    """Граница архивации — начало месяца, в который попадает today - after_days (архивируются целые месяцы)."""
+    return month_start(today - timedelta(days=after_days))
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(
+        db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'appointments' AND c.relnamespace = current_schema()::regnamespace"
+            )
+        ).first()
+    )
+
+
+def create_dose_index(db: Session, table_name: str) -> None:
+    """
+    Уникальность дозы внутри партиции (date входит в ключ, значит и во всей таблице).
+    Уникальный индекс по выражению coalesce(family_member_id, 0) создается на каждой партиции.
+    """
+    db.execute(
+        text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_uq_dose ON {table_name} "
+            "(user_id, medication_id, coalesce(family_member_id, 0), date, time)"
+        )
+    )
+
+
+def ensure_month_partitions(db: Session, first_month: date, last_month: date) -> list[str]:
+    """Создать недостающие месячные партиции в диапазоне [first_month, last_month]; вернуть созданные."""
+    existing = {
+        row[0]
+        for row in db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'appointments'"
+            )
+        )
+    }
+    has_default = DEFAULT_PARTITION in existing
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(month)
+        if name not in existing:
+            bounds = {"start": month, "end": next_month(month)}
+            in_default = has_default and db.execute(
+                text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end LIMIT 1"), bounds
+            ).first()
+            if in_default:
+                # Строки месяца уже лежат в партиции по умолчанию: отсоединяем ее, создаем месяц,
+                # переносим строки и присоединяем обратно (иначе CREATE ... PARTITION OF отклонит границы)
+                db.execute(text(f"ALTER TABLE appointments DETACH PARTITION {DEFAULT_PARTITION}"))
+            db.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF appointments "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                )
+            )
+            create_dose_index(db, name)
+            if in_default:
+                db.execute(
+                    text(
+                        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end "
+                        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+                    ),
+                    bounds,
+                )
+                db.execute(text(f"ALTER TABLE appointments ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def _partitions_before(db: Session, cutoff: date) -> list[tuple[str, date]]:
+    months = []
+    for (name,) in db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'appointments' AND c.relname LIKE :prefix"
+        ),
+        {"prefix": f"{PARTITION_PREFIX}%"},
+    ):
+        year, month = name[len(PARTITION_PREFIX) :].split("_")
+        start = date(int(year), int(month), 1)
+        if next_month(start) <= cutoff:
+            months.append((name, start))
+    return sorted(months, key=lambda item: item[1])
+
+
+def archive_appointments(db: Session, cutoff: date) -> int:
+    """
+    Перенести приемы с date < cutoff в appointments_archive (в текущей транзакции, без commit).
+    Версии данных затронутых пользователей увеличиваются (кэш PDF/ICS). Возвращает число строк.
+    """
+    if is_partitioned(db):
+        return _archive_partitions(db, cutoff)
+
+    appt, archive = db_models.Appointment.__table__, db_models.AppointmentArchive.__table__
+    condition = (appt.c.date < cutoff) & appt.c.series_id.is_(None)
+    user_ids = db.execute(select(appt.c.user_id).where(condition).distinct()).scalars().all()
+    if not user_ids:
+        return 0
+    moved = db.execute(
+        insert(archive).from_select(
+            list(_COLUMNS),
+            select(*(appt.c[name] for name in _COLUMNS)).where(condition),
+        )
+    ).rowcount
+    db.execute(delete(appt).where(condition))
+    for user_id in user_ids:
+        bump_data_version(db, user_id)
+    return moved
+
+
+def _archive_partitions(db: Session, cutoff: date) -> int:
+    columns = ", ".join(_COLUMNS)
+    moved = 0
+    user_ids: set[int] = set()
+    for name, start in _partitions_before(db, cutoff):
+        if not db.execute(text(f"SELECT 1 FROM {name} WHERE series_id IS NULL LIMIT 1")).first():
+            # Остались только исключения серий — месяц уже заархивирован
+            continue
+        user_ids.update(db.execute(text(f"SELECT DISTINCT user_id FROM {name}")).scalars())
+        detached = f"{name}_detached"
+        db.execute(text(f"ALTER TABLE appointments DETACH PARTITION {name}"))
+        db.execute(text(f"ALTER TABLE {name} RENAME TO {detached}"))
+        moved += db.execute(
+            text(
+                f"INSERT INTO appointments_archive ({columns}, archived_at) "
+                f"SELECT {columns}, now() FROM {detached} WHERE series_id IS NULL"
+            )
+        ).rowcount
+        has_exceptions = db.execute(text(f"SELECT 1 FROM {detached} WHERE series_id IS NOT NULL LIMIT 1")).first()
+        if has_exceptions:
+            # Исключения виртуальных курсов остаются в своем месяце — в новой небольшой партиции
+            db.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF appointments "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{next_month(start).isoformat()}')"
+                )
+            )
+            db.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {detached} WHERE series_id IS NOT NULL"))
+        db.execute(text(f"DROP TABLE {detached}"))
+        if has_exceptions:
+            # Имя уникального индекса освобождается только вместе с отсоединенной таблицей
+            create_dose_index(db, name)
+    for user_id in sorted(user_ids):
+        bump_data_version(db, user_id)
+    return moved
+
+
+def _past_months_in_default(db: Session, before: date) -> list[date]:
+    """Месяцы до before, строки которых лежат в партиции по умолчанию (например, исключения прежних архиваций)."""
+    return [
+        row[0]
+        for row in db.execute(
+            text(
+                f"SELECT DISTINCT date_trunc('month', date)::date FROM {DEFAULT_PARTITION} "
+                "WHERE date < :before ORDER BY 1"
+            ),
+            {"before": before},
+        )
+    ]
+
+
+def run_maintenance(db: Session, *, today: date, after_days: int, months_ahead: int) -> tuple[int, Optional[list[str]]]:
+    """Архивация и (для секционированной таблицы) создание партиций на months_ahead месяцев вперед."""
+    moved = archive_appointments(db, archive_cutoff(today, after_days))
+    created = None
+    if is_partitioned(db):
+        last = month_start(today)
+        for _ in range(months_ahead):
+            last = next_month(last)
+        # Курсы, созданные дальше горизонта, попали в партицию по умолчанию — выделяем им месяцы
+        furthest = db.execute(text(f"SELECT max(date) FROM {DEFAULT_PARTITION}")).scalar()
+        if furthest is not None and furthest > last:
+            last = month_start(furthest)
+        # Прошедшие месяцы из партиции по умолчанию тоже получают свои партиции
+        created = []
+        for month in _past_months_in_default(db, month_start(today)):
+            created += ensure_month_partitions(db, month, month)
+        created += ensure_month_partitions(db, month_start(today), last)
+    return moved, created
@@ -0,0 +1,71 @@
+"""Агрегация календаря: количество приемов по дням и статусам за неделю/месяц одним GROUP BY."""
+
+from __future__ import annotations
+
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.services.appointment_occurrences import ALL_MEMBERS, expand_series, query_series
+
+STATUSES = ("pending", "taken", "skipped")
+
+
+def calendar_window(selected: date, view_type: str) -> tuple[date, date]:
+    """month — с 1-го по последний день месяца; week — с понедельника по воскресенье."""
+    if view_type == "week":
+        start = selected - timedelta(days=selected.weekday())
+        return start, start + timedelta(days=6)
+    last_day = calendar.monthrange(selected.year, selected.month)[1]
+    return selected.replace(day=1), selected.replace(day=last_day)
+
+
+def count_by_day(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    family_member_id=ALL_MEMBERS,
+) -> dict[tuple[date, Optional[int]], dict[str, int]]:
+    """
+    Счетчики {(дата, family_member_id): {status: count}} за окно.
+    Сохраненные строки — один запрос GROUP BY date, family_member_id, status;
+    виртуальные серии разворачиваются в памяти (дозы с исключениями уже учтены в строках).
+    """
+    appt = db_models.Appointment
+    filters = [appt.user_id == user_id, appt.date >= start, appt.date <= end]
+    if family_member_id is None:
+        filters.append(appt.family_member_id.is_(None))
+    elif family_member_id is not ALL_MEMBERS:
+        filters.append(appt.family_member_id == family_member_id)
+
+    counts: dict[tuple[date, Optional[int]], dict[str, int]] = defaultdict(lambda: dict.fromkeys(STATUSES, 0))
+    rows = (
+        db.query(appt.date, appt.family_member_id, appt.status, func.count(appt.id))
+        .filter(*filters)
+        .group_by(appt.date, appt.family_member_id, appt.status)
+        .all()
+    )
+    for day, member_id, status, count in rows:
+        bucket = counts[(day, member_id)]
+        bucket[status] = bucket.get(status, 0) + count
+
+    series_list = query_series(db, user_id=user_id, start=start, end=end, family_member_id=family_member_id)
+    if series_list:
+        overridden = set(
+            db.query(appt.series_id, appt.date, appt.time)
+            .filter(*filters)
+            .filter(appt.series_id.in_([s.id for s in series_list]))
+            .all()
+        )
+        for series in series_list:
+            for day, tm in expand_series(series, start, end):
+                if (series.id, day, tm) not in overridden:
+                    counts[(day, series.family_member_id)]["pending"] += 1
+    return counts
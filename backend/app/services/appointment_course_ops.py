@@ -0,0 +1,180 @@
+"""
+Операции над курсом целиком: удаление предстоящих доз и сдвиг будущих доз на N минут.
+
+Удаление и обычный сдвиг — один DELETE / UPDATE по условию, без загрузки строк в ORM.
+Сдвиг, при котором дозы курса налезают друг на друга, стоит дороже: два UPDATE (парковка и возврат
+по id запаркованных строк, см. _PARK_YEARS), а на секционированной по месяцам таблице PostgreSQL
+каждая строка курса дважды переезжает между партициями (в партицию по умолчанию и обратно).
+Rollup-счетчики корректируются по строкам из RETURNING самих DELETE / UPDATE: параллельная смена
+статуса между выборкой и изменением не искажает счетчики. UPDATE возвращает новые дату и время,
+исходный день восстанавливается обратным сдвигом.
+Операции затрагивают только сохраненные строки: виртуальные курсы удаляются через
+DELETE /appointments/series/{id}, а строки-исключения серий не сдвигаются.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, DateTime, Interval, Time, and_, cast, delete, func, literal_column, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.models import db_models
+from app.services.adherence import AdherenceDelta
+from app.services.appointment_occurrences import ALL_MEMBERS
+
+# Сдвиг, при котором дозы курса налезают друг на друга (например, на сутки при ежедневном курсе),
+# выполняется через «парковку»: строки сначала уносятся на 400 лет вперед (григорианский цикл,
+# 29 февраля сохраняется), затем ставятся на место — уникальный индекс проверяется построчно.
+_PARK_YEARS = 400
+# id запаркованных строк возвращаются на место пачками (лимит параметров запроса)
+_RESTORE_BATCH = 500
+
+
+class DoseConflictError(Exception):
+    """Сдвинутая доза совпала бы с уже существующим приемом."""
+
+
+@dataclass
+class CourseScope:
+    user_id: int
+    medication_id: int
+    start: date
+    end: date
+    family_member_id: object = ALL_MEMBERS
+    times: list[time] = field(default_factory=list)
+
+    def filters(self, table) -> list:
+        conditions = [
+            table.user_id == self.user_id,
+            table.medication_id == self.medication_id,
+            table.date >= self.start,
+            table.date <= self.end,
+            table.status == "pending",
+            table.series_id.is_(None),
+        ]
+        if self.family_member_id is None:
+            conditions.append(table.family_member_id.is_(None))
+        elif self.family_member_id is not ALL_MEMBERS:
+            conditions.append(table.family_member_id == self.family_member_id)
+        if self.times:
+            conditions.append(table.time.in_(self.times))
+        return conditions
+
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _shifted(db: Session, table, minutes: int, years: int = 0):
+    """Выражения (новая дата, новое время) для date + time + minutes (+ years)."""
+    if db.get_bind().dialect.name == "postgresql":
+        moment = cast(table.date, DateTime) + cast(table.time, Interval) + timedelta(minutes=minutes)
+        if years:
+            moment = moment + literal_column(f"interval '{years} years'")
+        return cast(moment, Date), cast(moment, Time)
+    modifiers = [f"{minutes:+d} minutes"] + ([f"{years:+d} years"] if years else [])
+    moment = func.datetime(table.date.op("||")(literal_column("' '")).op("||")(table.time), *modifiers)
+    return func.date(moment), func.strftime("%H:%M:%S.000000", moment)
+
+
+def delete_pending_doses(db: Session, scope: CourseScope) -> int:
+    """Удалить предстоящие дозы курса одним DELETE; вернуть число удаленных строк."""
+    table = db_models.Appointment.__table__
+    deleted = db.execute(
+        delete(table).where(*scope.filters(table.c)).returning(table.c.family_member_id, table.c.date)
+    ).all()
+    rollup = AdherenceDelta()
+    for (member_id, day), count in Counter(deleted).items():
+        rollup.remove(member_id, day, "pending", count)
+    rollup.apply(db, scope.user_id)
+    return len(deleted)
+
+
+def shift_future_doses(db: Session, scope: CourseScope, minutes: int, now: Optional[datetime] = None) -> int:
+    """
+    Сдвинуть будущие предстоящие дозы курса на minutes минут; вернуть число строк.
+    DoseConflictError, если сдвинутая доза совпадет с приемом вне сдвигаемого набора.
+    """
+    now = now or datetime.now()
+    appt = db_models.Appointment
+    target = aliased(appt, name="target")
+    other = aliased(appt, name="other")
+
+    def in_scope(table) -> list:
+        future = or_(table.date > now.date(), and_(table.date == now.date(), table.time >= now.time()))
+        return scope.filters(table) + [future]
+
+    new_date, new_time = _shifted(db, target, minutes)
+    # Совпадения сдвинутых доз с существующими: вне набора — конфликт, внутри — нужна парковка
+    collisions = db.execute(
+        select(
+            func.count(other.id).filter(and_(*in_scope(other))),
+            func.count(other.id),
+        )
+        .select_from(target)
+        .join(
+            other,
+            and_(
+                other.user_id == target.user_id,
+                other.medication_id == target.medication_id,
+                func.coalesce(other.family_member_id, 0) == func.coalesce(target.family_member_id, 0),
+                other.date == new_date,
+                other.time == new_time,
+            ),
+        )
+        .where(*in_scope(target))
+    ).one()
+    internal, total = collisions
+    if total > internal:
+        raise DoseConflictError()
+
+    table = appt.__table__
+    if internal:
+        parked_date, parked_time = _shifted(db, table.c, minutes, years=_PARK_YEARS)
+        parked = db.execute(
+            update(table)
+            .where(*in_scope(table.c))
+            .values(date=parked_date, time=parked_time)
+            .returning(table.c.id, table.c.family_member_id, table.c.date, table.c.time)
+        ).all()
+        # Возвращаются ровно запаркованные строки; диапазон дат — для отсечения партиций
+        first = (datetime.combine(scope.start, time.min) + timedelta(minutes=minutes)).date()
+        last = (datetime.combine(scope.end, time.max) + timedelta(minutes=minutes)).date()
+        restored_date, _ = _shifted(db, table.c, 0, years=-_PARK_YEARS)
+        parked_ids = [row.id for row in parked]
+        for offset in range(0, len(parked_ids), _RESTORE_BATCH):
+            db.execute(
+                update(table)
+                .where(
+                    table.c.id.in_(parked_ids[offset : offset + _RESTORE_BATCH]),
+                    table.c.date >= first.replace(year=first.year + _PARK_YEARS),
+                    table.c.date <= last.replace(year=last.year + _PARK_YEARS),
+                )
+                .values(date=restored_date)
+            )
+        moved = [
+            (member_id, _as_date(day).replace(year=_as_date(day).year - _PARK_YEARS), tm)
+            for _, member_id, day, tm in parked
+        ]
+    else:
+        moved_date, moved_time = _shifted(db, table.c, minutes)
+        moved = db.execute(
+            update(table)
+            .where(*in_scope(table.c))
+            .values(date=moved_date, time=moved_time)
+            .returning(table.c.family_member_id, table.c.date, table.c.time)
+        ).all()
+
+    rollup = AdherenceDelta()
+    for member_id, moved_day, moved_time in moved:
+        moved_day = _as_date(moved_day)
+        old_day = (datetime.combine(moved_day, moved_time) - timedelta(minutes=minutes)).date()
+        if moved_day != old_day:
+            rollup.remove(member_id, old_day, "pending")
+            rollup.add(member_id, moved_day, "pending")
+    rollup.apply(db, scope.user_id)
+    return len(moved)
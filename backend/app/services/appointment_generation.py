@@ -0,0 +1,123 @@
+"""Генерация приемов по курсу: разбор времён один раз и пакетная вставка строк через Core."""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.utils.sql import dialect_insert
+
+PERIOD_STEPS = {"daily": 1, "every_other_day": 2}
+
+# PostgreSQL: multi-row VALUES; 7 колонок * 1000 строк укладывается в лимит параметров.
+_PG_VALUES_CHUNK = 1000
+
+
+@dataclass
+class BulkInsertResult:
+    count: int
+    first_id: Optional[int]
+    last_id: Optional[int]
+    skipped: int = 0
+    # Вставленные строки по (family_member_id, date) — для rollup-счетчиков
+    inserted_by_day: Counter = field(default_factory=Counter)
+
+
+def parse_times(times: Iterable[str]) -> list[time]:
+    """Разобрать список HH:MM один раз на весь курс; дубликаты отбрасываются. ValueError при ошибке формата."""
+    parsed: dict[time, None] = {}
+    for tm in times:
+        parsed[datetime.strptime(tm, "%H:%M").time()] = None
+    return list(parsed)
+
+
+def iter_course_dates(start_date: date, end_date: date, period_type: str) -> Iterator[date]:
+    step = timedelta(days=PERIOD_STEPS[period_type])
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += step
+
+
+def build_appointment_rows(
+    *,
+    user_id: int,
+    medication_id: int,
+    family_member_id: Optional[int],
+    start_date: date,
+    end_date: date,
+    period_type: str,
+    times: list[time],
+) -> list[dict]:
+    return [
+        {
+            "user_id": user_id,
+            "medication_id": medication_id,
+            "family_member_id": family_member_id,
+            "date": day,
+            "time": tm,
+            "status": "pending",
+        }
+        for day in iter_course_dates(start_date, end_date, period_type)
+        for tm in times
+    ]
+
+
+def bulk_insert_appointments(db: Session, rows: list[dict]) -> BulkInsertResult:
+    """
+    Вставить строки приемов без создания ORM-объектов (в текущей транзакции, без commit).
+
+    INSERT ... ON CONFLICT DO NOTHING по уникальному индексу дозы uq_appointments_dose:
+    уже существующие дозы пропускаются, повторный или расширенный курс добавляет только недостающие.
+    SQLite — один executemany; пропущенные строки не расходуют rowid, поэтому вставленные
+    id идут подряд и заканчиваются на last_insert_rowid(), пока транзакция держит блокировку записи.
+    PostgreSQL — multi-row VALUES ... RETURNING (возвращаются только вставленные строки).
+    """
+    if not rows:
+        return BulkInsertResult(count=0, first_id=None, last_id=None)
+
+    table = db_models.Appointment.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = []
+        for start in range(0, len(rows), _PG_VALUES_CHUNK):
+            chunk = rows[start : start + _PG_VALUES_CHUNK]
+            stmt = (
+                dialect_insert(db, table)
+                .values(chunk)
+                .on_conflict_do_nothing()
+                .returning(table.c.id, table.c.family_member_id, table.c.date)
+            )
+            inserted.extend(db.execute(stmt).all())
+        ids = [row.id for row in inserted]
+        return BulkInsertResult(
+            count=len(ids),
+            first_id=min(ids, default=None),
+            last_id=max(ids, default=None),
+            skipped=len(rows) - len(ids),
+            inserted_by_day=Counter((row.family_member_id, row.date) for row in inserted),
+        )
+
+    result = db.execute(dialect_insert(db, table).on_conflict_do_nothing(), rows)
+    count = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(rows)
+    if count == 0:
+        return BulkInsertResult(count=0, first_id=None, last_id=None, skipped=len(rows))
+    last_id = db.execute(text("SELECT last_insert_rowid()")).scalar_one()
+    first_id = last_id - count + 1
+    by_day = db.execute(
+        select(table.c.family_member_id, table.c.date, func.count())
+        .where(table.c.id.between(first_id, last_id))
+        .group_by(table.c.family_member_id, table.c.date)
+    ).all()
+    return BulkInsertResult(
+        count=count,
+        first_id=first_id,
+        last_id=last_id,
+        skipped=len(rows) - count,
+        inserted_by_day=Counter({(member_id, day): n for member_id, day, n in by_day}),
+    )
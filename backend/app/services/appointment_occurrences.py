@@ -0,0 +1,201 @@
+"""
+Виртуальные приемы: разворачивание AppointmentSeries в дозы для окна дат.
+
+В таблице appointments для серии хранятся только исключения — дозы, статус которых
+отличается от pending. Остальные дозы вычисляются на лету и имеют id = None.
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from app.models import db_models
+from app.services.appointment_generation import PERIOD_STEPS, parse_times
+
+# Фильтр «все члены семьи» (в отличие от None — «только сам пользователь»)
+ALL_MEMBERS = object()
+
+
+@dataclass
+class Occurrence:
+    id: Optional[int]
+    series_id: Optional[int]
+    medication_id: int
+    medication_name: str
+    family_member_id: Optional[int]
+    date: date
+    time: time
+    status: str
+
+
+def series_times(series: db_models.AppointmentSeries) -> list[time]:
+    return parse_times(t for t in series.times.split(",") if t)
+
+
+def is_series_occurrence(series: db_models.AppointmentSeries, day: date, tm: time) -> bool:
+    if not series.start_date <= day <= series.end_date:
+        return False
+    if (day - series.start_date).days % PERIOD_STEPS[series.period_type]:
+        return False
+    return tm in series_times(series)
+
+
+def expand_series(series: db_models.AppointmentSeries, start: date, end: date) -> Iterator[tuple[date, time]]:
+    """Дозы серии в окне [start, end] с шагом периода, отсчитываемым от start_date серии."""
+    step = PERIOD_STEPS[series.period_type]
+    first = max(start, series.start_date)
+    offset = (first - series.start_date).days % step
+    if offset:
+        first += timedelta(days=step - offset)
+    last = min(end, series.end_date)
+    # Порядок (date, time) нужен потребителям, сливающим серии через heapq.merge
+    times = sorted(series_times(series))
+    current = first
+    while current <= last:
+        for tm in times:
+            yield current, tm
+        current += timedelta(days=step)
+
+
+def query_series(db: Session, *, user_id: int, start: date, end: date, family_member_id=ALL_MEMBERS):
+    query = (
+        db.query(db_models.AppointmentSeries)
+        .options(joinedload(db_models.AppointmentSeries.medication))
+        .filter(db_models.AppointmentSeries.user_id == user_id)
+        .filter(db_models.AppointmentSeries.start_date <= end)
+        .filter(db_models.AppointmentSeries.end_date >= start)
+    )
+    if family_member_id is None:
+        query = query.filter(db_models.AppointmentSeries.family_member_id.is_(None))
+    elif family_member_id is not ALL_MEMBERS:
+        query = query.filter(db_models.AppointmentSeries.family_member_id == family_member_id)
+    return query.all()
+
+
+def virtual_occurrences(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    stored: Iterable[db_models.Appointment],
+    family_member_id=ALL_MEMBERS,
+) -> list[Occurrence]:
+    """Развернуть серии пользователя, пропуская дозы, для которых уже есть строка-исключение."""
+    overridden = {(a.series_id, a.date, a.time) for a in stored if a.series_id is not None}
+    result = []
+    for series in query_series(db, user_id=user_id, start=start, end=end, family_member_id=family_member_id):
+        name = series.medication.name if series.medication else ""
+        for day, tm in expand_series(series, start, end):
+            if (series.id, day, tm) in overridden:
+                continue
+            result.append(
+                Occurrence(
+                    id=None,
+                    series_id=series.id,
+                    medication_id=series.medication_id,
+                    medication_name=name,
+                    family_member_id=series.family_member_id,
+                    date=day,
+                    time=tm,
+                    status="pending",
+                )
+            )
+    return result
+
+
+def stored_occurrence(appointment: db_models.Appointment) -> Occurrence:
+    return Occurrence(
+        id=appointment.id,
+        series_id=appointment.series_id,
+        medication_id=appointment.medication_id,
+        medication_name=appointment.medication.name if appointment.medication else "",
+        family_member_id=appointment.family_member_id,
+        date=appointment.date,
+        time=appointment.time,
+        status=appointment.status,
+    )
+
+
+def merge_occurrences(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    stored: list[db_models.Appointment],
+    family_member_id=ALL_MEMBERS,
+) -> list[Occurrence]:
+    occurrences = [stored_occurrence(a) for a in stored]
+    occurrences.extend(
+        virtual_occurrences(
+            db, user_id=user_id, start=start, end=end, stored=stored, family_member_id=family_member_id
+        )
+    )
+    occurrences.sort(key=lambda o: (o.date, o.time, o.id or 0))
+    return occurrences
+
+
+def iter_occurrences(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    family_member_id=ALL_MEMBERS,
+    batch_size: int = 500,
+) -> Iterator[Occurrence]:
+    """
+    Потоковый обход приемов окна в порядке (date, time): сохраненные строки читаются
+    порциями через yield_per (только нужные колонки), виртуальные серии разворачиваются
+    лениво и сливаются с ними через heapq.merge.
+    """
+    appt, med = db_models.Appointment, db_models.Medication
+    filters = [appt.user_id == user_id, appt.date >= start, appt.date <= end]
+    if family_member_id is None:
+        filters.append(appt.family_member_id.is_(None))
+    elif family_member_id is not ALL_MEMBERS:
+        filters.append(appt.family_member_id == family_member_id)
+
+    series_list = query_series(db, user_id=user_id, start=start, end=end, family_member_id=family_member_id)
+    overridden = set()
+    if series_list:
+        overridden = set(
+            db.execute(
+                select(appt.series_id, appt.date, appt.time)
+                .where(*filters)
+                .where(appt.series_id.in_([s.id for s in series_list]))
+            ).all()
+        )
+
+    stmt = (
+        select(
+            appt.id,
+            appt.series_id,
+            appt.medication_id,
+            med.name,
+            appt.family_member_id,
+            appt.date,
+            appt.time,
+            appt.status,
+        )
+        .join(med, med.id == appt.medication_id)
+        .where(*filters)
+        .order_by(appt.date, appt.time, appt.id)
+        .execution_options(yield_per=batch_size)
+    )
+    stored = (Occurrence(*row) for row in db.execute(stmt))
+
+    def _expand(series: db_models.AppointmentSeries) -> Iterator[Occurrence]:
+        name = series.medication.name if series.medication else ""
+        for day, tm in expand_series(series, start, end):
+            if (series.id, day, tm) not in overridden:
+                yield Occurrence(None, series.id, series.medication_id, name, series.family_member_id, day, tm, "pending")
+
+    yield from heapq.merge(stored, *(_expand(s) for s in series_list), key=lambda o: (o.date, o.time))
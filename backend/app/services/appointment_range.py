@@ -0,0 +1,167 @@
+"""
+Постраничный (keyset) список приемов за диапазон дат в порядке (date, time, id).
+
+Сохраненные строки читаются условием (date, time, id) > курсора по индексу
+ix_appointments_user_date_time_id, поэтому глубокие страницы стоят столько же,
+сколько первая. Виртуальные дозы серий встраиваются в тот же порядок: при равных
+(date, time) сохраненная строка идет раньше виртуальной, виртуальные — по series_id.
+"""
+
+from __future__ import annotations
+
+import base64
+import heapq
+import itertools
+from dataclasses import dataclass
+from datetime import date, time
+from typing import Iterator, Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.services.appointment_occurrences import ALL_MEMBERS, Occurrence, expand_series, query_series
+
+# Второй элемент ключа сортировки: сохраненная строка или виртуальная доза серии
+_STORED, _VIRTUAL = 0, 1
+
+
+@dataclass(frozen=True)
+class RangeCursor:
+    date: date
+    time: time
+    kind: int
+    key: int
+
+    def encode(self) -> str:
+        raw = f"{self.date.isoformat()}|{self.time.isoformat()}|{self.kind}|{self.key}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "RangeCursor":
+        """ValueError, если курсор поврежден."""
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            day, tm, kind, key = raw.split("|")
+            cursor = cls(date.fromisoformat(day), time.fromisoformat(tm), int(kind), int(key))
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ValueError("invalid cursor") from exc
+        if cursor.kind not in (_STORED, _VIRTUAL):
+            raise ValueError("invalid cursor")
+        return cursor
+
+
+def _sort_key(o: Occurrence) -> tuple:
+    if o.id is not None:
+        return (o.date, o.time, _STORED, o.id)
+    return (o.date, o.time, _VIRTUAL, o.series_id)
+
+
+def page_occurrences(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    limit: int,
+    after: Optional[RangeCursor] = None,
+    status: Optional[str] = None,
+    medication_id: Optional[int] = None,
+    family_member_id=ALL_MEMBERS,
+) -> tuple[list[Occurrence], Optional[RangeCursor]]:
+    """Страница приемов после курсора after и курсор следующей страницы (None — страниц больше нет)."""
+    appt, med = db_models.Appointment, db_models.Medication
+    filters = [appt.user_id == user_id, appt.date >= start, appt.date <= end]
+    if status is not None:
+        filters.append(appt.status == status)
+    if medication_id is not None:
+        filters.append(appt.medication_id == medication_id)
+    if family_member_id is None:
+        filters.append(appt.family_member_id.is_(None))
+    elif family_member_id is not ALL_MEMBERS:
+        filters.append(appt.family_member_id == family_member_id)
+
+    stmt = (
+        select(
+            appt.id,
+            appt.series_id,
+            appt.medication_id,
+            med.name,
+            appt.family_member_id,
+            appt.date,
+            appt.time,
+            appt.status,
+        )
+        .join(med, med.id == appt.medication_id)
+        .where(*filters)
+    )
+    if after is not None:
+        if after.kind == _STORED:
+            stmt = stmt.where(tuple_(appt.date, appt.time, appt.id) > tuple_(after.date, after.time, after.key))
+        else:
+            stmt = stmt.where(tuple_(appt.date, appt.time) > tuple_(after.date, after.time))
+    stmt = stmt.order_by(appt.date, appt.time, appt.id).limit(limit + 1)
+    stored = [Occurrence(*row) for row in db.execute(stmt)]
+
+    virtual: list[Iterator[Occurrence]] = []
+    if status in (None, "pending"):
+        window_start = max(start, after.date) if after is not None else start
+        # Виртуальные дозы дальше последней прочитанной строки на эту страницу не попадут
+        window_end = stored[-1].date if len(stored) > limit else end
+        virtual = _virtual_after(
+            db,
+            user_id=user_id,
+            start=window_start,
+            end=window_end,
+            after=after,
+            medication_id=medication_id,
+            family_member_id=family_member_id,
+        )
+
+    merged = heapq.merge(stored, *virtual, key=_sort_key)
+    page = list(itertools.islice(merged, limit + 1))
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    last = _sort_key(page[-1])
+    return page, RangeCursor(*last)
+
+
+def _virtual_after(
+    db: Session,
+    *,
+    user_id: int,
+    start: date,
+    end: date,
+    after: Optional[RangeCursor],
+    medication_id: Optional[int],
+    family_member_id,
+) -> list[Iterator[Occurrence]]:
+    if start > end:
+        return []
+    appt = db_models.Appointment
+    series_list = [
+        s
+        for s in query_series(db, user_id=user_id, start=start, end=end, family_member_id=family_member_id)
+        if medication_id is None or s.medication_id == medication_id
+    ]
+    if not series_list:
+        return []
+    overridden = set(
+        db.execute(
+            select(appt.series_id, appt.date, appt.time)
+            .where(appt.user_id == user_id, appt.date >= start, appt.date <= end)
+            .where(appt.series_id.in_([s.id for s in series_list]))
+        ).all()
+    )
+
+    def _expand(series: db_models.AppointmentSeries) -> Iterator[Occurrence]:
+        name = series.medication.name if series.medication else ""
+        for day, tm in expand_series(series, start, end):
+            if (series.id, day, tm) in overridden:
+                continue
+            if after is not None and (day, tm, _VIRTUAL, series.id) <= (after.date, after.time, after.kind, after.key):
+                continue
+            yield Occurrence(None, series.id, series.medication_id, name, series.family_member_id, day, tm, "pending")
+
+    return [_expand(s) for s in series_list]
@@ -0,0 +1,28 @@
+"""Версия данных приемов пользователя для инвалидации кэшей (PDF-отчеты, ETag)."""
+
+from __future__ import annotations
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.utils.sql import dialect_insert
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    version = db.execute(
+        select(db_models.UserDataVersion.version).where(db_models.UserDataVersion.user_id == user_id)
+    ).scalar_one_or_none()
+    return version or 0
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    """Увеличить версию в текущей транзакции (одним UPSERT, без чтения)."""
+    table = db_models.UserDataVersion.__table__
+    stmt = dialect_insert(db, table).values(user_id=user_id, version=1)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={"version": table.c.version + 1},
+        )
+    )
@@ -0,0 +1,135 @@
+"""
+Pub/sub изменений приемов для push-канала клиентам (SSE): интерфейс брокера и реализация в памяти процесса.
+
+Роутеры публикуют событие после commit; каждое подключение клиента держит свою очередь.
+InProcessEventBroker работает в пределах одного процесса API — при нескольких воркерах
+нужен внешний брокер (например, Redis pub/sub) с тем же интерфейсом.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, AsyncContextManager, AsyncIterator, Optional
+
+from app.config import settings
+
+logger = logging.getLogger("app.events")
+
+# Событие, которое получает подписчик, не успевший разобрать очередь: клиенту нужно перечитать данные
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Subscription(ABC):
+    @abstractmethod
+    async def next(self, timeout: float) -> Optional[dict[str, Any]]:
+        """Следующее событие или None, если за timeout секунд событий не было."""
+
+
+class EventBroker(ABC):
+    @abstractmethod
+    async def publish(self, user_id: int, event: dict[str, Any]) -> None:
+        """Доставить событие всем подписчикам пользователя; ошибки доставки не должны ронять запрос."""
+
+    @abstractmethod
+    def subscribe(self, user_id: int) -> AsyncContextManager[Subscription]:
+        """Асинхронный контекстный менеджер подписки; при выходе подписка снимается."""
+
+
+class _QueueSubscription(Subscription):
+    def __init__(self, max_pending: int) -> None:
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_pending)
+
+    def offer(self, event: dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: копить события бессмысленно — сбрасываем очередь и просим перечитать
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+    async def next(self, timeout: float) -> Optional[dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessEventBroker(EventBroker):
+    """Очереди asyncio в памяти процесса; publish и subscribe вызываются из event loop приложения."""
+
+    def __init__(self, max_pending: int = 100) -> None:
+        self.max_pending = max_pending
+        self._subscribers: dict[int, set[_QueueSubscription]] = defaultdict(set)
+        self.published = 0
+
+    async def publish(self, user_id: int, event: dict[str, Any]) -> None:
+        self.published += 1
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.offer(event)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[Subscription]:
+        subscription = _QueueSubscription(self.max_pending)
+        self._subscribers[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+
+_broker: EventBroker | None = None
+
+
+def get_event_broker() -> EventBroker:
+    global _broker
+    if _broker is not None:
+        return _broker
+    if settings.event_broker != "memory":
+        raise ValueError(f"Неизвестный брокер событий: {settings.event_broker}")
+    _broker = InProcessEventBroker(max_pending=settings.events_max_pending)
+    return _broker
+
+
+async def publish_event(user_id: int, event: dict[str, Any]) -> None:
+    """Публикация без влияния на ответ: изменение уже сохранено, потеря события лишь откладывает обновление."""
+    try:
+        await get_event_broker().publish(user_id, event)
+    except Exception:
+        logger.exception("Не удалось опубликовать событие %s", event.get("type"))
+
+
+async def publish_appointments_changed(
+    user_id: int,
+    *,
+    medication_id: Optional[int] = None,
+    family_member_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> None:
+    """
+    appointments.changed — клиенту перечитать приемы в области изменения.
+    None в полях области — без ограничения (все лекарства, члены семьи или даты).
+    """
+    await publish_event(
+        user_id,
+        {
+            "type": "appointments.changed",
+            "medication_id": medication_id,
+            "family_member_id": family_member_id,
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+        },
+    )
@@ -0,0 +1,191 @@
+"""
+Календарная подписка (iCalendar, RFC 5545) на приемы пользователя или члена семьи.
+
+Лента строится для скользящего окна [сегодня - past_days, сегодня + ahead_days] из приемов
+(сохраненных и виртуальных серий) и расписаний членов семьи и отдается потоково, по VEVENT.
+ETag зависит только от версии данных пользователя, члена семьи и начала окна, поэтому
+условный GET отвечается 304 без обращения к appointments; готовый текст кэшируется по тому же ключу.
+Доступ к ленте проверяется по версии ссылок пользователя (users.calendar_feed_version).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, joinedload
+
+from app.models import db_models
+from app.services.appointment_generation import PERIOD_STEPS
+from app.services.appointment_occurrences import ALL_MEMBERS, iter_occurrences
+from app.utils.lru import LRUCache
+
+EVENT_MINUTES = 15
+# Сколько VEVENT собирается в один кусок ответа
+_EVENTS_PER_CHUNK = 200
+_STATUS_LABELS = {"pending": "предстоит", "taken": "принят", "skipped": "пропущен"}
+
+feed_cache = LRUCache(max_entries=64)
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    uid: str
+    date: date
+    time: time
+    summary: str
+    description: str = ""
+
+
+def get_feed_version(db: Session, user_id: int) -> Optional[int]:
+    """Текущая версия ссылок на подписку; None — пользователя нет."""
+    return db.execute(
+        select(db_models.User.calendar_feed_version).where(db_models.User.id == user_id)
+    ).scalar_one_or_none()
+
+
+def rotate_feed_version(db: Session, user_id: int) -> None:
+    """Отозвать все ссылки на подписку пользователя в текущей транзакции."""
+    user = db_models.User
+    db.execute(
+        update(user)
+        .where(user.id == user_id)
+        .values(calendar_feed_version=user.calendar_feed_version + 1)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def feed_window(today: date, past_days: int, ahead_days: int) -> tuple[date, date]:
+    return today - timedelta(days=past_days), today + timedelta(days=ahead_days)
+
+
+def feed_etag(user_id: int, family_member_id: Optional[int], version: int, start: date) -> str:
+    return f'W/"ics-{user_id}-{family_member_id or 0}-{version}-{start:%Y%m%d}"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    """Перенос строк длиннее 75 октетов (RFC 5545, 3.1), не разрывая символы UTF-8."""
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > 75:
+            parts.append(current)
+            current, size = " ", 1
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n".join(parts) + "\r\n"
+
+
+def _format_event(event: FeedEvent, stamp: str) -> str:
+    start = datetime.combine(event.date, event.time)
+    end = start + timedelta(minutes=EVENT_MINUTES)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event.uid}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{start:%Y%m%dT%H%M%S}",
+        f"DTEND:{end:%Y%m%dT%H%M%S}",
+        f"SUMMARY:{_escape(event.summary)}",
+    ]
+    if event.description:
+        lines.append(f"DESCRIPTION:{_escape(event.description)}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def render_calendar(name: str, events: Iterable[FeedEvent]) -> Iterator[bytes]:
+    """VCALENDAR частями: заголовок, события пачками по _EVENTS_PER_CHUNK, окончание."""
+    # Время — «плавающее» (без TZID): приемы хранятся в локальном времени пациента
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Fullstack//Medication reminders//RU",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+    ]
+    yield "".join(_fold(line) for line in header).encode("utf-8")
+    chunk = []
+    for event in events:
+        chunk.append(_format_event(event, stamp))
+        if len(chunk) >= _EVENTS_PER_CHUNK:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    chunk.append("END:VCALENDAR\r\n")
+    yield "".join(chunk).encode("utf-8")
+
+
+def _schedule_events(
+    db: Session, user_id: int, start: date, end: date, family_member_id: Optional[int], members: dict[int, str]
+) -> Iterator[FeedEvent]:
+    schedule = db_models.Schedule
+    query = (
+        db.query(schedule)
+        .join(db_models.FamilyMember, db_models.FamilyMember.id == schedule.family_member_id)
+        .options(joinedload(schedule.medication), joinedload(schedule.time_slots))
+        .filter(
+            db_models.FamilyMember.user_id == user_id,
+            schedule.start_date <= end,
+            schedule.end_date >= start,
+        )
+    )
+    if family_member_id is not None:
+        query = query.filter(schedule.family_member_id == family_member_id)
+    for item in query.order_by(schedule.id).all():
+        step = PERIOD_STEPS.get(item.period_type, 1)
+        name = item.medication.name if item.medication else ""
+        member = members.get(item.family_member_id, "")
+        slots = sorted(item.time_slots, key=lambda s: s.time)
+        day = item.start_date
+        if day < start:
+            day += timedelta(days=-((start - day).days // -step) * step)
+        while day <= min(end, item.end_date):
+            for slot in slots:
+                yield FeedEvent(
+                    uid=f"schedule-{slot.id}-{day:%Y%m%d}@fullstack",
+                    date=day,
+                    time=slot.time,
+                    summary=f"{name} ({member})" if member else name,
+                    description="По расписанию",
+                )
+            day += timedelta(days=step)
+
+
+def iter_feed_events(
+    db: Session, *, user_id: int, start: date, end: date, family_member_id: Optional[int] = None
+) -> Iterator[FeedEvent]:
+    """События окна: приемы (по времени), затем слоты расписаний. family_member_id=None — вся семья."""
+    members = dict(
+        db.query(db_models.FamilyMember.id, db_models.FamilyMember.name)
+        .filter(db_models.FamilyMember.user_id == user_id)
+        .all()
+    )
+    occurrences = iter_occurrences(
+        db,
+        user_id=user_id,
+        start=start,
+        end=end,
+        family_member_id=family_member_id if family_member_id else ALL_MEMBERS,
+    )
+    for o in occurrences:
+        member = members.get(o.family_member_id, "") if o.family_member_id else ""
+        uid = f"appointment-{o.id}" if o.id is not None else f"series-{o.series_id}-{o.date:%Y%m%d}-{o.time:%H%M}"
+        yield FeedEvent(
+            uid=f"{uid}@fullstack",
+            date=o.date,
+            time=o.time,
+            summary=f"{o.medication_name} ({member})" if member else o.medication_name,
+            description=f"Статус: {_STATUS_LABELS.get(o.status, o.status)}",
+        )
+    yield from _schedule_events(db, user_id, start, end, family_member_id, members)
@@ -0,0 +1,42 @@
+"""Кэшированное число лекарств пользователя (user_medication_counters) для total без COUNT(*)."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.utils.sql import dialect_insert
+
+
+def get_medication_count(db: Session, user_id: int) -> Optional[int]:
+    """None — счетчик еще не заведен (БД до миграции backfill_medication_counters)."""
+    return db.execute(
+        select(db_models.UserMedicationCounter.count).where(db_models.UserMedicationCounter.user_id == user_id)
+    ).scalar_one_or_none()
+
+
+def adjust_medication_count(db: Session, user_id: int, delta: int) -> None:
+    """
+    Изменить счетчик в текущей транзакции одним UPSERT. Если строки счетчика еще нет (БД до миграции
+    backfill_medication_counters: create_all заводит таблицу пустой), она заполняется COUNT(*) по каталогу,
+    уже включающему изменение, — иначе счетчик начался бы с delta вместо фактического числа.
+    """
+    if not delta:
+        return
+    # COUNT(*) должен видеть добавленное / удаленное лекарство сессии
+    db.flush()
+    med = db_models.Medication
+    table = db_models.UserMedicationCounter.__table__
+    stmt = dialect_insert(db, table).from_select(
+        ["user_id", "count"],
+        select(literal(user_id), func.count()).select_from(med.__table__).where(med.__table__.c.user_id == user_id),
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={"count": table.c.count + delta},
+        )
+    )
@@ -0,0 +1,80 @@
+"""
+Keyset-страницы каталога лекарств (GET /medications в режиме cursor).
+
+Порядок — (колонка sort_by, id) в направлении sort_order; следующая страница читается условием
+(колонка, id) > / < курсора по индексу (user_id, колонка, id), без OFFSET и без COUNT(*).
+Курсор хранит поле и направление сортировки: курсор от другого порядка отвергается.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from app.models import db_models
+
+SORT_COLUMNS = {
+    "id": db_models.Medication.id,
+    "name": db_models.Medication.name,
+    "dosage": db_models.Medication.dosage,
+    "quantity": db_models.Medication.quantity,
+}
+
+
+@dataclass(frozen=True)
+class MedicationCursor:
+    sort_by: str
+    descending: bool
+    value: Union[int, str]
+    id: int
+
+    def encode(self) -> str:
+        raw = json.dumps([self.sort_by, int(self.descending), self.value, self.id], separators=(",", ":"), ensure_ascii=False)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "MedicationCursor":
+        """ValueError, если курсор поврежден."""
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            sort_by, descending, key, row_id = json.loads(raw)
+            cursor = cls(str(sort_by), bool(descending), key, int(row_id))
+        except (ValueError, TypeError, UnicodeDecodeError) as exc:
+            raise ValueError("invalid cursor") from exc
+        expected = int if cursor.sort_by == "id" else str
+        if cursor.sort_by not in SORT_COLUMNS or not isinstance(cursor.value, expected):
+            raise ValueError("invalid cursor")
+        return cursor
+
+
+def page_medications(
+    query: Query,
+    *,
+    sort_by: str,
+    descending: bool,
+    limit: int,
+    after: Optional[MedicationCursor] = None,
+) -> tuple[list[db_models.Medication], Optional[MedicationCursor]]:
+    """Страница после курсора after и курсор следующей (None — страниц больше нет)."""
+    med = db_models.Medication
+    column = SORT_COLUMNS[sort_by]
+    if after is not None:
+        if after.sort_by != sort_by or after.descending != descending:
+            raise ValueError("cursor does not match sort order")
+        key = tuple_(column, med.id) if sort_by != "id" else med.id
+        bound = tuple_(after.value, after.id) if sort_by != "id" else after.id
+        query = query.filter(key < bound if descending else key > bound)
+    order = [column.desc(), med.id.desc()] if descending else [column.asc(), med.id.asc()]
+    if sort_by == "id":
+        order = order[:1]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, MedicationCursor(sort_by, descending, getattr(last, sort_by), last.id)
@@ -0,0 +1,116 @@
+"""
+Полнотекстовый поиск и фильтры-подстроки по каталогу лекарств (q, quantity_contains, dosage_contains в GET /medications).
+
+SQLite — FTS5-таблица medications_fts с триграммным токенизатором (подстроки от 3 символов,
+ранжирование bm25): q ищется по name/dosage/description, фильтры — по своей колонке, все условия
+собираются в один MATCH. PostgreSQL — GIN-индекс ix_medications_search по tsvector
+(префиксный поиск по словам, ранжирование ts_rank) и триграммные GIN-индексы pg_trgm для ILIKE-фильтров.
+Слова q должны совпасть все; веса полей: название > дозировка > описание.
+Различие бэкендов для части слова в q: SQLite находит подстроку из середины слова,
+PostgreSQL — только начало слова. Фильтры quantity/dosage — подстроки в обеих БД.
+Строки короче трех символов триграммы не покрывают — для них остается ILIKE
+в пределах уже отобранных строк.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from sqlalchemy import func, literal_column, or_, select, text
+from sqlalchemy.orm import Query, Session
+
+from app.models import db_models
+
+_MIN_TRIGRAM = 3
+_MAX_TERMS = 8
+# bm25: меньше — релевантнее; веса по колонкам medications_fts (name, dosage, description, quantity)
+_BM25 = "bm25(medications_fts, 10.0, 2.0, 1.0, 0.0)"
+_SEARCH_COLUMNS = "{name dosage description}"
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(q: str) -> list[str]:
+    return [t.lower() for t in q.split() if t][:_MAX_TERMS]
+
+
+def _fts5_phrase(value: str) -> str:
+    # Фраза в кавычках: спецсимволы FTS5 внутри не интерпретируются
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _tsquery(terms: list[str]) -> str:
+    words = [w for t in terms for w in _WORD.findall(t)]
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def _ilike_any(term: str):
+    pattern = f"%{term}%"
+    med = db_models.Medication
+    return or_(med.name.ilike(pattern), med.description.ilike(pattern), med.dosage.ilike(pattern))
+
+
+def apply_search(
+    db: Session,
+    query: Query,
+    q: Optional[str] = None,
+    *,
+    quantity_contains: Optional[str] = None,
+    dosage_contains: Optional[str] = None,
+) -> tuple[Query, Optional[object]]:
+    """
+    Отфильтровать query по строке поиска и подстрокам quantity/dosage. Возвращает (query, rank) —
+    rank сортируется по возрастанию (лучшие первыми) или None, если q не задан.
+    """
+    terms = search_terms(q or "")
+    contains = {
+        column: value
+        for column, value in (("quantity", quantity_contains), ("dosage", dosage_contains))
+        if value
+    }
+    dialect = db.get_bind().dialect.name
+    med = db_models.Medication
+
+    if dialect != "sqlite":
+        # PostgreSQL: ILIKE '%...%' обслуживают триграммные индексы ix_medications_*_trgm
+        query = query.filter(*(getattr(med, column).ilike(f"%{value}%") for column, value in contains.items()))
+        if not terms:
+            return query, None
+        tsquery_text = _tsquery(terms) if dialect == "postgresql" else ""
+        if not tsquery_text:
+            return query.filter(*(_ilike_any(t) for t in terms)), None
+        vector = db_models.medication_search_vector()
+        tsquery = func.to_tsquery(text("'simple'::regconfig"), tsquery_text)
+        return query.filter(vector.op("@@")(tsquery)), -func.ts_rank(vector, tsquery)
+
+    match = []
+    long_terms = [t for t in terms if len(t) >= _MIN_TRIGRAM]
+    query = query.filter(*(_ilike_any(t) for t in terms if len(t) < _MIN_TRIGRAM))
+    if long_terms:
+        match.append(f"{_SEARCH_COLUMNS} : (" + " ".join(_fts5_phrase(t) for t in long_terms) + ")")
+    for column, value in contains.items():
+        if len(value) >= _MIN_TRIGRAM:
+            match.append(f"{{{column}}} : {_fts5_phrase(value)}")
+        else:
+            query = query.filter(getattr(med, column).ilike(f"%{value}%"))
+    if not match:
+        return query, None
+
+    hits = (
+        select(literal_column("rowid").label("id"), literal_column(_BM25).label("rank"))
+        .select_from(text("medications_fts"))
+        .where(text("medications_fts MATCH :fts_query").bindparams(fts_query=" AND ".join(match)))
+        .subquery("search_hits")
+    )
+    return query.join(hits, hits.c.id == med.id), hits.c.rank if long_terms else None
+
+
+def rebuild_search_index(db: Session) -> None:
+    """
+    SQLite: пересоздать medications_fts с триггерами (схема колонок могла измениться)
+    и заполнить по текущему содержимому medications.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        for statement in db_models.MEDICATIONS_FTS_DROP + db_models.MEDICATIONS_FTS_DDL:
+            db.execute(text(statement))
+        db.execute(text("INSERT INTO medications_fts(medications_fts) VALUES ('rebuild')"))
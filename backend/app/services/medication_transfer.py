@@ -0,0 +1,181 @@
+"""
+Потоковые импорт и экспорт каталога лекарств (CSV / NDJSON).
+
+Импорт читает загруженный файл построчно, проверяет каждую строку схемой CreateMedicationRequest
+и вставляет корректные пачками по batch_size строк: одна транзакция (executemany + счетчик каталога)
+на пачку. Ошибочные строки не прерывают импорт — они попадают в отчет с номером строки файла.
+Экспорт читает каталог Core-запросом с yield_per и отдает его кусками: в памяти не больше одной пачки.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterator, Optional, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.schemas.medications import CreateMedicationRequest
+from app.services.medication_counters import adjust_medication_count
+
+EXPORT_FIELDS = ("id", "name", "quantity", "dosage", "description", "take_with_food")
+REQUIRED_FIELDS = ("name", "quantity", "dosage")
+IMPORT_FIELDS = tuple(CreateMedicationRequest.model_fields)
+# Сколько ошибок строк возвращается в отчете (счетчик failed считает все)
+MAX_REPORTED_ERRORS = 100
+_EXPORT_ROWS_PER_CHUNK = 500
+
+
+class ImportFormatError(ValueError):
+    """Файл целиком непригоден для импорта (нет обязательных колонок CSV)."""
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    failed: int = 0
+    errors: list[dict] = field(default_factory=list)
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+def _text_lines(stream: BinaryIO) -> io.TextIOWrapper:
+    # utf-8-sig: CSV из Excel начинается с BOM
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[tuple[int, Union[dict, str]]]:
+    """(номер строки файла, словарь полей или текст ошибки). Лишние колонки (например id из экспорта) игнорируются."""
+    reader = csv.DictReader(_text_lines(stream))
+    try:
+        header = reader.fieldnames or []
+    except UnicodeDecodeError:
+        raise ImportFormatError("Файл должен быть в кодировке UTF-8")
+    missing = [name for name in REQUIRED_FIELDS if name not in header]
+    if missing:
+        raise ImportFormatError(f"В заголовке CSV нет колонок: {', '.join(missing)}")
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except (csv.Error, UnicodeDecodeError) as exc:
+            yield reader.line_num + 1, f"Не удалось разобрать строку: {exc}"
+            return
+        if None in row:
+            yield reader.line_num, "Лишние значения без заголовка колонки"
+            continue
+        # Пустая ячейка необязательного поля — отсутствие значения
+        yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k in IMPORT_FIELDS}
+
+
+def iter_ndjson_rows(stream: BinaryIO) -> Iterator[tuple[int, Union[dict, str]]]:
+    lines = _text_lines(stream)
+    line_no = 0
+    while True:
+        try:
+            line = lines.readline()
+        except UnicodeDecodeError:
+            yield line_no + 1, "Файл должен быть в кодировке UTF-8"
+            return
+        if not line:
+            return
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_no, f"Некорректный JSON: {exc.msg}"
+            continue
+        if not isinstance(value, dict):
+            yield line_no, "Строка должна быть JSON-объектом"
+            continue
+        yield line_no, {k: v for k, v in value.items() if k in IMPORT_FIELDS}
+
+
+def import_medications(
+    db: Session,
+    user_id: int,
+    rows: Iterator[tuple[int, Union[dict, str]]],
+    *,
+    batch_size: int,
+) -> ImportReport:
+    """Вставить строки пачками; каждая пачка коммитится отдельно вместе со счетчиком каталога."""
+    report = ImportReport()
+    batch: list[dict] = []
+
+    def flush() -> None:
+        if not batch:
+            return
+        # Core-вставка: один executemany на пачку (ORM-вставка дробит пачку по набору непустых полей)
+        db.execute(insert(db_models.Medication.__table__), batch)
+        adjust_medication_count(db, user_id, len(batch))
+        db.commit()
+        report.created += len(batch)
+        batch.clear()
+
+    for line, row in rows:
+        if isinstance(row, str):
+            report.add_error(line, row)
+            continue
+        try:
+            data = CreateMedicationRequest.model_validate(row)
+        except ValidationError as exc:
+            report.add_error(line, _format_validation_error(exc))
+            continue
+        batch.append({"user_id": user_id, **data.model_dump()})
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+def iter_export(db: Session, user_id: int, fmt: str, *, chunk_rows: int = _EXPORT_ROWS_PER_CHUNK) -> Iterator[bytes]:
+    """Каталог пользователя в порядке id; каждый кусок — до chunk_rows строк."""
+    med = db_models.Medication
+    stmt = (
+        select(*(getattr(med, name) for name in EXPORT_FIELDS))
+        .where(med.user_id == user_id)
+        .order_by(med.id)
+        .execution_options(yield_per=chunk_rows)
+    )
+    result = db.execute(stmt)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\r\n")
+        writer.writerow(EXPORT_FIELDS)
+        # BOM — чтобы Excel открывал кириллицу без выбора кодировки
+        yield codecs.BOM_UTF8 + buffer.getvalue().encode("utf-8")
+        for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(partition)
+            yield buffer.getvalue().encode("utf-8")
+    else:
+        for partition in result.partitions():
+            yield "".join(
+                json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n" for row in partition
+            ).encode("utf-8")
+
+
+def detect_format(explicit: Optional[str], filename: Optional[str]) -> Optional[str]:
+    if explicit:
+        return explicit
+    suffix = (filename or "").rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}.get(suffix)
@@ -2,16 +2,45 @@
 
 from __future__ import annotations
 
+import logging
+import os
+import tempfile
 import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, BinaryIO, Iterable
 
 from app.config import settings
 
 if TYPE_CHECKING:
     pass
 
+logger = logging.getLogger("app.storage")
+
+# Предел ключей в одном запросе S3 DeleteObjects
+S3_DELETE_BATCH = 1000
+_LOCAL_DELETE_WORKERS = 8
+# Потоковая запись: кусок чтения и размер части S3 multipart (минимум S3 — 5 МиБ, кроме последней)
+STREAM_CHUNK_BYTES = 1024 * 1024
+S3_PART_BYTES = 8 * 1024 * 1024
+
+
+class ObjectTooLargeError(Exception):
+    """Поток длиннее max_bytes; частично записанный объект удален."""
+
+
+def _read_chunks(stream: BinaryIO, max_bytes: int | None) -> Iterable[bytes]:
+    total = 0
+    while True:
+        chunk = stream.read(STREAM_CHUNK_BYTES)
+        if not chunk:
+            return
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise ObjectTooLargeError(max_bytes)
+        yield chunk
+
 
 class ObjectStorage(ABC):
     @abstractmethod
@@ -22,6 +51,24 @@ class ObjectStorage(ABC):
     def delete_object(self, key: str) -> None:
         ...
 
+    @abstractmethod
+    def put_stream(self, key: str, stream: BinaryIO, content_type: str, *, max_bytes: int | None = None) -> int:
+        """
+        Записать объект из потока кусками, не держа его целиком в памяти; возвращает размер.
+        ObjectTooLargeError, если поток длиннее max_bytes (объект не создается).
+        """
+        ...
+
+    def delete_objects(self, keys: Iterable[str]) -> list[str]:
+        """Удалить несколько объектов; возвращает ключи, которые удалить не удалось."""
+        failed = []
+        for key in keys:
+            try:
+                self.delete_object(key)
+            except Exception:
+                failed.append(key)
+        return failed
+
     def try_presigned_get(self, key: str, expires_seconds: int) -> str | None:
         """S3/MinIO — прямая ссылка; локальное хранилище — None (токен в роутере)."""
         return None
@@ -46,6 +93,24 @@ class LocalFilesystemStorage(ObjectStorage):
         path.write_bytes(data)
         _ = content_type
 
+    def put_stream(self, key: str, stream: BinaryIO, content_type: str, *, max_bytes: int | None = None) -> int:
+        """Временный файл рядом с целевым и атомарное переименование: читатель не видит недописанный объект."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in _read_chunks(stream, max_bytes):
+                    fh.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        _ = content_type
+        return size
+
     def delete_object(self, key: str) -> None:
         try:
             p = self._path(key)
@@ -54,9 +119,31 @@ class LocalFilesystemStorage(ObjectStorage):
         except ValueError:
             return
 
+    def delete_objects(self, keys: Iterable[str]) -> list[str]:
+        """Параллельные unlink: на сетевых ФС каждый — отдельный round trip."""
+        keys = list(keys)
+        if len(keys) <= 1:
+            return super().delete_objects(keys)
+
+        def _unlink(key: str) -> str | None:
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except ValueError:
+                return None
+            except OSError:
+                return key
+            return None
+
+        with ThreadPoolExecutor(max_workers=min(_LOCAL_DELETE_WORKERS, len(keys))) as pool:
+            return [key for key in pool.map(_unlink, keys) if key is not None]
+
     def read_bytes(self, key: str) -> bytes:
         return self._path(key).read_bytes()
 
+    def local_path(self, key: str) -> Path:
+        """Путь к файлу объекта (для отдачи файла сервером без чтения в память)."""
+        return self._path(key)
+
 class S3CompatibleStorage(ObjectStorage):
     def __init__(
         self,
@@ -91,6 +178,69 @@ class S3CompatibleStorage(ObjectStorage):
     def delete_object(self, key: str) -> None:
         self._client.delete_object(Bucket=self.bucket, Key=key)
 
+    def put_stream(self, key: str, stream: BinaryIO, content_type: str, *, max_bytes: int | None = None) -> int:
+        """
+        Multipart upload частями по S3_PART_BYTES: в памяти не больше одной части.
+        Поток короче одной части уходит обычным PutObject; при ошибке загрузка отменяется.
+        """
+        buffer = bytearray()
+        chunks = _read_chunks(stream, max_bytes)
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= S3_PART_BYTES:
+                break
+        else:
+            self.put_object(key, bytes(buffer), content_type)
+            return len(buffer)
+
+        upload_id = self._client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)["UploadId"]
+        parts: list[dict] = []
+        size = 0
+        try:
+
+            def upload_part(body: bytes) -> None:
+                response = self._client.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=body
+                )
+                parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+
+            for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= S3_PART_BYTES:
+                    size += S3_PART_BYTES
+                    upload_part(bytes(buffer[:S3_PART_BYTES]))
+                    del buffer[:S3_PART_BYTES]
+            while buffer:
+                body = bytes(buffer[:S3_PART_BYTES])
+                del buffer[: len(body)]
+                size += len(body)
+                upload_part(body)
+            self._client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            self._client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return size
+
+    def delete_objects(self, keys: Iterable[str]) -> list[str]:
+        """DeleteObjects по S3_DELETE_BATCH ключей за запрос (Quiet: в ответе только ошибки)."""
+        keys = list(keys)
+        failed: list[str] = []
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            chunk = keys[start : start + S3_DELETE_BATCH]
+            try:
+                response = self._client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+                )
+            except Exception:
+                logger.exception("DeleteObjects не выполнен для %d ключей", len(chunk))
+                failed.extend(chunk)
+                continue
+            failed.extend(err["Key"] for err in response.get("Errors", []))
+        return failed
+
     def try_presigned_get(self, key: str, expires_seconds: int) -> str | None:
         return self._client.generate_presigned_url(
             "get_object",
@@ -130,5 +280,17 @@ def get_object_storage() -> ObjectStorage:
     return _storage
 
 
+def purge_objects(keys: list[str]) -> None:
+    """
+    Фоновое удаление объектов после commit (BackgroundTasks): ответ не ждет хранилища.
+    Неудаленные ключи только логируются — строки в БД уже нет, объект остается сиротой.
+    """
+    if not keys:
+        return
+    failed = get_object_storage().delete_objects(keys)
+    if failed:
+        logger.warning("Не удалось удалить %d из %d объектов: %s", len(failed), len(keys), failed[:20])
+
+
 def is_s3_storage() -> bool:
     return isinstance(get_object_storage(), S3CompatibleStorage)
@@ -0,0 +1,133 @@
+"""
+Потоковый генератор PDF-отчета о приемах без внешних зависимостей.
+
+Документ отдается частями по мере готовности страниц: объекты пишутся последовательно,
+смещения запоминаются, дерево страниц и таблица xref дописываются в конце.
+Шрифт — стандартный Helvetica с кодировкой cp1251 через /Differences (кириллица
+без встраивания шрифта); символы вне cp1251 заменяются на «?».
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Iterable, Iterator
+
+from app.utils.lru import LRUCache
+
+LINES_PER_PAGE = 48
+_PAGE_WIDTH, _PAGE_HEIGHT = 595, 842  # A4, pt
+_FONT_SIZE = 10
+_LEADING = 15
+_MARGIN = 50
+
+_STATUS_LABELS = {"pending": "предстоит", "taken": "принял", "skipped": "не принял"}
+
+# Объекты с фиксированными номерами: дерево страниц пишется последним, но на него ссылаются страницы
+_CATALOG, _PAGES, _FONT = 1, 2, 3
+
+# Отчет за длинный период может занимать мегабайты: кэш ограничен и по суммарному размеру,
+# а отчеты больше MAX_CACHED_REPORT_BYTES не кэшируются (их части не копятся в памяти)
+MAX_CACHED_REPORT_BYTES = 2 * 1024 * 1024
+report_cache = LRUCache(max_entries=32, max_bytes=16 * 1024 * 1024)
+
+
+def _cyrillic_differences() -> str:
+    names = []
+    for code in range(0xC0, 0x100):
+        ch = bytes([code]).decode("cp1251")
+        if "А" <= ch <= "Я":
+            idx = ord(ch) - ord("А")
+            names.append(f"/afii{10017 + idx + (1 if idx >= 6 else 0)}")
+        else:
+            idx = ord(ch) - ord("а")
+            names.append(f"/afii{10065 + idx + (1 if idx >= 6 else 0)}")
+    return f"[168 /afii10023 184 /afii10071 192 {' '.join(names)}]"
+
+
+def _pdf_text(value: str) -> bytes:
+    raw = value.encode("cp1251", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class StreamingPdfWriter:
+    def __init__(self) -> None:
+        self._offset = 0
+        self._xref: dict[int, int] = {}
+        self._next_obj = _FONT + 1
+        self._pages: list[int] = []
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self._offset += len(chunk)
+        return chunk
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self._xref[number] = self._offset
+        return self._emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        number = self._next_obj
+        self._next_obj += 1
+        return number
+
+    def begin(self) -> bytes:
+        header = self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        font = (
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+            f"/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences {_cyrillic_differences()} >> >>"
+        ).encode()
+        return header + self._object(_FONT, font)
+
+    def page(self, lines: list[str]) -> bytes:
+        ops = [f"BT /F1 {_FONT_SIZE} Tf {_LEADING} TL {_MARGIN} {_PAGE_HEIGHT - _MARGIN} Td".encode()]
+        for line in lines:
+            ops.append(b"(" + _pdf_text(line) + b") Tj T*")
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        content_id = self._allocate()
+        page_id = self._allocate()
+        self._pages.append(page_id)
+        content = self._object(
+            content_id,
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream",
+        )
+        page = self._object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent {_PAGES} 0 R /MediaBox [0 0 {_PAGE_WIDTH} {_PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 {_FONT} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode(),
+        )
+        return content + page
+
+    def finish(self) -> bytes:
+        if not self._pages:
+            return self.page([]) + self.finish()
+        kids = " ".join(f"{p} 0 R" for p in self._pages)
+        chunks = self._object(_PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        chunks += self._object(_CATALOG, f"<< /Type /Catalog /Pages {_PAGES} 0 R >>".encode())
+        xref_offset = self._offset
+        size = self._next_obj
+        table = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for number in range(1, size):
+            table.append(f"{self._xref[number]:010d} 00000 n \n")
+        table.append(f"trailer\n<< /Size {size} /Root {_CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        return chunks + self._emit("".join(table).encode())
+
+
+def format_appointment_line(day: date, time_str: str, medication_name: str, status: str, member: str) -> str:
+    return f"{day.strftime('%d.%m.%Y')}  {time_str}  {medication_name}  [{_STATUS_LABELS.get(status, status)}]  {member}"
+
+
+def render_appointments_pdf(header: list[str], lines: Iterable[str]) -> Iterator[bytes]:
+    """Генератор частей PDF: каждая страница отдается, как только набрано LINES_PER_PAGE строк."""
+    writer = StreamingPdfWriter()
+    yield writer.begin()
+    page = list(header) + [""]
+    for line in lines:
+        page.append(line)
+        if len(page) >= LINES_PER_PAGE:
+            yield writer.page(page)
+            page = []
+    if page:
+        yield writer.page(page)
+    yield writer.finish()
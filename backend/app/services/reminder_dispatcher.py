@@ -0,0 +1,320 @@
+"""
+Рассылка напоминаний о наступивших приемах (User.sms_notifications).
+
+Каждый тик выбирает pending-приемы со временем в окне (watermark, сейчас] по индексу
+ix_appointments_due (status, date, time) — без полного сканирования — и дозы виртуальных
+курсов, развернутые только для этого окна. Дозы группируются
+по телефону получателя (пользователь или член семьи): одно сообщение на телефон за тик.
+
+Состояние хранится в БД, а не в памяти процесса:
+- reminder_dispatch_state — watermark (до какого момента дозы уже поставлены в очередь) и аренда.
+  Тик начинается с условного UPDATE аренды: окно обрабатывает только ее держатель, остальные
+  процессы API с REMINDERS_ENABLED=true простаивают и подхватывают рассылку, когда аренда истечет;
+- reminder_outbox — сообщения окна, записанные в той же транзакции, что и сдвиг watermark.
+  Доставленные удаляются, недоставленные остаются и повторяются на следующих тиках
+  (до REMINDERS_MAX_ATTEMPTS попыток).
+После простоя окно начинается с сохраненного watermark, но не раньше REMINDERS_MAX_CATCHUP_SECONDS назад.
+Доставка — «как минимум один раз»: сбой между отправкой и удалением строки повторит сообщение.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.services.appointment_occurrences import expand_series
+from app.services.sms_gateway import SmsGateway
+from app.utils.sql import dialect_insert
+
+logger = logging.getLogger("app.reminders")
+
+_STATE_NAME = "reminders"
+# Пачка id для DELETE / UPDATE строк очереди (лимит параметров запроса)
+_OUTBOX_BATCH = 500
+
+
+@dataclass(frozen=True)
+class DueDose:
+    phone: str
+    medication_name: str
+    time: time
+
+
+@dataclass
+class DispatcherMetrics:
+    ticks: int = 0
+    doses: int = 0
+    messages: int = 0
+    failed_messages: int = 0
+    dropped_messages: int = 0
+    standby_ticks: int = 0
+    busy_seconds: float = 0.0
+    last_tick_seconds: float = 0.0
+    max_tick_seconds: float = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "doses": self.doses,
+            "messages": self.messages,
+            "failed_messages": self.failed_messages,
+            "dropped_messages": self.dropped_messages,
+            "standby_ticks": self.standby_ticks,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "last_tick_seconds": round(self.last_tick_seconds, 3),
+            "max_tick_seconds": round(self.max_tick_seconds, 3),
+            "doses_per_second": round(self.doses / self.busy_seconds, 1) if self.busy_seconds else None,
+        }
+
+
+def _window_filter(table, start: datetime, end: datetime):
+    """(date, time) в полуинтервале (start, end] — в виде, пригодном для индекса (date, time)."""
+    if start.date() == end.date():
+        return and_(table.date == start.date(), table.time > start.time(), table.time <= end.time())
+    return or_(
+        and_(table.date == start.date(), table.time > start.time()),
+        and_(table.date > start.date(), table.date < end.date()),
+        and_(table.date == end.date(), table.time <= end.time()),
+    )
+
+
+def find_due_doses(db: Session, start: datetime, end: datetime) -> list[DueDose]:
+    """Дозы со временем приема в (start, end] у пользователей с включенными уведомлениями."""
+    appt, user, member, med = db_models.Appointment, db_models.User, db_models.FamilyMember, db_models.Medication
+    rows = db.execute(
+        select(user.phone, member.phone, med.name, appt.time)
+        .join(user, user.id == appt.user_id)
+        .join(med, med.id == appt.medication_id)
+        .outerjoin(member, member.id == appt.family_member_id)
+        .where(appt.status == "pending", _window_filter(appt, start, end), user.sms_notifications.is_(True))
+    ).all()
+    due = [DueDose(member_phone or user_phone, name, tm) for user_phone, member_phone, name, tm in rows]
+
+    series = db_models.AppointmentSeries
+    series_rows = (
+        db.query(series, user.phone, member.phone, med.name)
+        .join(user, user.id == series.user_id)
+        .join(med, med.id == series.medication_id)
+        .outerjoin(member, member.id == series.family_member_id)
+        .filter(series.start_date <= end.date(), series.end_date >= start.date(), user.sms_notifications.is_(True))
+        .all()
+    )
+    if not series_rows:
+        return due
+    marked = set(
+        db.execute(
+            select(appt.series_id, appt.date, appt.time).where(
+                appt.series_id.in_([s.id for s, *_ in series_rows]),
+                appt.date >= start.date(),
+                appt.date <= end.date(),
+            )
+        ).all()
+    )
+    for item, user_phone, member_phone, name in series_rows:
+        for day, tm in expand_series(item, start.date(), end.date()):
+            moment = datetime.combine(day, tm)
+            if start < moment <= end and (item.id, day, tm) not in marked:
+                due.append(DueDose(member_phone or user_phone, name, tm))
+    return due
+
+
+def group_by_phone(doses: list[DueDose]) -> dict[str, str]:
+    """Одно сообщение на телефон: все дозы окна, отсортированные по времени."""
+    by_phone: dict[str, list[DueDose]] = defaultdict(list)
+    for dose in doses:
+        by_phone[dose.phone].append(dose)
+    return {
+        phone: "Пора принять: " + "; ".join(f"{d.time:%H:%M} {d.medication_name}" for d in sorted(items, key=lambda d: d.time))
+        for phone, items in by_phone.items()
+    }
+
+
+def claim_lease(db: Session, owner: str, now: datetime, lease_seconds: float) -> bool:
+    """
+    Взять или продлить аренду рассылки в текущей транзакции; False — ее держит другой процесс.
+    Условный UPDATE блокирует строку состояния до commit: параллельный тик дождется его и не пройдет условие.
+    """
+    state = db_models.ReminderDispatchState.__table__
+    db.execute(dialect_insert(db, state).values(name=_STATE_NAME).on_conflict_do_nothing(index_elements=[state.c.name]))
+    claimed = db.execute(
+        update(state)
+        .where(
+            state.c.name == _STATE_NAME,
+            or_(state.c.lease_owner == owner, state.c.lease_until.is_(None), state.c.lease_until < now),
+        )
+        .values(lease_owner=owner, lease_until=now + timedelta(seconds=lease_seconds))
+    ).rowcount
+    return claimed == 1
+
+
+def _dispatcher_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class ReminderDispatcher:
+    session_factory: Callable[[], Session]
+    gateway: SmsGateway
+    interval_seconds: float = 30.0
+    max_concurrent_sends: int = 20
+    max_catchup_seconds: float = 3600.0
+    max_attempts: int = 5
+    owner: str = field(default_factory=_dispatcher_id)
+    metrics: DispatcherMetrics = field(default_factory=DispatcherMetrics)
+
+    @property
+    def lease_seconds(self) -> float:
+        # С запасом на медленный тик: держатель продлевает аренду каждый тик
+        return max(self.interval_seconds * 3, 60.0)
+
+    def _queue_window(self, now: datetime) -> Optional[list[tuple[int, str, str]]]:
+        """
+        Под арендой: поставить в очередь сообщения окна (watermark, now], сдвинуть watermark
+        и вернуть очередь к отправке (id, телефон, текст). None — аренда у другого процесса.
+        """
+        state_model, outbox = db_models.ReminderDispatchState, db_models.ReminderOutbox
+        oldest = now - timedelta(seconds=self.max_catchup_seconds)
+        with self.session_factory() as db, db.begin():
+            if not claim_lease(db, self.owner, now, self.lease_seconds):
+                return None
+            state = db.get(state_model, _STATE_NAME)
+            start = max(state.watermark, oldest) if state.watermark else now - timedelta(seconds=self.interval_seconds)
+            if start < now:
+                doses = find_due_doses(db, start, now)
+                self.metrics.doses += len(doses)
+                messages = group_by_phone(doses)
+                if messages:
+                    db.execute(
+                        insert(outbox),
+                        [{"phone": phone, "text": text, "due_at": now, "attempts": 0} for phone, text in messages.items()],
+                    )
+                state.watermark = now
+            dropped = db.execute(
+                delete(outbox).where(or_(outbox.due_at < oldest, outbox.attempts >= self.max_attempts))
+            ).rowcount
+            if dropped:
+                self.metrics.dropped_messages += dropped
+                logger.warning("Не доставлено и снято с очереди напоминаний: %s", dropped)
+            return [tuple(row) for row in db.execute(select(outbox.id, outbox.phone, outbox.text).order_by(outbox.id))]
+
+    def _settle(self, delivered: list[int], failed: list[int]) -> None:
+        outbox = db_models.ReminderOutbox
+        with self.session_factory() as db, db.begin():
+            for offset in range(0, len(delivered), _OUTBOX_BATCH):
+                db.execute(delete(outbox).where(outbox.id.in_(delivered[offset : offset + _OUTBOX_BATCH])))
+            for offset in range(0, len(failed), _OUTBOX_BATCH):
+                db.execute(
+                    update(outbox)
+                    .where(outbox.id.in_(failed[offset : offset + _OUTBOX_BATCH]))
+                    .values(attempts=outbox.attempts + 1)
+                )
+
+    def release(self) -> None:
+        """Отдать аренду при остановке, чтобы другой процесс продолжил рассылку без ожидания."""
+        state = db_models.ReminderDispatchState
+        with self.session_factory() as db, db.begin():
+            db.execute(
+                update(state)
+                .where(state.name == _STATE_NAME, state.lease_owner == self.owner)
+                .values(lease_owner=None, lease_until=None)
+            )
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """Разослать напоминания за окно с прошлого тика и повторить недоставленные; вернуть число отправленных."""
+        now = now or datetime.now()
+        began = perf_counter()
+        queued = await asyncio.to_thread(self._queue_window, now)
+        if queued is None:
+            self.metrics.standby_ticks += 1
+            return 0
+        semaphore = asyncio.Semaphore(self.max_concurrent_sends)
+
+        async def _send(phone: str, text: str) -> bool:
+            async with semaphore:
+                try:
+                    await self.gateway.send(phone, text)
+                    return True
+                except Exception:
+                    logger.exception("Не удалось отправить напоминание на %s", phone)
+                    return False
+
+        results = await asyncio.gather(*(_send(phone, text) for _, phone, text in queued))
+        delivered = [row[0] for row, ok in zip(queued, results) if ok]
+        failed = [row[0] for row, ok in zip(queued, results) if not ok]
+        if queued:
+            await asyncio.to_thread(self._settle, delivered, failed)
+        elapsed = perf_counter() - began
+        self.metrics.ticks += 1
+        self.metrics.messages += len(delivered)
+        self.metrics.failed_messages += len(failed)
+        self.metrics.busy_seconds += elapsed
+        self.metrics.last_tick_seconds = elapsed
+        self.metrics.max_tick_seconds = max(self.metrics.max_tick_seconds, elapsed)
+        return len(delivered)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Тикать каждые interval_seconds до stop; ошибки тика логируются и не останавливают цикл."""
+        while not stop.is_set():
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Ошибка тика рассылки напоминаний")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+_background: Optional[tuple[ReminderDispatcher, asyncio.Event, asyncio.Task]] = None
+
+
+def start_background_dispatcher(
+    session_factory: Callable[[], Session],
+    gateway: SmsGateway,
+    interval_seconds: float,
+    max_catchup_seconds: float = 3600.0,
+    max_attempts: int = 5,
+) -> None:
+    global _background
+    if _background is not None:
+        return
+    dispatcher = ReminderDispatcher(
+        session_factory=session_factory,
+        gateway=gateway,
+        interval_seconds=interval_seconds,
+        max_catchup_seconds=max_catchup_seconds,
+        max_attempts=max_attempts,
+    )
+    stop = asyncio.Event()
+    _background = (dispatcher, stop, asyncio.create_task(dispatcher.run(stop)))
+    logger.info("Рассылка напоминаний запущена, интервал %s с", interval_seconds)
+
+
+async def stop_background_dispatcher() -> None:
+    global _background
+    if _background is None:
+        return
+    dispatcher, stop, task = _background
+    _background = None
+    stop.set()
+    await task
+    try:
+        await asyncio.to_thread(dispatcher.release)
+    except Exception:
+        logger.exception("Не удалось освободить аренду рассылки напоминаний")
+
+
+def background_metrics() -> Optional[dict]:
+    return _background[0].metrics.snapshot() if _background is not None else None
@@ -0,0 +1,287 @@
+"""
+Кэш готовых JSON-ответов GET-эндпоинтов с инвалидацией по тегам.
+
+Каждая запись помечена тегами (пользователь, каталог, сущность). Тег хранит текущую «версию»,
+и версии всех тегов записи входят в ее ключ: инвалидация тега просто заменяет версию, после чего
+старые записи недостижимы и вытесняются LRU/TTL. Версия отсутствующего тега создается заново
+случайной, поэтому вытеснение тега из хранилища не «воскрешает» старые записи.
+
+Хранилище подключаемое (RESPONSE_CACHE_BACKEND):
+  memory — LRU в памяти процесса;
+  file   — общий для воркеров каталог (локальная замена внешнего кэша вроде Redis) с LRU процесса
+           перед ним; версии тегов читаются из каталога на каждый запрос, поэтому инвалидация
+           в одном воркере видна остальным;
+  off    — кэш выключен.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.utils.lru import LRUCache
+from app.utils.projection import dump_json
+
+logger = logging.getLogger("app.cache")
+
+
+class CacheStore(ABC):
+    """Хранилище байтовых значений с TTL (0 — без срока)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float = 0) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        return [self.get(key) for key in keys]
+
+    def stats(self) -> dict[str, Any]:
+        return {}
+
+
+class MemoryCacheStore(CacheStore):
+    def __init__(self, max_entries: int) -> None:
+        self._lru = LRUCache(max_entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._lru.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at < time.monotonic():
+            self._lru.pop(key)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float = 0) -> None:
+        self._lru.set(key, (time.monotonic() + ttl_seconds if ttl_seconds else 0.0, value))
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._lru), "evictions": self._lru.evictions}
+
+
+class FileCacheStore(CacheStore):
+    """
+    Записи — файлы в общем каталоге (заголовок со сроком годности + значение), запись через
+    временный файл и атомарное переименование. Старые файлы чистит TTL при чтении.
+    """
+
+    _HEADER = struct.Struct("!d")
+
+    def __init__(self, root: Path) -> None:
+        self.root = root.resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / digest
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        (expires_at,) = self._HEADER.unpack_from(raw)
+        if expires_at and expires_at < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return raw[self._HEADER.size :]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float = 0) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(self._HEADER.pack(time.time() + ttl_seconds if ttl_seconds else 0.0))
+            fh.write(value)
+        os.replace(tmp, path)
+
+    def clear(self) -> None:
+        for path in self.root.glob("*/*"):
+            path.unlink(missing_ok=True)
+
+
+class ResponseCache:
+    def __init__(self, store: CacheStore, ttl_seconds: float, local: Optional[LRUCache] = None) -> None:
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        # Локальный LRU перед внешним хранилищем: ключ уже содержит версии тегов, поэтому он не устаревает
+        self.local = local
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _tag_versions(self, tags: list[str]) -> list[str]:
+        keys = [f"tag:{tag}" for tag in tags]
+        versions = []
+        for key, value in zip(keys, self.store.get_many(keys)):
+            if value is None:
+                value = uuid.uuid4().hex[:12].encode()
+                self.store.set(key, value)
+            versions.append(value.decode())
+        return versions
+
+    def key(self, namespace: str, params: dict[str, Any], tags: Iterable[str]) -> str:
+        tags = sorted(set(tags))
+        encoded = json.dumps(jsonable_encoder(params), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return f"resp:{namespace}:{encoded}:" + ",".join(f"{t}={v}" for t, v in zip(tags, self._tag_versions(tags)))
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key) if self.local is not None else None
+        if value is None:
+            value = self.store.get(key)
+            if value is not None and self.local is not None:
+                self.local.set(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.store.set(key, value, self.ttl_seconds)
+        if self.local is not None:
+            self.local.set(key, value)
+
+    def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            self.store.set(f"tag:{tag}", uuid.uuid4().hex[:12].encode())
+        with self._lock:
+            self.invalidations += len(tags)
+
+    def clear(self) -> None:
+        self.store.clear()
+        if self.local is not None:
+            self.local.clear()
+
+    def metrics(self) -> dict[str, Any]:
+        evictions = self.store.stats().get("evictions", 0) + (self.local.evictions if self.local is not None else 0)
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": evictions,
+            "invalidations": self.invalidations,
+            **{k: v for k, v in self.store.stats().items() if k != "evictions"},
+        }
+
+
+class _DisabledCache(ResponseCache):
+    def __init__(self) -> None:
+        super().__init__(MemoryCacheStore(1), ttl_seconds=0)
+
+    def key(self, namespace: str, params: dict[str, Any], tags: Iterable[str]) -> str:
+        return ""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        return None
+
+    def invalidate(self, *tags: str) -> None:
+        return None
+
+
+_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is not None:
+        return _cache
+    backend = settings.response_cache_backend
+    if backend == "memory":
+        _cache = ResponseCache(MemoryCacheStore(settings.response_cache_max_entries), settings.response_cache_ttl_seconds)
+    elif backend == "file":
+        _cache = ResponseCache(
+            FileCacheStore(Path(settings.response_cache_path)),
+            settings.response_cache_ttl_seconds,
+            local=LRUCache(settings.response_cache_max_entries),
+        )
+    elif backend == "off":
+        _cache = _DisabledCache()
+    else:
+        raise ValueError(f"Неизвестный бэкенд кэша ответов: {backend}")
+    return _cache
+
+
+def cached_json(key: str) -> Optional[Response]:
+    """Готовый ответ из кэша или None."""
+    body = get_response_cache().get(key) if key else None
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+
+def cache_json(key: str, payload: Any) -> Response:
+    """Сериализовать ответ (pydantic-модель, список моделей или словарей), сохранить и вернуть."""
+    body = dump_json(payload)
+    if key:
+        get_response_cache().set(key, body)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+
+def invalidate(*tags: str) -> None:
+    """Вызывается записывающими роутерами после commit."""
+    try:
+        get_response_cache().invalidate(*tags)
+    except Exception:
+        # Недоступный кэш не должен ронять запись; записи доживут до TTL
+        logger.exception("Не удалось инвалидировать теги %s", tags)
+
+
+# Теги: все записи запрашивающего пользователя; каталог лекарств владельца; одно лекарство;
+# профиль, члены семьи и расписания пользователя
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def medications_tag(user_id: int) -> str:
+    return f"medications:{user_id}"
+
+
+def medication_tag(medication_id: int) -> str:
+    return f"medication:{medication_id}"
+
+
+def profile_tag(user_id: int) -> str:
+    return f"profile:{user_id}"
+
+
+def family_tag(user_id: int) -> str:
+    return f"family:{user_id}"
+
+
+def schedules_tag(user_id: int) -> str:
+    return f"schedules:{user_id}"
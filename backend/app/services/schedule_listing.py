@@ -0,0 +1,62 @@
+"""
+Список расписаний члена семьи (GET /schedules) проекцией колонок.
+
+Один запрос на расписания с названиями лекарства и члена семьи и один — на тайм-слоты
+всех расписаний сразу; без medication_name / time_slots в fields соответствующий JOIN
+или запрос не выполняется.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import db_models
+from app.schemas.schedules import MedicationScheduleResponse, TimeSlotResponse
+from app.utils.projection import project_rows, selected_fields
+
+
+def list_schedules(
+    db: Session,
+    *,
+    user_id: int,
+    family_member_id: int,
+    fields: Optional[Sequence[str]] = None,
+) -> list[Any]:
+    sch, med, member = db_models.Schedule, db_models.Medication, db_models.FamilyMember
+    names = selected_fields(MedicationScheduleResponse, fields)
+    columns = {
+        "id": sch.id,
+        "medication_id": sch.medication_id,
+        "medication_name": func.coalesce(med.name, "Unknown"),
+        "family_member_id": sch.family_member_id,
+        "family_member_name": member.name,
+        "start_date": sch.start_date,
+        "end_date": sch.end_date,
+        "period_type": sch.period_type,
+    }
+    stmt = (
+        select(*(columns[name].label(name) for name in dict.fromkeys(("id",) + names) if name in columns))
+        .join(member, member.id == sch.family_member_id)
+        .where(member.user_id == user_id, sch.family_member_id == family_member_id)
+        .order_by(sch.id)
+    )
+    if "medication_name" in names:
+        stmt = stmt.outerjoin(med, med.id == sch.medication_id)
+    rows = db.execute(stmt).all()
+
+    slots: dict[int, list[TimeSlotResponse]] = defaultdict(list)
+    if "time_slots" in names and rows:
+        slot_rows = db.execute(
+            select(db_models.TimeSlot.id, db_models.TimeSlot.schedule_id, db_models.TimeSlot.time)
+            .where(db_models.TimeSlot.schedule_id.in_([row.id for row in rows]))
+            .order_by(db_models.TimeSlot.id)
+        )
+        for slot_id, schedule_id, slot_time in slot_rows:
+            slots[schedule_id].append(TimeSlotResponse.model_construct(id=slot_id, time=slot_time.strftime("%H:%M")))
+    return project_rows(
+        ({**row._mapping, "time_slots": slots[row.id]} for row in rows), MedicationScheduleResponse, fields
+    )
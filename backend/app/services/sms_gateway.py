@@ -0,0 +1,42 @@
+"""Шлюз отправки SMS-напоминаний: интерфейс и локальная заглушка, пишущая в лог."""
+
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+
+from app.config import settings
+
+logger = logging.getLogger("app.reminders")
+
+
+class SmsGateway(ABC):
+    @abstractmethod
+    async def send(self, phone: str, text: str) -> None:
+        """Отправить одно сообщение; исключение — сообщение не доставлено."""
+
+
+class LoggingSmsGateway(SmsGateway):
+    """Ничего не отправляет: пишет сообщение в лог и считает отправленные (разработка, тесты, бенчмарки)."""
+
+    def __init__(self, log: bool = True) -> None:
+        self.log = log
+        self.sent = 0
+
+    async def send(self, phone: str, text: str) -> None:
+        self.sent += 1
+        if self.log:
+            logger.info("SMS %s: %s", phone, text)
+
+
+_gateway: SmsGateway | None = None
+
+
+def get_sms_gateway() -> SmsGateway:
+    global _gateway
+    if _gateway is not None:
+        return _gateway
+    if settings.sms_gateway != "log":
+        raise ValueError(f"Неизвестный SMS-шлюз: {settings.sms_gateway}")
+    _gateway = LoggingSmsGateway()
+    return _gateway
@@ -0,0 +1,197 @@
+"""
+Отдача локального файла с Range (RFC 9110): один диапазон — 206 с Content-Range, несколько —
+206 multipart/byteranges, недостижимые — 416. Условные запросы: If-None-Match / If-Modified-Since —
+304 без чтения файла, If-Range — диапазон только для совпавшего ETag / даты.
+
+Тело отправляется без чтения в память процесса, если ASGI-сервер поддерживает расширение
+http.response.zerocopysend (sendfile) или http.response.pathsend; иначе — кусками по CHUNK_BYTES.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_BYTES = 64 * 1024
+# Больше диапазонов в одном запросе не обслуживается: Range игнорируется, отдается весь файл
+MAX_RANGES = 16
+_RANGE_SPEC = re.compile(r"^(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[list[tuple[int, int]]]:
+    """
+    Диапазоны [start, end] (включительно), отсортированные и слитые. None — заголовок отсутствует,
+    некорректен или слишком сложен (отдается весь файл); [] — ни один диапазон не попадает в файл (416).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    ranges = []
+    specs = header[len("bytes=") :].split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+    for spec in specs:
+        match = _RANGE_SPEC.match(spec.strip())
+        if not match or match.group(0) == "-":
+            return None
+        first, last = match.groups()
+        if not first:
+            # bytes=-N: последние N байт
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size:
+            ranges.append((start, end))
+    ranges.sort()
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Слабое сравнение (If-None-Match): W/ не учитывается
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def _not_later(header: Optional[str], last_modified: datetime) -> bool:
+    """Дата заголовка не раньше last_modified (с точностью до секунды)."""
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(last_modified.timestamp()) <= int(since.timestamp())
+
+
+class RangeFileResponse(Response):
+    """
+    Ответ на GET файла: статус (200 / 206 / 304 / 416) выбирается по заголовкам запроса в конструкторе,
+    файл открывается только при отправке тела.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        size: int,
+        etag: str,
+        last_modified: datetime,
+        request_headers: Mapping[str, str],
+        media_type: str,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        self.init_headers(headers)
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+        self.headers["accept-ranges"] = "bytes"
+        self._parts: list[tuple[int, int, bytes]] = []
+        self._epilogue = b""
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            not_modified = _not_later(request_headers.get("if-modified-since"), last_modified)
+        if not_modified:
+            self.status_code = 304
+            for name in ("content-type", "content-length"):
+                if name in self.headers:
+                    del self.headers[name]
+            return
+
+        ranges = parse_range(request_headers.get("range"), size)
+        if_range = request_headers.get("if-range")
+        if ranges is not None and if_range is not None:
+            # If-Range: диапазон только для той же версии файла, иначе — весь файл
+            fresh = if_range == etag if if_range.startswith('"') else _not_later(if_range, last_modified)
+            if not fresh:
+                ranges = None
+
+        if ranges is None:
+            self.status_code = 200
+            self._parts = [(0, size, b"")]
+        elif not ranges:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            return
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self._parts = [(start, end - start + 1, b"")]
+        else:
+            boundary = secrets.token_hex(16)
+            self.status_code = 206
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            for start, end in ranges:
+                head = (
+                    f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                # Разделитель перед следующей частью начинается с CRLF
+                self._parts.append((start, end - start + 1, (b"\r\n" if self._parts else b"") + head))
+            self._epilogue = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        self.headers["content-length"] = str(
+            sum(length + len(head) for _, length, head in self._parts) + len(self._epilogue)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self._parts:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        if self.status_code == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for offset, length, head in self._parts:
+                if head:
+                    await send({"type": "http.response.body", "body": head, "more_body": True})
+                if "http.response.zerocopysend" in extensions:
+                    await send(
+                        {
+                            "type": "http.response.zerocopysend",
+                            "file": file.wrapped.fileno(),
+                            "offset": offset,
+                            "count": length,
+                            "more_body": True,
+                        }
+                    )
+                    continue
+                await file.seek(offset)
+                remaining = length
+                while remaining:
+                    chunk = await file.read(min(CHUNK_BYTES, remaining))
+                    if not chunk:
+                        raise RuntimeError(f"Файл {self.path} короче ожидаемого")
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": self._epilogue, "more_body": False})
@@ -1,4 +1,8 @@
-"""Краткоживущие токены для скачивания файлов без заголовка Authorization (аналог pre-signed URL)."""
+"""
+Подписанные токены для доступа без заголовка Authorization: краткоживущие ссылки на скачивание
+файлов (аналог pre-signed URL) и бессрочные ссылки на календарную ICS-подписку.
+Ссылка на подписку содержит версию (users.calendar_feed_version) и отзывается ее увеличением.
+"""
 
 from __future__ import annotations
 
@@ -7,7 +11,7 @@ import hashlib
 import hmac
 import json
 import time
-from typing import Optional, Tuple
+from typing import Any, Optional, Tuple
 
 
 def _b64encode(data: bytes) -> str:
@@ -19,6 +23,24 @@ def _b64decode(data: str) -> bytes:
     return base64.urlsafe_b64decode(data + pad)
 
 
+def _sign(secret: str, payload: dict[str, Any]) -> str:
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True)
+    sig = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+    envelope = json.dumps({"b": body, "s": sig}, separators=(",", ":"))
+    return _b64encode(envelope.encode("utf-8"))
+
+
+def _verify(secret: str, token: str) -> dict[str, Any]:
+    """Полезная нагрузка токена; ValueError, если подпись не сходится."""
+    envelope = json.loads(_b64decode(token).decode("utf-8"))
+    body = envelope["b"]
+    sig = envelope["s"]
+    expect = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expect, sig):
+        raise ValueError("bad signature")
+    return json.loads(body)
+
+
 def create_file_download_token(
     secret: str,
     *,
@@ -26,28 +48,44 @@ def create_file_download_token(
     medication_id: int,
     max_age_seconds: int = 900,
 ) -> str:
-    payload = {
-        "fid": file_id,
-        "mid": medication_id,
-        "exp": int(time.time()) + max_age_seconds,
-    }
-    body = json.dumps(payload, separators=(",", ":"), sort_keys=True)
-    sig = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
-    envelope = json.dumps({"b": body, "s": sig}, separators=(",", ":"))
-    return _b64encode(envelope.encode("utf-8"))
+    return _sign(
+        secret,
+        {
+            "fid": file_id,
+            "mid": medication_id,
+            "exp": int(time.time()) + max_age_seconds,
+        },
+    )
 
 
 def parse_file_download_token(secret: str, token: str) -> Optional[Tuple[int, int]]:
     try:
-        envelope = json.loads(_b64decode(token).decode("utf-8"))
-        body = envelope["b"]
-        sig = envelope["s"]
-        expect = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
-        if not hmac.compare_digest(expect, sig):
-            return None
-        payload = json.loads(body)
+        payload = _verify(secret, token)
         if int(payload["exp"]) < time.time():
             return None
         return int(payload["fid"]), int(payload["mid"])
     except (KeyError, ValueError, TypeError, json.JSONDecodeError):
         return None
+
+
+def create_calendar_feed_token(
+    secret: str, *, user_id: int, version: int, family_member_id: Optional[int] = None
+) -> str:
+    """
+    Токен подписки не истекает: календарные приложения опрашивают ссылку годами.
+    version — текущая users.calendar_feed_version; токен действителен, пока она не изменилась.
+    """
+    return _sign(secret, {"kind": "ics", "uid": user_id, "fm": family_member_id, "v": version})
+
+
+def parse_calendar_feed_token(secret: str, token: str) -> Optional[Tuple[int, Optional[int], int]]:
+    """(user_id, family_member_id, version); сверка версии с БД — на стороне вызывающего."""
+    try:
+        payload = _verify(secret, token)
+        if payload.get("kind") != "ics":
+            return None
+        member = payload["fm"]
+        # Ссылки, выданные до появления версии, соответствуют начальной версии 0
+        return int(payload["uid"]), int(member) if member is not None else None, int(payload.get("v", 0))
+    except (KeyError, ValueError, TypeError, json.JSONDecodeError):
+        return None
@@ -0,0 +1,67 @@
+"""Потокобезопасный LRU-кэш в памяти процесса со счетчиками попаданий/промахов/вытеснений."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+def _size_of(value: Any) -> int:
+    return len(value) if isinstance(value, (bytes, bytearray, memoryview)) else 0
+
+
+class LRUCache:
+    """
+    max_bytes — дополнительный предел суммарного размера значений-байтов: вытесняются самые старые
+    записи, а значение больше всего предела не кэшируется вовсе.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int | None = None) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = _size_of(value)
+        with self._lock:
+            if key in self._data:
+                self.size_bytes -= _size_of(self._data.pop(key))
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self.size_bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes
+            ):
+                _, evicted = self._data.popitem(last=False)
+                self.size_bytes -= _size_of(evicted)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any | None:
+        with self._lock:
+            value = self._data.pop(key, None)
+            self.size_bytes -= _size_of(value)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
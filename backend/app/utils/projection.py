@@ -0,0 +1,62 @@
+"""
+Проекция строк Core-запроса в ответы списковых эндпоинтов.
+
+Запрос выбирает только колонки полей ответа (или разреженного набора fields=), строки
+переносятся в модель ответа без ORM-объектов и без повторной валидации: значения уже
+приведены типами колонок.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping, Optional, Sequence, Union
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.engine import Row
+
+# Сериализатор pydantic-core: модели, словари, даты — без промежуточного jsonable_encoder
+_ANY = TypeAdapter(Any)
+
+
+def parse_fields(raw: Optional[str], model: type[BaseModel]) -> Optional[tuple[str, ...]]:
+    """
+    fields=name,dosage -> поля в порядке модели; None — все поля.
+    ValueError, если указано поле, которого нет в модели.
+    """
+    if raw is None or not raw.strip():
+        return None
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested - model.model_fields.keys()
+    if unknown:
+        raise ValueError(
+            f"Неизвестные поля: {', '.join(sorted(unknown))}. Допустимые: {', '.join(model.model_fields)}"
+        )
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+def selected_fields(model: type[BaseModel], fields: Optional[Sequence[str]]) -> tuple[str, ...]:
+    return tuple(fields) if fields is not None else tuple(model.model_fields)
+
+
+def project_rows(
+    rows: Iterable[Union[Row, Mapping[str, Any]]], model: type[BaseModel], fields: Optional[Sequence[str]]
+) -> list[Any]:
+    """
+    Полный набор — экземпляры model (model_construct), разреженный — словари только с fields.
+    Лишние колонки строки (служебные, например ключ сортировки) отбрасываются.
+    Вместо строки можно передать словарь — для полей, собранных отдельным запросом.
+    """
+    names = selected_fields(model, fields)
+    mappings = (getattr(row, "_mapping", row) for row in rows)
+    if fields is None:
+        return [model.model_construct(**{name: m[name] for name in names}) for m in mappings]
+    return [{name: m[name] for name in names} for m in mappings]
+
+
+def dump_json(payload: Any) -> bytes:
+    """Компактный UTF-8 JSON (модели, в том числе из model_construct, и словари)."""
+    return _ANY.dump_json(payload)
+
+
+def json_response(payload: Any) -> Response:
+    return Response(content=dump_json(payload), media_type="application/json")
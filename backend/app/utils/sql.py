@@ -0,0 +1,14 @@
+"""Диалектно-зависимые конструкции SQL (SQLite / PostgreSQL)."""
+
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session, table):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (on_conflict_do_update / do_nothing)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
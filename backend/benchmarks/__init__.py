@@ -0,0 +1 @@
+"""Бенчмарки производительности (запуск вручную: python -m benchmarks.<имя>)."""
@@ -0,0 +1,99 @@
+"""
+Сравнение генерации курса приемов: построчный ORM-путь (как было) и пакетная вставка через Core.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_appointment_generation
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import db_models
+from app.services.appointment_generation import build_appointment_rows, bulk_insert_appointments, parse_times
+
+TIMES = ["08:00", "12:00", "16:00", "20:00"]
+SIZES = (100, 1_000, 10_000)
+
+
+def _legacy_generate(db, user_id: int, medication_id: int, start: date, end: date) -> None:
+    current = start
+    last_created = None
+    while current <= end:
+        for tm in TIMES:
+            parsed_time = datetime.strptime(tm, "%H:%M").time()
+            appointment = db_models.Appointment(
+                user_id=user_id,
+                medication_id=medication_id,
+                family_member_id=None,
+                date=current,
+                time=parsed_time,
+                status="pending",
+            )
+            db.add(appointment)
+            last_created = appointment
+        current = current + timedelta(days=1)
+    db.commit()
+    db.refresh(last_created)
+
+
+def _bulk_generate(db, user_id: int, medication_id: int, start: date, end: date) -> None:
+    rows = build_appointment_rows(
+        user_id=user_id,
+        medication_id=medication_id,
+        family_member_id=None,
+        start_date=start,
+        end_date=end,
+        period_type="daily",
+        times=parse_times(TIMES),
+    )
+    bulk_insert_appointments(db, rows)
+    db.commit()
+
+
+def _run(url: str, fn, rows: int) -> float:
+    engine = create_engine(url, future=True)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False, future=True)()
+    user = db_models.User(phone="+70000000000", password_hash="x", name="bench")
+    session.add(user)
+    session.flush()
+    med = db_models.Medication(user_id=user.id, name="bench", quantity="1", dosage="1")
+    session.add(med)
+    session.commit()
+
+    start = date(2026, 1, 1)
+    end = start + timedelta(days=rows // len(TIMES) - 1)
+    began = time.perf_counter()
+    fn(session, user.id, med.id, start, end)
+    elapsed = time.perf_counter() - began
+    session.close()
+    engine.dispose()
+    return elapsed
+
+
+def main() -> None:
+    url = os.environ.get("BENCH_DATABASE_URL")
+    tmpdir = None
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{tmpdir.name}/bench.db"
+    print(f"{'rows':>8} {'legacy, ms':>12} {'bulk, ms':>10} {'speedup':>8}")
+    for rows in SIZES:
+        legacy = _run(url, _legacy_generate, rows)
+        bulk = _run(url, _bulk_generate, rows)
+        print(f"{rows:>8} {legacy * 1000:>12.1f} {bulk * 1000:>10.1f} {legacy / bulk:>7.1f}x")
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Стоимость поиска по каталогу лекарств (q) при росте каталога: FTS-индекс против прежнего ILIKE '%term%'.
+
+Для каждого размера каталога пользователя (и 20 таких пользователей в таблице) измеряется
+медианное время запроса первой страницы. С индексом время почти не растет с размером каталога,
+ILIKE сканирует все строки пользователя.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_medication_search
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import tempfile
+from time import perf_counter
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import db_models
+from app.services.medication_search import apply_search
+
+USERS = 20
+SIZES = (1_000, 5_000, 20_000)
+REPEATS = 30
+WORDS = ["аспирин", "метформин", "ибупрофен", "парацетамол", "омепразол", "лозартан", "аторвастатин", "цетиризин"]
+
+
+def _seed(engine, per_user: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(db_models.User.__table__),
+            [{"id": u, "phone": f"+7000{u:07d}", "password_hash": "x", "name": "bench", "role": "user"} for u in range(1, USERS + 1)],
+        )
+        conn.execute(
+            insert(db_models.Medication.__table__),
+            [
+                {
+                    "user_id": u,
+                    "name": f"{WORDS[i % len(WORDS)]} {i}",
+                    "quantity": f"{i % 90 + 10} таблеток",
+                    "dosage": f"{(i % 8 + 1) * 50}mg",
+                    "description": f"партия {i}; {WORDS[(i * 3) % len(WORDS)]}",
+                }
+                for u in range(1, USERS + 1)
+                for i in range(per_user)
+            ],
+        )
+
+
+def _time(fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        began = perf_counter()
+        fn()
+        samples.append(perf_counter() - began)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    url = os.environ.get("BENCH_DATABASE_URL")
+    tmpdir = None
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{tmpdir.name}/bench.db"
+    engine = create_engine(url, future=True)
+    med = db_models.Medication
+    # Редкое совпадение: стоимость определяется поиском кандидатов, а не выдачей страницы
+    term = "1234"
+
+    for size in SIZES:
+        _seed(engine, size)
+        with Session(engine) as db:
+            base = db.query(med).filter(med.user_id == 1)
+
+            def indexed():
+                query, rank = apply_search(db, base, term)
+                query.order_by(rank.asc() if rank is not None else med.id.desc()).limit(20).all()
+
+            def ilike():
+                pattern = f"%{term}%"
+                base.filter(
+                    or_(med.name.ilike(pattern), med.description.ilike(pattern), med.dosage.ilike(pattern))
+                ).order_by(med.id.desc()).limit(20).all()
+
+            print(f"catalog {size:>6}/user ({size * USERS:>7} total): fts {_time(indexed):6.2f} ms, ilike {_time(ilike):6.2f} ms")
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Списки лекарств и расписаний: ORM-объекты + поштучная сборка Pydantic-моделей (прежний путь)
+против Core-проекции колонок в модели ответа и разреженного набора fields=.
+
+Для 100 и 1000 строк измеряются медианная задержка построения JSON-ответа и выделения памяти
+за один вызов (пик по tracemalloc). HTTP и кэш ответов в замер не входят.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_projected_reads
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import tempfile
+import tracemalloc
+from datetime import date, time
+from time import perf_counter
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import db_models
+from app.schemas.medications import MedicationResponse
+from app.schemas.schedules import MedicationScheduleResponse, TimeSlotResponse
+from app.services.schedule_listing import list_schedules
+from app.utils.projection import dump_json, project_rows, selected_fields
+
+SIZES = (100, 1_000)
+REPEATS = 30
+SPARSE = ("id", "name")
+
+
+def _seed(engine, rows: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(db_models.User.__table__),
+            [{"id": 1, "phone": "+70000000001", "password_hash": "x", "name": "bench", "role": "user"}],
+        )
+        conn.execute(
+            insert(db_models.FamilyMember.__table__),
+            [{"id": 1, "user_id": 1, "name": "Мама", "phone": "+70000000002", "relation": "mother"}],
+        )
+        conn.execute(
+            insert(db_models.Medication.__table__),
+            [
+                {
+                    "id": i,
+                    "user_id": 1,
+                    "name": f"Лекарство {i}",
+                    "quantity": f"{i % 90 + 10} таблеток",
+                    "dosage": f"{(i % 8 + 1) * 50}mg",
+                    "description": "Принимать по инструкции, запивая водой. " * 4,
+                    "take_with_food": "with",
+                }
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            insert(db_models.Schedule.__table__),
+            [
+                {
+                    "id": i,
+                    "medication_id": i,
+                    "family_member_id": 1,
+                    "start_date": date(2026, 1, 1),
+                    "end_date": date(2026, 3, 1),
+                    "period_type": "daily",
+                }
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            insert(db_models.TimeSlot.__table__),
+            [{"schedule_id": i, "time": time(h, 0)} for i in range(1, rows + 1) for h in (8, 20)],
+        )
+
+
+def _medications_orm(db: Session) -> bytes:
+    meds = db.query(db_models.Medication).filter(db_models.Medication.user_id == 1).order_by(db_models.Medication.id).all()
+    items = [
+        MedicationResponse(
+            id=m.id,
+            name=m.name,
+            quantity=m.quantity,
+            dosage=m.dosage,
+            description=m.description,
+            take_with_food=m.take_with_food,
+        )
+        for m in meds
+    ]
+    # response_model: FastAPI повторно валидирует возвращенные модели перед сериализацией
+    return _MED_LIST.dump_json(_MED_LIST.validate_python(items, from_attributes=True))
+
+
+def _medications_core(db: Session, fields=None) -> bytes:
+    med = db_models.Medication
+    rows = db.execute(
+        select(*(getattr(med, name) for name in selected_fields(MedicationResponse, fields)))
+        .where(med.user_id == 1)
+        .order_by(med.id)
+    )
+    return dump_json(project_rows(rows, MedicationResponse, fields))
+
+
+def _schedules_orm(db: Session) -> bytes:
+    schedules = (
+        db.query(db_models.Schedule)
+        .join(db_models.FamilyMember, db_models.FamilyMember.id == db_models.Schedule.family_member_id)
+        .filter(db_models.FamilyMember.user_id == 1, db_models.Schedule.family_member_id == 1)
+        .all()
+    )
+    items = []
+    for schedule in schedules:
+        medication = db.get(db_models.Medication, schedule.medication_id)
+        member = db.get(db_models.FamilyMember, schedule.family_member_id)
+        slots = db.query(db_models.TimeSlot).filter_by(schedule_id=schedule.id).all()
+        items.append(
+            MedicationScheduleResponse(
+                id=schedule.id,
+                medication_id=schedule.medication_id,
+                medication_name=medication.name,
+                family_member_id=schedule.family_member_id,
+                family_member_name=member.name,
+                start_date=schedule.start_date,
+                end_date=schedule.end_date,
+                time_slots=[TimeSlotResponse(id=s.id, time=s.time.strftime("%H:%M")) for s in slots],
+                period_type=schedule.period_type,
+            )
+        )
+    return _SCHEDULE_LIST.dump_json(_SCHEDULE_LIST.validate_python(items, from_attributes=True))
+
+
+_MED_LIST = TypeAdapter(List[MedicationResponse])
+_SCHEDULE_LIST = TypeAdapter(List[MedicationScheduleResponse])
+
+
+def _measure(fn) -> tuple[float, float]:
+    """(медиана мс, пик выделенной памяти КиБ) за один вызов."""
+    fn()  # прогрев: компиляция SQL, кэши SQLAlchemy
+    samples = []
+    for _ in range(REPEATS):
+        began = perf_counter()
+        fn()
+        samples.append(perf_counter() - began)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples) * 1000, peak / 1024
+
+
+def main() -> None:
+    url = os.environ.get("BENCH_DATABASE_URL")
+    tmpdir = None
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{tmpdir.name}/bench.db"
+    engine = create_engine(url, future=True)
+
+    for size in SIZES:
+        _seed(engine, size)
+        with Session(engine) as db:
+
+            def schedules_core(fields=None) -> bytes:
+                items = list_schedules(db, user_id=1, family_member_id=1, fields=fields)
+                return dump_json(items)
+
+            cases = [
+                ("medications orm+pydantic", lambda: _medications_orm(db)),
+                ("medications core", lambda: _medications_core(db)),
+                (f"medications core fields={','.join(SPARSE)}", lambda: _medications_core(db, SPARSE)),
+                ("schedules orm+pydantic", lambda: _schedules_orm(db)),
+                ("schedules core", lambda: schedules_core()),
+                ("schedules core fields=id,start_date", lambda: schedules_core(("id", "start_date"))),
+            ]
+            print(f"rows {size}")
+            for label, fn in cases:
+                ms, peak_kib = _measure(lambda: (db.expire_all(), fn()))
+                print(f"  {label:<40} {ms:8.2f} ms  peak {peak_kib:8.1f} KiB")
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
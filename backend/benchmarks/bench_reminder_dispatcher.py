@@ -0,0 +1,110 @@
+"""
+Пропускная способность рассылки напоминаний: 100 000 доз за час, один процесс.
+
+Час разбивается на минутные тики (как у фоновой рассылки); шлюз — LoggingSmsGateway без вывода,
+поэтому измеряется выборка по индексу, группировка по телефонам и цикл отправки.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_reminder_dispatcher
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import db_models
+from app.services.reminder_dispatcher import ReminderDispatcher, _window_filter
+from app.services.sms_gateway import LoggingSmsGateway
+
+USERS = 2_000
+DOSES_PER_USER = 50  # по дозе в минуту, 08:00..08:49
+DAY = date(2026, 3, 10)
+REQUIRED_PER_HOUR = 100_000
+
+
+def _seed(engine) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(db_models.User.__table__),
+            [
+                {"id": i, "phone": f"+7000{i:07d}", "password_hash": "x", "name": "bench", "sms_notifications": True, "role": "user"}
+                for i in range(1, USERS + 1)
+            ],
+        )
+        conn.execute(
+            insert(db_models.Medication.__table__),
+            [{"id": i, "user_id": i, "name": "bench", "quantity": "1", "dosage": "1"} for i in range(1, USERS + 1)],
+        )
+        # Шум: вчерашние и уже отмеченные дозы не должны попадать в выборку
+        for day, status in ((DAY - timedelta(days=1), "taken"), (DAY, "pending")):
+            conn.execute(
+                insert(db_models.Appointment.__table__),
+                [
+                    {
+                        "user_id": u,
+                        "medication_id": u,
+                        "family_member_id": None,
+                        "date": day,
+                        "time": time(8, m),
+                        "status": status,
+                    }
+                    for u in range(1, USERS + 1)
+                    for m in range(DOSES_PER_USER)
+                ],
+            )
+
+
+def main() -> None:
+    url = os.environ.get("BENCH_DATABASE_URL")
+    tmpdir = None
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{tmpdir.name}/bench.db"
+    engine = create_engine(url, future=True)
+    _seed(engine)
+
+    if engine.dialect.name == "sqlite":
+        appt = db_models.Appointment
+        stmt = select(appt.id).where(
+            appt.status == "pending",
+            _window_filter(appt, datetime.combine(DAY, time(8, 0)), datetime.combine(DAY, time(8, 1))),
+        )
+        with engine.connect() as conn:
+            compiled = stmt.compile(conn, compile_kwargs={"literal_binds": True})
+            plan = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+        print("plan:", " | ".join(str(row[-1]) for row in plan))
+
+    gateway = LoggingSmsGateway(log=False)
+    dispatcher = ReminderDispatcher(session_factory=lambda: Session(engine), gateway=gateway, interval_seconds=60)
+
+    async def run_hour() -> None:
+        start = datetime.combine(DAY, time(7, 59))
+        await dispatcher.tick(now=start)
+        for minute in range(1, 61):
+            await dispatcher.tick(now=start + timedelta(minutes=minute))
+
+    began = perf_counter()
+    asyncio.run(run_hour())
+    elapsed = perf_counter() - began
+
+    metrics = dispatcher.metrics.snapshot()
+    print(f"doses: {metrics['doses']}, messages: {metrics['messages']}, ticks: {metrics['ticks']}")
+    print(f"busy: {elapsed:.2f} s for one simulated hour, max tick: {metrics['max_tick_seconds']:.3f} s")
+    print(f"throughput: {metrics['doses'] / elapsed:,.0f} doses/s; required {REQUIRED_PER_HOUR / 3600:,.1f} doses/s")
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
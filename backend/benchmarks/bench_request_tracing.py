@@ -0,0 +1,96 @@
+"""
+Задержка GET /appointments/day/{date} с отладочной трассировкой и без нее.
+
+Режимы:
+  off        — LOG_LEVEL=INFO, debug-записи отбрасываются до форматирования;
+  debug-sync — DEBUG с синхронным StreamHandler (как прежние print в stdout);
+  debug      — DEBUG через QueueHandler (запись в поток в фоновом потоке).
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_request_tracing
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir.name}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.logging_setup import APP_LOGGER, configure_logging  # noqa: E402
+from app.main import app  # noqa: E402
+
+REQUESTS = 300
+DAY = "2026-03-10"
+
+
+def _prepare(client: TestClient) -> tuple[dict, int]:
+    client.post("/api/v1/auth/register", json={"phone": "+70000000001", "password": "password123", "name": "bench"})
+    tokens = client.post("/api/v1/auth/login", json={"phone": "+70000000001", "password": "password123"}).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    user_id = client.get("/api/v1/users/me", headers=headers).json()["user"]["id"]
+    med = client.post(
+        "/api/v1/medications/",
+        json={"name": "bench", "quantity": "1", "dosage": "1"},
+        headers=headers,
+    ).json()
+    client.post(
+        "/api/v1/appointments/",
+        json={
+            "medication_id": med["id"],
+            "start_date": DAY,
+            "end_date": DAY,
+            "period_type": "daily",
+            "times": ["08:00", "12:00", "16:00", "20:00"],
+        },
+        headers=headers,
+    )
+    return headers, user_id
+
+
+def _measure(client: TestClient, headers: dict, user_id: int) -> list[float]:
+    samples = []
+    for _ in range(REQUESTS):
+        began = time.perf_counter()
+        response = client.get(f"/api/v1/appointments/day/{DAY}", params={"user_id": user_id}, headers=headers)
+        samples.append(time.perf_counter() - began)
+        assert response.status_code == 200
+    return samples
+
+
+def _sync_debug(stream) -> None:
+    logger = logging.getLogger(APP_LOGGER)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+
+
+def main() -> None:
+    with TestClient(app) as client, open(os.path.join(_tmpdir.name, "bench.log"), "w") as sink:
+        configure_logging(sink, level="INFO")
+        headers, user_id = _prepare(client)
+        modes = {
+            "off": lambda: configure_logging(sink, level="INFO"),
+            "debug-sync": lambda: _sync_debug(sink),
+            "debug": lambda: configure_logging(sink, level="DEBUG"),
+        }
+        _measure(client, headers, user_id)  # прогрев
+        print(f"{'mode':>12} {'p50, ms':>9} {'p95, ms':>9}")
+        for name, setup in modes.items():
+            setup()
+            samples = sorted(_measure(client, headers, user_id))
+            p50 = statistics.median(samples) * 1000
+            p95 = samples[int(len(samples) * 0.95)] * 1000
+            print(f"{name:>12} {p50:>9.2f} {p95:>9.2f}")
+    _tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from collections.abc import Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import Session, sessionmaker
 
 # Test DB isolated from local dev DB
@@ -12,6 +12,7 @@ os.environ["DATABASE_URL"] = TEST_DB_URL
 
 from app.database import Base, get_db  # noqa: E402
 from app.main import app  # noqa: E402
+from app.services.response_cache import get_response_cache  # noqa: E402
 
 
 engine = create_engine(TEST_DB_URL, connect_args={"check_same_thread": False}, future=True)
@@ -33,9 +34,51 @@ app.dependency_overrides[get_db] = override_get_db
 def reset_db() -> Generator[None, None, None]:
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # Пересозданная БД выдает те же id: ответы прошлого теста не должны попадать в кэш
+    get_response_cache().clear()
     yield
 
 
+@pytest.fixture()
+def db_engine():
+    return engine
+
+
+@pytest.fixture()
+def pg_engine():
+    """
+    Отдельная PostgreSQL-БД для проверок, специфичных для диалекта (секционирование, pg_trgm).
+    Берется из TEST_POSTGRES_URL; схема public пересоздается — не указывайте рабочую БД.
+    Без переменной тесты пропускаются.
+    """
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL не задан")
+    from sqlalchemy import text
+
+    pg = create_engine(url, future=True)
+    with pg.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=pg)
+    yield pg
+    pg.dispose()
+
+
+@pytest.fixture()
+def query_counter() -> Generator[list[str], None, None]:
+    """Список SQL-запросов, выполненных к тестовой БД за время теста."""
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _record)
+
+
 @pytest.fixture()
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -0,0 +1,1019 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+
+def _create_med(client: TestClient, headers: dict[str, str], name: str = "Metformin") -> int:
+    res = client.post(
+        "/api/v1/medications/",
+        headers=headers,
+        json={"name": name, "quantity": "30 tabs", "dosage": "500mg", "take_with_food": "with"},
+    )
+    assert res.status_code == 200, res.text
+    return res.json()["id"]
+
+
+def _user_id(client: TestClient, headers: dict[str, str]) -> int:
+    return client.get("/api/v1/users/me", headers=headers).json()["user"]["id"]
+
+
+@pytest.mark.integration
+def test_create_course_returns_bulk_summary(client: TestClient, auth_headers: dict[str, str]):
+    med_id = _create_med(client, auth_headers)
+    res = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2026-01-01",
+            "end_date": "2026-01-10",
+            "times": ["08:00", "20:00", "08:00"],
+            "period_type": "every_other_day",
+        },
+    )
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert body["created"] == 10
+    assert body["last_id"] - body["first_id"] == 9
+
+    day = client.get(
+        "/api/v1/appointments/day/2026-01-03",
+        headers=auth_headers,
+        params={"user_id": _user_id(client, auth_headers)},
+    )
+    assert [a["time"] for a in day.json()["appointments"]] == ["08:00", "20:00"]
+
+
+@pytest.mark.integration
+def test_repeating_or_extending_a_course_inserts_only_missing_doses(
+    client: TestClient, auth_headers: dict[str, str]
+):
+    med_id = _create_med(client, auth_headers)
+    course = {"medication_id": med_id, "times": ["08:00", "20:00"], "period_type": "daily"}
+
+    def create(start: str, end: str) -> dict:
+        res = client.post("/api/v1/appointments/", headers=auth_headers, json={**course, "start_date": start, "end_date": end})
+        assert res.status_code == 200, res.text
+        return res.json()
+
+    first = create("2026-01-01", "2026-01-03")
+    assert (first["created"], first["skipped"]) == (6, 0)
+    retry = create("2026-01-01", "2026-01-03")
+    assert (retry["created"], retry["skipped"], retry["first_id"]) == (0, 6, None)
+    extended = create("2026-01-02", "2026-01-05")
+    assert (extended["created"], extended["skipped"]) == (4, 4)
+    assert extended["last_id"] - extended["first_id"] == 3
+
+    day = client.get(
+        "/api/v1/appointments/day/2026-01-02",
+        headers=auth_headers,
+        params={"user_id": _user_id(client, auth_headers)},
+    )
+    assert day.json()["stats"]["total"] == 2
+    trends = client.get(
+        "/api/v1/appointments/adherence/trends",
+        headers=auth_headers,
+        params={"start_date": "2026-01-01", "end_date": "2026-01-05"},
+    ).json()
+    assert [p["total"] for p in trends["points"]] == [2, 2, 2, 2, 2]
+
+
+@pytest.mark.integration
+def test_create_course_rejects_bad_time_format(client: TestClient, auth_headers: dict[str, str]):
+    med_id = _create_med(client, auth_headers)
+    res = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2026-01-01",
+            "end_date": "2026-01-02",
+            "times": ["8 утра"],
+            "period_type": "daily",
+        },
+    )
+    assert res.status_code == 400
+
+
+@pytest.mark.integration
+def test_virtual_course_expands_on_the_fly_and_persists_only_exceptions(
+    client: TestClient, auth_headers: dict[str, str]
+):
+    med_id = _create_med(client, auth_headers)
+    user_id = _user_id(client, auth_headers)
+    created = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2026-01-01",
+            "end_date": "2026-12-31",
+            "times": ["08:00", "20:00"],
+            "period_type": "every_other_day",
+            "mode": "virtual",
+        },
+    )
+    assert created.status_code == 200, created.text
+    series_id = created.json()["series_id"]
+    assert created.json()["created"] == 0
+
+    off_day = client.get("/api/v1/appointments/day/2026-01-02", headers=auth_headers, params={"user_id": user_id})
+    assert off_day.json()["appointments"] == []
+
+    day = client.get("/api/v1/appointments/day/2026-01-03", headers=auth_headers, params={"user_id": user_id})
+    doses = day.json()["appointments"]
+    assert [(d["id"], d["series_id"], d["time"]) for d in doses] == [
+        (None, series_id, "08:00"),
+        (None, series_id, "20:00"),
+    ]
+
+    taken = client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={
+            "series_id": series_id,
+            "occurrence_date": "2026-01-03",
+            "occurrence_time": "08:00",
+            "status": "taken",
+        },
+    )
+    assert taken.status_code == 200, taken.text
+    exception_id = taken.json()["id"]
+    assert exception_id is not None
+
+    day = client.get("/api/v1/appointments/day/2026-01-03", headers=auth_headers, params={"user_id": user_id})
+    body = day.json()
+    assert [(d["id"], d["status"]) for d in body["appointments"]] == [(exception_id, "taken"), (None, "pending")]
+    assert body["stats"] == {"pending": 1, "taken": 1, "skipped": 0, "total": 2}
+
+    reverted = client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"appointment_id": exception_id, "status": "pending"},
+    )
+    assert reverted.json()["id"] is None
+
+    deleted = client.delete(f"/api/v1/appointments/series/{series_id}", headers=auth_headers)
+    assert deleted.status_code == 200
+    day = client.get("/api/v1/appointments/day/2026-01-03", headers=auth_headers, params={"user_id": user_id})
+    assert day.json()["appointments"] == []
+
+
+@pytest.mark.integration
+def test_day_view_filters_family_member_in_sql_with_index(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    med_id = _create_med(client, auth_headers)
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Mom", "phone": "+79990000000"},
+    ).json()
+    for member_id in (None, member["id"]):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "start_date": "2026-02-01",
+                "end_date": "2026-02-01",
+                "times": ["09:00"],
+                "period_type": "daily",
+                "family_member_id": member_id,
+            },
+        )
+    user_id = _user_id(client, auth_headers)
+
+    own = client.get("/api/v1/appointments/day/2026-02-01", headers=auth_headers, params={"user_id": user_id})
+    assert [a["family_member_id"] for a in own.json()["appointments"]] == [None]
+    mom = client.get(
+        "/api/v1/appointments/day/2026-02-01",
+        headers=auth_headers,
+        params={"user_id": user_id, "family_member_id": member["id"]},
+    )
+    assert [a["family_member_id"] for a in mom.json()["appointments"]] == [member["id"]]
+
+    with db_engine.connect() as conn:
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM appointments "
+                "WHERE user_id = 1 AND date = '2026-02-01' AND family_member_id IS NULL"
+            )
+        ).fetchall()
+    assert "ix_appointments_user_date_member" in " ".join(str(row[-1]) for row in plan)
+
+
+@pytest.mark.integration
+def test_appointment_reads_use_constant_query_count(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    user_id = _user_id(client, auth_headers)
+    for day, medications in (("2026-03-01", 1), ("2026-03-02", 12)):
+        for n in range(medications):
+            client.post(
+                "/api/v1/appointments/",
+                headers=auth_headers,
+                json={
+                    "medication_id": _create_med(client, auth_headers, f"Med {n} {day}"),
+                    "start_date": day,
+                    "end_date": day,
+                    "times": ["08:00", "20:00"],
+                    "period_type": "daily",
+                },
+            )
+
+    counts = {}
+    for day in ("2026-03-01", "2026-03-02"):
+        for path, params in (
+            (f"/api/v1/appointments/day/{day}", {"user_id": user_id}),
+            ("/api/v1/appointments/calendar", {"user_id": user_id, "selected_date": day}),
+            ("/api/v1/appointments/pdf", {"start_date": day, "end_date": day}),
+        ):
+            query_counter.clear()
+            res = client.get(path, headers=auth_headers, params=params)
+            assert res.status_code == 200, res.text
+            counts.setdefault(path.split("/")[4], []).append(len(query_counter))
+
+    for view, (small, large) in counts.items():
+        assert small == large, f"{view}: {small} queries for 2 doses vs {large} for 24"
+
+
+@pytest.mark.integration
+def test_calendar_month_view_returns_per_day_counts(client: TestClient, auth_headers: dict[str, str]):
+    med_id = _create_med(client, auth_headers)
+    user_id = _user_id(client, auth_headers)
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Dad", "phone": "+79990000001"},
+    ).json()
+    for member_id, mode in ((None, "materialized"), (member["id"], "virtual")):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "start_date": "2026-04-28",
+                "end_date": "2026-05-03",
+                "times": ["08:00", "20:00"],
+                "period_type": "daily",
+                "family_member_id": member_id,
+                "mode": mode,
+            },
+        )
+    first = client.get("/api/v1/appointments/day/2026-04-30", headers=auth_headers, params={"user_id": user_id})
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"appointment_id": first.json()["appointments"][0]["id"], "status": "taken"},
+    )
+
+    res = client.get(
+        "/api/v1/appointments/calendar",
+        headers=auth_headers,
+        params={"user_id": user_id, "selected_date": "2026-04-15", "view_type": "month", "breakdown_by_member": True},
+    )
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert (body["range_start"], body["range_end"]) == ("2026-04-01", "2026-04-30")
+    assert len(body["days"]) == 30
+    last = body["days"][-1]
+    assert (last["total"], last["taken"], last["pending"]) == (4, 1, 3)
+    assert [(m["family_member_id"], m["total"]) for m in last["members"]] == [(None, 2), (member["id"], 2)]
+    assert body["days"][0]["total"] == 0
+
+    week = client.get(
+        "/api/v1/appointments/calendar",
+        headers=auth_headers,
+        params={"user_id": user_id, "selected_date": "2026-05-01", "view_type": "week"},
+    ).json()
+    assert (week["range_start"], week["range_end"]) == ("2026-04-27", "2026-05-03")
+    assert [d["total"] for d in week["days"]] == [0, 4, 4, 4, 4, 4, 4]
+    assert week["days"][1]["members"] is None
+
+
+@pytest.mark.integration
+def test_pdf_report_is_streamed_and_cached_by_data_version(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    from app.services.pdf_report import report_cache
+
+    report_cache.clear()
+    med_id = _create_med(client, auth_headers, "Аспирин")
+    user_id = _user_id(client, auth_headers)
+    for mode in ("materialized", "virtual"):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "start_date": "2026-06-01",
+                "end_date": "2026-06-30",
+                "times": ["08:00", "14:00", "20:00"] if mode == "virtual" else ["10:00"],
+                "period_type": "daily",
+                "mode": mode,
+            },
+        )
+    params = {"start_date": "2026-06-01", "end_date": "2026-06-30"}
+
+    first = client.get("/api/v1/appointments/pdf", headers=auth_headers, params=params)
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "application/pdf"
+    assert first.content.startswith(b"%PDF-1.4") and first.content.rstrip().endswith(b"%%EOF")
+    assert first.content.count(b"/Type /Page ") == 3  # 120 строк по 48 на страницу
+    assert "Аспирин".encode("cp1251") in first.content
+
+    query_counter.clear()
+    repeat = client.get("/api/v1/appointments/pdf", headers=auth_headers, params=params)
+    assert repeat.content == first.content
+    assert not any("appointments" in q for q in query_counter)
+
+    day = client.get("/api/v1/appointments/day/2026-06-02", headers=auth_headers, params={"user_id": user_id})
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"appointment_id": day.json()["appointments"][1]["id"], "status": "taken"},
+    )
+    changed = client.get("/api/v1/appointments/pdf", headers=auth_headers, params=params)
+    assert changed.content != first.content
+
+
+@pytest.mark.integration
+def test_pdf_report_of_another_user_requires_admin(client: TestClient, auth_headers: dict[str, str], db_engine):
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+
+    params = {"start_date": "2026-06-01", "end_date": "2026-06-01"}
+    other = client.post(
+        "/api/v1/auth/register", json={"phone": "+7 999 000 00 02", "password": "password123", "name": "Other"}
+    )
+    assert other.status_code == 200
+    with Session(db_engine) as db:
+        other_id = db.query(db_models.User.id).filter(db_models.User.name == "Other").scalar()
+
+    for extra in ({"params": {**params, "user_id": other_id}}, {"headers": {"X-User-Id": str(other_id)}}):
+        res = client.get(
+            "/api/v1/appointments/pdf",
+            headers={**auth_headers, **extra.get("headers", {})},
+            params=extra.get("params", params),
+        )
+        assert res.status_code == 403
+
+    with Session(db_engine) as db:
+        db.query(db_models.User).filter(db_models.User.name == "User").update({"role": "admin"})
+        db.commit()
+    res = client.get("/api/v1/appointments/pdf", headers=auth_headers, params={**params, "user_id": other_id})
+    assert res.status_code == 200 and res.content.startswith(b"%PDF")
+
+
+@pytest.mark.integration
+def test_oversized_pdf_report_is_streamed_but_not_cached(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch
+):
+    from app.routers import appointments
+    from app.services.pdf_report import report_cache
+
+    report_cache.clear()
+    monkeypatch.setattr(appointments, "MAX_CACHED_REPORT_BYTES", 1024)
+    med_id = _create_med(client, auth_headers, "Аспирин")
+    client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2026-06-01",
+            "end_date": "2026-06-30",
+            "times": ["08:00"],
+            "period_type": "daily",
+        },
+    )
+    res = client.get(
+        "/api/v1/appointments/pdf", headers=auth_headers, params={"start_date": "2026-06-01", "end_date": "2026-06-30"}
+    )
+    assert res.status_code == 200 and len(res.content) > 1024
+    assert len(report_cache) == 0
+
+
+@pytest.mark.integration
+def test_batch_status_update_validates_all_items_and_reports_per_item(
+    client: TestClient, auth_headers: dict[str, str]
+):
+    med_id = _create_med(client, auth_headers)
+    user_id = _user_id(client, auth_headers)
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Kid", "phone": "+79990000002"},
+    ).json()
+    for member_id in (None, member["id"]):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "start_date": "2026-07-01",
+                "end_date": "2026-07-01",
+                "times": ["08:00", "09:00", "10:00"],
+                "period_type": "daily",
+                "family_member_id": member_id,
+            },
+        )
+    own = client.get("/api/v1/appointments/day/2026-07-01", headers=auth_headers, params={"user_id": user_id})
+    own_ids = [a["id"] for a in own.json()["appointments"]]
+    kid = client.get(
+        "/api/v1/appointments/day/2026-07-01",
+        headers=auth_headers,
+        params={"user_id": user_id, "family_member_id": member["id"]},
+    )
+    kid_id = kid.json()["appointments"][0]["id"]
+
+    res = client.put(
+        "/api/v1/appointments/status/batch",
+        headers=auth_headers,
+        json={
+            "items": [
+                {"appointment_id": own_ids[0], "status": "taken"},
+                {"appointment_id": own_ids[1], "status": "skipped"},
+                {"appointment_id": own_ids[2], "status": "lost"},
+                {"appointment_id": kid_id, "status": "taken"},
+                {"appointment_id": 999_999, "status": "taken"},
+            ]
+        },
+    )
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert (body["updated"], body["failed"]) == (2, 3)
+    assert [r["success"] for r in body["results"]] == [True, True, False, False, False]
+    assert body["results"][0]["appointment"]["status"] == "taken"
+
+    stats = client.get(
+        "/api/v1/appointments/day/2026-07-01", headers=auth_headers, params={"user_id": user_id}
+    ).json()["stats"]
+    assert stats == {"pending": 1, "taken": 1, "skipped": 1, "total": 3}
+
+
+@pytest.mark.integration
+def test_adherence_rollups_stay_consistent_with_a_full_rebuild(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+    from app.services.adherence import rebuild_rollups
+
+    med_id = _create_med(client, auth_headers)
+    other_med = _create_med(client, auth_headers, "Other")
+    user_id = _user_id(client, auth_headers)
+    for med, mode in ((med_id, "materialized"), (med_id, "virtual"), (other_med, "materialized")):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med,
+                "start_date": "2026-08-03",
+                "end_date": "2026-08-16",
+                "times": ["07:00"] if mode == "virtual" else ["09:00", "21:00"],
+                "period_type": "daily",
+                "mode": mode,
+            },
+        )
+    day = client.get("/api/v1/appointments/day/2026-08-04", headers=auth_headers, params={"user_id": user_id})
+    doses = day.json()["appointments"]
+    virtual = next(d for d in doses if d["id"] is None)
+    stored = [d["id"] for d in doses if d["id"] is not None]
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={
+            "series_id": virtual["series_id"],
+            "occurrence_date": "2026-08-04",
+            "occurrence_time": "07:00",
+            "status": "taken",
+        },
+    )
+    client.put(
+        "/api/v1/appointments/status/batch",
+        headers=auth_headers,
+        json={
+            "items": [
+                {"appointment_id": stored[0], "status": "taken"},
+                {"appointment_id": stored[1], "status": "skipped"},
+            ]
+        },
+    )
+    client.delete(f"/api/v1/appointments/{stored[2]}", headers=auth_headers)
+    client.delete(f"/api/v1/medications/{other_med}", headers=auth_headers)
+
+    def snapshot(session: Session):
+        return {
+            model.__tablename__: sorted(
+                tuple(getattr(r, c.name) for c in model.__table__.columns)
+                for r in session.query(model).all()
+                if r.total
+            )
+            for model in (db_models.AdherenceDaily, db_models.AdherenceWeekly)
+        }
+
+    with Session(db_engine) as session:
+        incremental = snapshot(session)
+        rebuild_rollups(session, user_id)
+        session.flush()
+        assert snapshot(session) == incremental
+
+    trends = client.get(
+        "/api/v1/appointments/adherence/trends",
+        headers=auth_headers,
+        params={"start_date": "2026-08-03", "end_date": "2026-08-16", "granularity": "week"},
+    ).json()
+    assert [p["period_start"] for p in trends["points"]] == ["2026-08-03", "2026-08-10"]
+    first_week = trends["points"][0]
+    # 14 + 7 виртуальных - 1 удаленная; пропуск относился к удаленному лекарству
+    assert (first_week["total"], first_week["taken"], first_week["skipped"]) == (20, 2, 0)
+    assert first_week["adherence"] == 1.0
+
+
+@pytest.mark.integration
+def test_range_keyset_pages_cover_stored_and_virtual_doses_once(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    stored_med = _create_med(client, auth_headers, "Metformin")
+    virtual_med = _create_med(client, auth_headers, "Aspirin")
+    course = {"start_date": "2026-05-01", "end_date": "2026-05-03", "period_type": "daily"}
+    client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={**course, "medication_id": stored_med, "times": ["20:00", "08:00"]},
+    )
+    series_id = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={**course, "medication_id": virtual_med, "times": ["08:00"], "mode": "virtual"},
+    ).json()["series_id"]
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"series_id": series_id, "occurrence_date": "2026-05-02", "occurrence_time": "08:00", "status": "taken"},
+    )
+
+    seen, cursor = [], None
+    while True:
+        params = {"start_date": "2026-05-01", "end_date": "2026-05-03", "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/v1/appointments/range", headers=auth_headers, params=params)
+        assert page.status_code == 200, page.text
+        body = page.json()
+        assert len(body["items"]) <= 4
+        seen.extend(body["items"])
+        cursor = body["next_cursor"]
+        assert body["has_more"] is (cursor is not None)
+        if not cursor:
+            break
+
+    assert len(seen) == 9
+    keys = [(a["date"], a["time"]) for a in seen]
+    assert keys == sorted(keys)
+    assert len({(a["date"], a["time"], a["medication_id"]) for a in seen}) == 9
+    assert sum(1 for a in seen if a["id"] is None) == 2
+
+    taken = client.get(
+        "/api/v1/appointments/range",
+        headers=auth_headers,
+        params={"start_date": "2026-05-01", "end_date": "2026-05-03", "status": "taken"},
+    ).json()["items"]
+    assert [(a["date"], a["series_id"]) for a in taken] == [("2026-05-02", series_id)]
+    only_virtual_med = client.get(
+        "/api/v1/appointments/range",
+        headers=auth_headers,
+        params={"start_date": "2026-05-01", "end_date": "2026-05-03", "medication_id": virtual_med},
+    ).json()["items"]
+    assert [a["date"] for a in only_virtual_med] == ["2026-05-01", "2026-05-02", "2026-05-03"]
+
+    bad = client.get(
+        "/api/v1/appointments/range",
+        headers=auth_headers,
+        params={"start_date": "2026-05-01", "end_date": "2026-05-03", "cursor": "garbage"},
+    )
+    assert bad.status_code == 400
+
+    with db_engine.connect() as conn:
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM appointments WHERE user_id = 1 "
+                "AND (date, time, id) > ('2026-05-01', '08:00:00.000000', 1) ORDER BY date, time, id LIMIT 5"
+            )
+        ).fetchall()
+    plan_text = " ".join(str(row[-1]) for row in plan)
+    assert "ix_appointments_user_date_time_id" in plan_text
+    assert "TEMP B-TREE" not in plan_text
+
+
+@pytest.mark.integration
+def test_course_shift_and_delete_pending_run_set_based(
+    client: TestClient, auth_headers: dict[str, str], db_engine, query_counter: list[str]
+):
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+    from app.services.adherence import rebuild_rollups
+
+    med_id = _create_med(client, auth_headers)
+    user_id = _user_id(client, auth_headers)
+    created = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2030-01-01",
+            "end_date": "2030-01-03",
+            "times": ["08:00", "20:00"],
+            "period_type": "daily",
+        },
+    ).json()
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"appointment_id": created["first_id"], "status": "taken"},
+    )
+    scope = {"medication_id": med_id, "start_date": "2030-01-01", "end_date": "2030-01-03"}
+
+    def day_times(day: str) -> list[tuple[str, str]]:
+        res = client.get(f"/api/v1/appointments/day/{day}", headers=auth_headers, params={"user_id": user_id})
+        return [(a["time"], a["status"]) for a in res.json()["appointments"]]
+
+    query_counter.clear()
+    shifted = client.post("/api/v1/appointments/course/shift", headers=auth_headers, json={**scope, "minutes": 60})
+    assert shifted.json() == {"affected": 5}
+    updates = [q for q in query_counter if q.lstrip().upper().startswith("UPDATE APPOINTMENTS")]
+    assert len(updates) == 1 and "RETURNING" in updates[0].upper()  # rollup — по измененным строкам
+    assert not any("GROUP BY" in q.upper() and "FROM APPOINTMENTS" in q.upper() for q in query_counter)
+    assert day_times("2030-01-01") == [("08:00", "taken"), ("21:00", "pending")]
+
+    # Прием того же лекарства в диапазоне «парковки» (+400 лет) не входит в курс и не должен вернуться с ним
+    client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2430-01-02",
+            "end_date": "2430-01-02",
+            "times": ["09:00"],
+            "period_type": "daily",
+        },
+    )
+
+    # Сдвиг на сутки: дозы курса налезают друг на друга, но не на чужие приемы
+    next_day = client.post("/api/v1/appointments/course/shift", headers=auth_headers, json={**scope, "minutes": 1440})
+    assert next_day.json() == {"affected": 5}
+    assert day_times("2030-01-01") == [("08:00", "taken")]
+    assert day_times("2030-01-02") == [("21:00", "pending")]
+    assert day_times("2030-01-04") == [("09:00", "pending"), ("21:00", "pending")]
+    assert day_times("2430-01-02") == [("09:00", "pending")]
+
+    conflict = client.post(
+        "/api/v1/appointments/course/shift",
+        headers=auth_headers,
+        json={**scope, "end_date": "2030-01-04", "times": ["21:00"], "minutes": -720},
+    )
+    assert conflict.status_code == 409
+    assert day_times("2030-01-04") == [("09:00", "pending"), ("21:00", "pending")]
+
+    deleted = client.post(
+        "/api/v1/appointments/course/delete-pending",
+        headers=auth_headers,
+        json={**scope, "end_date": "2030-01-04"},
+    )
+    assert deleted.json() == {"affected": 5}
+    assert day_times("2030-01-01") == [("08:00", "taken")]
+    assert day_times("2030-01-04") == []
+
+    with Session(db_engine) as session:
+        incremental = sorted(
+            (r.date, r.total, r.pending, r.taken) for r in session.query(db_models.AdherenceDaily).all() if r.total
+        )
+        rebuild_rollups(session, user_id)
+        session.flush()
+        rebuilt = sorted(
+            (r.date, r.total, r.pending, r.taken) for r in session.query(db_models.AdherenceDaily).all() if r.total
+        )
+    assert incremental == rebuilt
+
+
+@pytest.mark.integration
+def test_archive_job_moves_old_months_and_keeps_series_exceptions(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    from datetime import date
+
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+    from app.services.appointment_archive import archive_cutoff, run_maintenance
+    from app.services.data_version import get_data_version
+
+    med_id = _create_med(client, auth_headers)
+    user_id = _user_id(client, auth_headers)
+    for start, end in (("2024-01-30", "2024-02-02"), ("2024-03-01", "2024-03-01")):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={"medication_id": med_id, "start_date": start, "end_date": end, "times": ["08:00"], "period_type": "daily"},
+        )
+    series_id = client.post(
+        "/api/v1/appointments/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "start_date": "2024-01-10",
+            "end_date": "2024-01-11",
+            "times": ["21:00"],
+            "period_type": "daily",
+            "mode": "virtual",
+        },
+    ).json()["series_id"]
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"series_id": series_id, "occurrence_date": "2024-01-10", "occurrence_time": "21:00", "status": "taken"},
+    )
+
+    # 2024-03-15 - 30 дней = 2024-02-14 -> архивируются целые месяцы до 2024-02-01
+    assert archive_cutoff(date(2024, 3, 15), 30) == date(2024, 2, 1)
+    with Session(db_engine) as session, session.begin():
+        version = get_data_version(session, user_id)
+        moved, created = run_maintenance(session, today=date(2024, 3, 15), after_days=30, months_ahead=3)
+        assert (moved, created) == (2, None)
+        assert get_data_version(session, user_id) == version + 1
+        archived = sorted(a.date.isoformat() for a in session.query(db_models.AppointmentArchive).all())
+    assert archived == ["2024-01-30", "2024-01-31"]
+
+    day = client.get("/api/v1/appointments/day/2024-01-10", headers=auth_headers, params={"user_id": user_id})
+    assert [a["status"] for a in day.json()["appointments"]] == ["taken"]
+    february = client.get("/api/v1/appointments/day/2024-02-01", headers=auth_headers, params={"user_id": user_id})
+    assert len(february.json()["appointments"]) == 1
+
+
+@pytest.mark.integration
+def test_partitioned_archive_keeps_series_exceptions_out_of_default_partition(pg_engine, monkeypatch):
+    from datetime import date, time
+
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    from app.config import settings
+    from app.migrations import partition_appointments
+    from app.models import db_models
+    from app.services.appointment_archive import DEFAULT_PARTITION, run_maintenance
+
+    with pg_engine.begin() as conn:
+        conn.execute(
+            insert(db_models.User.__table__),
+            [{"id": 1, "phone": "+70000000001", "password_hash": "x", "name": "pg", "role": "user"}],
+        )
+        conn.execute(insert(db_models.Medication.__table__), [{"id": 1, "user_id": 1, "name": "m", "quantity": "1", "dosage": "1"}])
+        conn.execute(
+            insert(db_models.AppointmentSeries.__table__),
+            [
+                {
+                    "id": 1,
+                    "user_id": 1,
+                    "medication_id": 1,
+                    "start_date": date(2023, 6, 1),
+                    "end_date": date(2024, 1, 31),
+                    "period_type": "daily",
+                    "times": "21:00",
+                }
+            ],
+        )
+        dose = {"user_id": 1, "medication_id": 1, "family_member_id": None}
+        conn.execute(
+            insert(db_models.Appointment.__table__),
+            [
+                {**dose, "date": date(2024, 1, 15), "time": time(8), "status": "taken", "series_id": None},
+                {**dose, "date": date(2024, 1, 10), "time": time(21), "status": "taken", "series_id": 1},
+            ],
+        )
+    monkeypatch.setattr(settings, "database_url", pg_engine.url.render_as_string(hide_password=False))
+    partition_appointments.main()
+    with pg_engine.begin() as conn:
+        # Исключение прошедшего месяца без своей партиции (как после прежних архиваций) — в DEFAULT
+        conn.execute(
+            insert(db_models.Appointment.__table__),
+            [{**dose, "date": date(2023, 6, 5), "time": time(21), "status": "skipped", "series_id": 1}],
+        )
+
+    def partition_rows() -> dict[str, int]:
+        with pg_engine.connect() as conn:
+            return {
+                name: conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+                for name in (DEFAULT_PARTITION, "appointments_p2023_06", "appointments_p2024_01")
+                if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            }
+
+    for run in range(2):
+        with Session(pg_engine) as session, session.begin():
+            moved, _ = run_maintenance(session, today=date(2024, 3, 15), after_days=30, months_ahead=1)
+        assert moved == (1 if run == 0 else 0)
+        assert partition_rows() == {DEFAULT_PARTITION: 0, "appointments_p2023_06": 1, "appointments_p2024_01": 1}
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM appointments_archive")).scalar() == 1
+        assert conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = 'appointments_p2024_01_uq_dose'")
+        ).first()
+
+
+@pytest.mark.integration
+def test_ics_feed_is_token_authenticated_and_answers_304_from_data_version(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    from datetime import date, timedelta
+
+    from app.services.ics_feed import feed_cache
+
+    feed_cache.clear()
+    today = date.today()
+    med_id = _create_med(client, auth_headers, "Аспирин")
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Мама", "phone": "+79990000000"},
+    ).json()
+    for mode in ("materialized", "virtual"):
+        client.post(
+            "/api/v1/appointments/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "start_date": str(today),
+                "end_date": str(today + timedelta(days=2)),
+                "times": ["20:00"] if mode == "virtual" else ["08:00"],
+                "period_type": "daily",
+                "mode": mode,
+            },
+        )
+    client.post(
+        "/api/v1/schedules/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "family_member_id": member["id"],
+            "start_date": str(today),
+            "end_date": str(today + timedelta(days=3)),
+            "time_slots": [{"hour": 9, "minute": 30}],
+            "period_type": "every_other_day",
+        },
+    )
+
+    assert client.get("/api/v1/appointments/feed.ics", params={"token": "not-a-valid-token"}).status_code == 401
+    url = client.get("/api/v1/appointments/feed-url", headers=auth_headers).json()["url"]
+    path = url.split("/api/v1", 1)[1]
+
+    first = client.get(f"/api/v1{path}")
+    assert first.status_code == 200
+    assert first.headers["content-type"].startswith("text/calendar")
+    body = first.text
+    assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+    assert body.count("BEGIN:VEVENT") == 3 + 3 + 2
+    assert f"DTSTART:{today:%Y%m%d}T093000" in body and "SUMMARY:Аспирин (Мама)" in body
+    etag = first.headers["etag"]
+
+    query_counter.clear()
+    not_modified = client.get(f"/api/v1{path}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.headers["etag"] == etag
+    assert not any("appointments" in q or "schedules" in q for q in query_counter)
+
+    member_url = client.get(
+        "/api/v1/appointments/feed-url", headers=auth_headers, params={"family_member_id": member["id"]}
+    ).json()["url"]
+    assert client.get("/api/v1" + member_url.split("/api/v1", 1)[1]).text.count("BEGIN:VEVENT") == 2
+
+    day = client.get(
+        f"/api/v1/appointments/day/{today}", headers=auth_headers, params={"user_id": _user_id(client, auth_headers)}
+    )
+    client.put(
+        "/api/v1/appointments/status",
+        headers=auth_headers,
+        json={"appointment_id": day.json()["appointments"][0]["id"], "status": "taken"},
+    )
+    changed = client.get(f"/api/v1{path}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert "DESCRIPTION:Статус: принят" in changed.text
+
+
+@pytest.mark.integration
+def test_calendar_feed_links_are_revoked_by_rotation_and_admin(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    def feed_path(url: str) -> str:
+        return "/api/v1" + url.split("/api/v1", 1)[1]
+
+    old = feed_path(client.get("/api/v1/appointments/feed-url", headers=auth_headers).json()["url"])
+    first = client.get(old)
+    assert first.status_code == 200
+
+    rotated = client.post("/api/v1/appointments/feed-url/rotate", headers=auth_headers)
+    assert rotated.status_code == 200
+    new = feed_path(rotated.json()["url"])
+    assert new != old
+    # Отозванная ссылка не получает и 304 по прежнему ETag
+    assert client.get(old, headers={"If-None-Match": first.headers["etag"]}).status_code == 401
+    assert client.get(new).status_code == 200
+
+    with db_engine.begin() as conn:
+        conn.execute(text("UPDATE users SET role = 'admin'"))
+    user_id = _user_id(client, auth_headers)
+    revoked = client.post(f"/api/v1/users/{user_id}/revoke-tokens", headers=auth_headers)
+    assert revoked.status_code == 200
+    assert client.get(new).status_code == 401
+
+
+def _recording_broker(monkeypatch):
+    from app.services import event_broker
+
+    class RecordingBroker(event_broker.EventBroker):
+        def __init__(self) -> None:
+            self.events: list[tuple[int, dict]] = []
+
+        async def publish(self, user_id: int, event: dict) -> None:
+            self.events.append((user_id, event))
+
+        def subscribe(self, user_id: int):
+            raise NotImplementedError
+
+    broker = RecordingBroker()
+    monkeypatch.setattr(event_broker, "_broker", broker)
+    return broker
+
+
+@pytest.mark.integration
+def test_appointment_writes_publish_push_events(client: TestClient, auth_headers: dict[str, str], monkeypatch):
+    broker = _recording_broker(monkeypatch)
+    user_id = _user_id(client, auth_headers)
+    med_id = _create_med(client, auth_headers)
+    course = {"medication_id": med_id, "start_date": "2026-06-01", "end_date": "2026-06-01", "times": ["08:00"]}
+    client.post("/api/v1/appointments/", headers=auth_headers, json={**course, "period_type": "daily"})
+    client.post("/api/v1/appointments/", headers=auth_headers, json={**course, "period_type": "daily"})  # дубль
+    day = client.get("/api/v1/appointments/day/2026-06-01", headers=auth_headers, params={"user_id": user_id})
+    appointment_id = day.json()["appointments"][0]["id"]
+    client.put("/api/v1/appointments/status", headers=auth_headers, json={"appointment_id": appointment_id, "status": "taken"})
+    client.delete(f"/api/v1/appointments/{appointment_id}", headers=auth_headers)
+
+    assert [uid for uid, _ in broker.events] == [user_id] * 3
+    created, updated, deleted = (event for _, event in broker.events)
+    assert created["type"] == "appointments.created" and created["start_date"] == "2026-06-01"
+    assert updated["type"] == "appointment.updated"
+    assert updated["appointments"][0]["id"] == appointment_id and updated["appointments"][0]["status"] == "taken"
+    assert deleted == {
+        "type": "appointment.deleted",
+        "appointment_id": appointment_id,
+        "date": "2026-06-01",
+        "family_member_id": None,
+        "series_id": None,
+    }
+
+
+@pytest.mark.integration
+def test_cascading_deletes_publish_appointments_changed(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch
+):
+    broker = _recording_broker(monkeypatch)
+    user_id = _user_id(client, auth_headers)
+    med_id = _create_med(client, auth_headers)
+    member = client.post(
+        "/api/v1/users/me/family", headers=auth_headers, json={"name": "Mom", "phone": "+79990000000"}
+    ).json()
+    schedule = client.post(
+        "/api/v1/schedules/",
+        headers=auth_headers,
+        json={
+            "medication_id": med_id,
+            "family_member_id": member["id"],
+            "start_date": "2026-06-01",
+            "end_date": "2026-06-03",
+            "time_slots": [{"hour": 9, "minute": 0}],
+            "period_type": "daily",
+        },
+    ).json()
+    broker.events.clear()
+
+    client.delete(f"/api/v1/schedules/{schedule['id']}", headers=auth_headers)
+    client.delete(f"/api/v1/users/me/family/{member['id']}", headers=auth_headers)
+    client.delete(f"/api/v1/medications/{med_id}", headers=auth_headers)
+
+    assert [uid for uid, _ in broker.events] == [user_id] * 3
+
+    def changed(medication_id=None, family_member_id=None, start_date=None, end_date=None) -> dict:
+        return {
+            "type": "appointments.changed",
+            "medication_id": medication_id,
+            "family_member_id": family_member_id,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+
+    assert [event for _, event in broker.events] == [
+        changed(med_id, member["id"], "2026-06-01", "2026-06-03"),
+        changed(family_member_id=member["id"]),
+        changed(medication_id=med_id),
+    ]
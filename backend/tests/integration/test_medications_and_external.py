@@ -1,4 +1,6 @@
-﻿import pytest
+import json
+
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -52,3 +54,464 @@ def test_import_external_drug_and_duplicate_conflict(client: TestClient, auth_he
 
     second = client.post("/api/v1/external/drug-info/import", headers=auth_headers, json=payload)
     assert second.status_code == 409
+
+
+@pytest.mark.integration
+def test_medication_search_uses_fulltext_index_and_ranks_by_relevance(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    cardio = _create_med(client, auth_headers, "Аспирин Кардио")
+    other = client.post(
+        "/api/v1/medications/",
+        headers=auth_headers,
+        json={"name": "Тромбо АСС", "quantity": "30", "dosage": "100mg", "description": "аналог: аспирин"},
+    ).json()["id"]
+    _create_med(client, auth_headers, "Paracetamol")
+
+    def search(q: str, **params) -> list[int]:
+        res = client.get("/api/v1/medications/", headers=auth_headers, params={"q": q, **params})
+        assert res.status_code == 200, res.text
+        return [item["id"] for item in res.json()["items"]]
+
+    query_counter.clear()
+    assert search("аспир") == [cardio, other]  # совпадение в названии выше, чем в описании
+    assert any("medications_fts MATCH" in q for q in query_counter)
+    assert search("кард асп") == [cardio]
+    assert search("аспир", sort_by="id", sort_order="asc") == [cardio, other]
+    assert search("АС 100") == [other]  # короткое слово — через ILIKE среди найденных
+
+    client.put(f"/api/v1/medications/{cardio}", headers=auth_headers, json={"name": "Кардиомагнил", "description": "магний"})
+    assert search("аспир") == [other]
+    client.delete(f"/api/v1/medications/{other}", headers=auth_headers)
+    assert search("аспир") == []
+
+    imported = client.post(
+        "/api/v1/external/drug-info/import",
+        headers=auth_headers,
+        json={"title": "aspirin 81 MG Oral Tablet", "indication": None, "warnings": None},
+    ).json()["id"]
+    assert search("ASPIRIN oral") == [imported]
+
+
+@pytest.mark.integration
+def test_quantity_and_dosage_filters_use_trigram_index(client: TestClient, auth_headers: dict[str, str], db_engine):
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+    from app.services.medication_search import apply_search
+
+    for name, quantity, dosage in (
+        ("Metformin", "30 tabs", "500mg"),
+        ("Metformin XR", "60 tabs", "1000mg"),
+        ("Insulin", "10 ml", "5 units"),
+    ):
+        client.post(
+            "/api/v1/medications/",
+            headers=auth_headers,
+            json={"name": name, "quantity": quantity, "dosage": dosage},
+        )
+
+    def names(**params) -> list[str]:
+        res = client.get("/api/v1/medications/", headers=auth_headers, params={"sort_by": "name", "sort_order": "asc", **params})
+        assert res.status_code == 200, res.text
+        return [item["name"] for item in res.json()["items"]]
+
+    assert names(quantity_contains="TABS") == ["Metformin", "Metformin XR"]
+    assert names(quantity_contains="tabs", dosage_contains="000m") == ["Metformin XR"]
+    assert names(dosage_contains="00", q="insulin") == []
+    assert names(dosage_contains="5") == ["Insulin", "Metformin"]  # короче триграммы — ILIKE
+
+    with Session(db_engine) as db:
+        base = db.query(db_models.Medication.id).filter(db_models.Medication.user_id == 1)
+        query, _ = apply_search(db, base, quantity_contains="tabs", dosage_contains="500")
+        compiled = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+        details = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    assert any("medications_fts VIRTUAL TABLE INDEX" in d for d in details), details
+    assert not any(d.split(" ")[:2] == ["SCAN", "medications"] for d in details), details
+
+
+@pytest.mark.integration
+def test_quantity_and_dosage_filters_use_pg_trgm_index(pg_engine):
+    from sqlalchemy import insert, text
+    from sqlalchemy.orm import Session
+
+    from app.models import db_models
+    from app.services.medication_search import apply_search
+
+    with Session(pg_engine) as db, db.begin():
+        user_id = db.execute(
+            insert(db_models.User).values(phone="+79990000000", password_hash="x", name="User", role="user")
+            .returning(db_models.User.id)
+        ).scalar_one()
+        db.execute(
+            insert(db_models.Medication),
+            [
+                {"user_id": user_id, "name": f"Med {i}", "quantity": f"{i} caps", "dosage": f"{i % 97}mg"}
+                for i in range(5000)
+            ]
+            + [{"user_id": user_id, "name": "Metformin", "quantity": "30 tabs", "dosage": "500mg"}],
+        )
+
+    with pg_engine.connect() as conn:
+        conn.execute(text("ANALYZE medications"))
+        with Session(bind=conn) as db:
+            query, _ = apply_search(db, db.query(db_models.Medication.id), quantity_contains="tabs", dosage_contains="500")
+            assert [row.id for row in query.all()] != []
+            compiled = query.statement.compile(conn, compile_kwargs={"literal_binds": True})
+            plan = "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {compiled}")))
+    assert "ix_medications_quantity_trgm" in plan or "ix_medications_dosage_trgm" in plan, plan
+    assert "Seq Scan on medications" not in plan, plan
+
+
+@pytest.mark.integration
+def test_medications_cursor_pages_without_count_and_cached_total(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    ids = [_create_med(client, auth_headers, name) for name in ("Beta", "Alpha", "Gamma", "Alpha", "Delta")]
+    url = "/api/v1/medications/"
+
+    seen, cursor = [], None
+    query_counter.clear()
+    while True:
+        params = {"pagination": "cursor", "sort_by": "name", "sort_order": "asc", "page_size": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get(url, headers=auth_headers, params=params).json()
+        assert body["total"] is None and body["page"] is None
+        seen += [(item["name"], item["id"]) for item in body["items"]]
+        cursor = body["next_cursor"]
+        assert body["has_more"] is (cursor is not None)
+        if not cursor:
+            break
+    assert seen == sorted(zip(("Beta", "Alpha", "Gamma", "Alpha", "Delta"), ids))
+    listing = [q for q in query_counter if "FROM medications" in q]
+    assert len(listing) == 3
+    assert not any("count(" in q.lower() for q in listing)
+
+    desc = client.get(url, headers=auth_headers, params={"pagination": "cursor", "page_size": 10}).json()
+    assert [item["id"] for item in desc["items"]] == sorted(ids, reverse=True)
+
+    query_counter.clear()
+    cached = client.get(url, headers=auth_headers, params={"total": "cached", "page_size": 2}).json()
+    assert (cached["total"], cached["pages"]) == (5, 3)
+    assert not any("count(" in q.lower() for q in query_counter)
+
+    client.delete(f"{url}{ids[0]}", headers=auth_headers)
+    client.post(
+        "/api/v1/external/drug-info/import",
+        headers=auth_headers,
+        json={"title": "aspirin", "indication": None, "warnings": None},
+    )
+    assert client.get(url, headers=auth_headers, params={"total": "cached"}).json()["total"] == 5
+    filtered = client.get(url, headers=auth_headers, params={"total": "cached", "q": "alpha"}).json()
+    assert filtered["total"] == 2  # с фильтром счетчик не применим — точный подсчет
+
+    assert client.get(url, headers=auth_headers, params={"cursor": "broken"}).status_code == 400
+    by_name = client.get(url, headers=auth_headers, params={"pagination": "cursor", "sort_by": "name", "page_size": 1}).json()
+    mismatch = client.get(url, headers=auth_headers, params={"cursor": by_name["next_cursor"], "sort_by": "id"})
+    assert mismatch.status_code == 400
+    assert client.get(url, headers=auth_headers, params={"pagination": "cursor", "q": "alpha"}).status_code == 400
+
+
+@pytest.mark.integration
+def test_missing_medication_counter_is_seeded_from_catalog(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    from sqlalchemy import text
+
+    ids = [_create_med(client, auth_headers, name) for name in ("Alpha", "Beta", "Gamma")]
+    url = "/api/v1/medications/"
+    # БД до миграции: таблица счетчиков есть (create_all), строки пользователя нет
+    with db_engine.begin() as conn:
+        conn.execute(text("DELETE FROM user_medication_counters"))
+
+    def totals() -> tuple[int, int]:
+        cached = client.get(url, headers=auth_headers, params={"total": "cached"}).json()["total"]
+        exact = client.get(url, headers=auth_headers, params={"total": "exact"}).json()["total"]
+        return cached, exact
+
+    _create_med(client, auth_headers, "Delta")
+    assert totals() == (4, 4)
+
+    with db_engine.begin() as conn:
+        conn.execute(text("DELETE FROM user_medication_counters"))
+    client.delete(f"{url}{ids[0]}", headers=auth_headers)
+    assert totals() == (3, 3)
+
+
+@pytest.mark.integration
+def test_read_endpoints_served_from_response_cache_until_write(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    med_id = _create_med(client, auth_headers, "Ibuprofen")
+    list_url, item_url = "/api/v1/medications/", f"/api/v1/medications/{med_id}"
+
+    first = client.get(list_url, headers=auth_headers)
+    assert first.headers["X-Cache"] == "MISS"
+    query_counter.clear()
+    again = client.get(list_url, headers=auth_headers)
+    assert again.headers["X-Cache"] == "HIT" and again.json() == first.json()
+    assert not any("FROM medications" in q for q in query_counter)
+
+    assert client.get(item_url, headers=auth_headers).headers["X-Cache"] == "MISS"
+    assert client.get(item_url, headers=auth_headers).headers["X-Cache"] == "HIT"
+    client.put(item_url, headers=auth_headers, json={"name": "Nurofen"})
+    item = client.get(item_url, headers=auth_headers)
+    assert item.headers["X-Cache"] == "MISS" and item.json()["name"] == "Nurofen"
+    assert client.get(list_url, headers=auth_headers).json()["items"][0]["name"] == "Nurofen"
+
+    client.get("/api/v1/users/me/family", headers=auth_headers)
+    client.post("/api/v1/users/me/family", headers=auth_headers, json={"name": "Мама", "phone": "+7 900 000 00 01", "relation": "mother"})
+    family = client.get("/api/v1/users/me/family", headers=auth_headers)
+    assert family.headers["X-Cache"] == "MISS" and [m["name"] for m in family.json()] == ["Мама"]
+    assert client.get("/api/v1/users/me", headers=auth_headers).json()["family_members"][0]["name"] == "Мама"
+    client.put("/api/v1/users/me", headers=auth_headers, json={"name": "Новое имя"})
+    assert client.get("/api/v1/users/me", headers=auth_headers).json()["user"]["name"] == "Новое имя"
+
+    caches = client.get("/health/detailed").json()["components"]["caches"]
+    assert caches["responses"]["hits"] >= 2 and caches["responses"]["misses"] >= 4
+    assert {"evictions", "invalidations"} <= caches["responses"].keys()
+
+
+@pytest.mark.integration
+def test_import_in_batches_reports_bad_rows_and_export_round_trips(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str], monkeypatch
+):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "medication_import_batch_size", 2)
+    csv_body = (
+        "name,quantity,dosage,description,take_with_food\n"
+        "Аспирин,20 tabs,1x day,,before\n"
+        "Ibuprofen,10 tabs,2x day,\"desc, with comma\",with\n"
+        ",5 tabs,1x day,,\n"
+        "Paracetamol,10 tabs,3x day,,soon\n"
+        "Omeprazole,14 caps,1x day,,\n"
+    )
+    query_counter.clear()
+    res = client.post(
+        "/api/v1/medications/import",
+        headers=auth_headers,
+        files={"file": ("catalog.csv", csv_body.encode("utf-8"), "text/csv")},
+    )
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert (body["created"], body["failed"]) == (3, 2)
+    assert [e["line"] for e in body["errors"]] == [4, 5]
+    assert sum(1 for q in query_counter if q.startswith("INSERT INTO medications ")) == 2
+
+    ndjson = '{"name": "Vitamin D", "quantity": "30 caps", "dosage": "1x day"}\n\nnot json\n'
+    res = client.post(
+        "/api/v1/medications/import",
+        headers=auth_headers,
+        files={"file": ("more.ndjson", ndjson.encode("utf-8"), "application/x-ndjson")},
+    )
+    assert (res.json()["created"], res.json()["errors"]) == (1, [{"line": 3, "error": res.json()["errors"][0]["error"]}])
+    listing = client.get("/api/v1/medications/", headers=auth_headers, params={"total": "cached"}).json()
+    assert listing["total"] == 4
+
+    exported = client.get("/api/v1/medications/export", headers=auth_headers)
+    assert exported.headers["content-type"].startswith("text/csv")
+    lines = exported.content.decode("utf-8-sig").splitlines()
+    assert lines[0] == "id,name,quantity,dosage,description,take_with_food"
+    assert len(lines) == 5 and '"desc, with comma"' in lines[2]
+
+    records = client.get("/api/v1/medications/export", headers=auth_headers, params={"format": "ndjson"}).text
+    assert [json.loads(line)["name"] for line in records.splitlines()] == ["Аспирин", "Ibuprofen", "Omeprazole", "Vitamin D"]
+
+    bad_header = client.post(
+        "/api/v1/medications/import",
+        headers=auth_headers,
+        files={"file": ("x.csv", b"title,dosage\nA,1\n", "text/csv")},
+    )
+    assert bad_header.status_code == 400
+    unknown = client.post(
+        "/api/v1/medications/import", headers=auth_headers, files={"file": ("x.txt", b"", "text/plain")}
+    )
+    assert unknown.status_code == 400
+
+
+@pytest.mark.integration
+def test_delete_medication_removes_stored_files_after_commit(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch, tmp_path
+):
+    from app.services import object_storage
+
+    storage = object_storage.LocalFilesystemStorage(tmp_path)
+    monkeypatch.setattr(object_storage, "_storage", storage)
+    med_id = _create_med(client, auth_headers, "Ibuprofen")
+    for i in range(3):
+        res = client.post(
+            f"/api/v1/medications/{med_id}/files",
+            headers=auth_headers,
+            files={"file": (f"scan{i}.png", b"\x89PNG" + bytes([i]), "image/png")},
+        )
+        assert res.status_code == 201, res.text
+    single = client.get(f"/api/v1/medications/{med_id}/files", headers=auth_headers).json()[0]["id"]
+    assert client.delete(f"/api/v1/medications/{med_id}/files/{single}", headers=auth_headers).status_code == 204
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 2
+
+    assert client.delete(f"/api/v1/medications/{med_id}", headers=auth_headers).json()["status"] == "deleted"
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+@pytest.mark.integration
+def test_upload_streams_to_storage_and_rejects_oversized_file(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch, tmp_path
+):
+    from app.config import settings
+    from app.services import object_storage
+
+    monkeypatch.setattr(object_storage, "_storage", object_storage.LocalFilesystemStorage(tmp_path))
+    monkeypatch.setattr(object_storage, "STREAM_CHUNK_BYTES", 1024)
+    monkeypatch.setattr(settings, "file_upload_max_bytes", 5000)
+    med_id = _create_med(client, auth_headers, "Ibuprofen")
+    url = f"/api/v1/medications/{med_id}/files"
+
+    ok = client.post(url, headers=auth_headers, files={"file": ("scan.pdf", b"%PDF" + bytes(4996), "application/pdf")})
+    assert ok.status_code == 201 and ok.json()["size_bytes"] == 5000
+    too_big = client.post(url, headers=auth_headers, files={"file": ("big.pdf", bytes(5001), "application/pdf")})
+    assert too_big.status_code == 413
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 1
+    assert len(client.get(url, headers=auth_headers).json()) == 1
+
+
+@pytest.mark.integration
+def test_upload_body_limit_applies_before_multipart_is_spooled(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch, tmp_path
+):
+    from starlette.formparsers import MultiPartParser
+
+    from app.config import settings
+    from app.services import object_storage
+
+    monkeypatch.setattr(object_storage, "_storage", object_storage.LocalFilesystemStorage(tmp_path))
+    monkeypatch.setattr(settings, "file_upload_max_bytes", 5000)
+    med_id = _create_med(client, auth_headers, "Ibuprofen")
+    url = f"/api/v1/medications/{med_id}/files"
+    parsed: list[int] = []
+    original_parse = MultiPartParser.parse
+
+    async def recording_parse(self):
+        parsed.append(1)
+        return await original_parse(self)
+
+    monkeypatch.setattr(MultiPartParser, "parse", recording_parse)
+
+    declared = client.post(url, headers=auth_headers, files={"file": ("big.pdf", bytes(200_000), "application/pdf")})
+    assert declared.status_code == 413
+    assert parsed == []
+
+    boundary = "limit-boundary"
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+
+    def chunked_body():
+        yield head
+        for _ in range(100):
+            yield bytes(10_000)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    chunked = client.post(
+        url,
+        headers={**auth_headers, "Content-Type": f"multipart/form-data; boundary={boundary}"},
+        content=chunked_body(),
+    )
+    assert chunked.status_code == 413
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert client.get(url, headers=auth_headers).json() == []
+
+
+@pytest.mark.integration
+def test_list_endpoints_select_only_requested_fields(
+    client: TestClient, auth_headers: dict[str, str], query_counter: list[str]
+):
+    med_ids = [_create_med(client, auth_headers, name) for name in ("Aspirin", "Ibuprofen")]
+    member = client.post(
+        "/api/v1/users/me/family", headers=auth_headers, json={"name": "Мама", "phone": "+7 900 000 00 01"}
+    ).json()
+    for med_id, slots in zip(med_ids, ([(8, 0), (20, 0)], [(9, 30)])):
+        client.post(
+            "/api/v1/schedules/",
+            headers=auth_headers,
+            json={
+                "medication_id": med_id,
+                "family_member_id": member["id"],
+                "start_date": "2026-01-01",
+                "end_date": "2026-01-10",
+                "time_slots": [{"hour": h, "minute": m} for h, m in slots],
+                "period_type": "daily",
+            },
+        )
+
+    query_counter.clear()
+    meds = client.get("/api/v1/medications/", headers=auth_headers, params={"fields": "name", "sort_by": "name"}).json()
+    assert meds["items"] == [{"name": "Ibuprofen"}, {"name": "Aspirin"}] and meds["total"] == 2
+    listing = next(q for q in query_counter if "FROM medications" in q and "count(" not in q.lower())
+    assert "medications.description" not in listing and "medications.dosage" not in listing
+    assert client.get("/api/v1/medications/", headers=auth_headers, params={"fields": "name,secret"}).status_code == 400
+
+    query_counter.clear()
+    schedules = client.get("/api/v1/schedules/", headers=auth_headers, params={"family_member_id": member["id"]}).json()
+    assert [(s["medication_name"], [t["time"] for t in s["time_slots"]]) for s in schedules] == [
+        ("Aspirin", ["08:00", "20:00"]),
+        ("Ibuprofen", ["09:30"]),
+    ]
+    assert len([q for q in query_counter if "schedules" in q or "time_slots" in q]) == 2
+
+    query_counter.clear()
+    sparse = client.get(
+        "/api/v1/schedules/",
+        headers=auth_headers,
+        params={"family_member_id": member["id"], "fields": "id,start_date"},
+    ).json()
+    assert sparse == [{"id": s["id"], "start_date": "2026-01-01"} for s in schedules]
+    assert not any("time_slots" in q or "JOIN medications" in q for q in query_counter)
+
+    family = client.get("/api/v1/users/me/family", headers=auth_headers, params={"fields": "name"}).json()
+    assert family == [{"name": "Мама"}]
+
+
+@pytest.mark.integration
+def test_local_download_supports_ranges_and_conditional_requests(
+    client: TestClient, auth_headers: dict[str, str], monkeypatch, tmp_path
+):
+    from app.services import object_storage
+
+    monkeypatch.setattr(object_storage, "_storage", object_storage.LocalFilesystemStorage(tmp_path))
+    med_id = _create_med(client, auth_headers, "Ibuprofen")
+    data = bytes(range(256)) * 4
+    file_id = client.post(
+        f"/api/v1/medications/{med_id}/files",
+        headers=auth_headers,
+        files={"file": ("scan.pdf", data, "application/pdf")},
+    ).json()["id"]
+    url = client.get(f"/api/v1/medications/{med_id}/files/{file_id}/download-url", headers=auth_headers).json()["url"]
+    path = "/api/v1" + url.split("/api/v1", 1)[1]
+
+    full = client.get(path)
+    assert full.status_code == 200 and full.content == data
+    assert full.headers["accept-ranges"] == "bytes" and full.headers["content-length"] == str(len(data))
+    etag, last_modified = full.headers["etag"], full.headers["last-modified"]
+
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    part = client.get(path, headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206 and part.content == data[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+    assert client.get(path, headers={"Range": "bytes=-24"}).content == data[-24:]
+    assert client.get(path, headers={"Range": "bytes=5000-"}).status_code == 416
+    stale = client.get(path, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == data
+
+    multi = client.get(path, headers={"Range": "bytes=0-9,500-509"})
+    assert multi.status_code == 206
+    boundary = multi.headers["content-type"].split("boundary=")[1]
+    assert multi.headers["content-length"] == str(len(multi.content))
+    chunks = [p for p in multi.content.split(f"--{boundary}".encode()) if p.strip(b"\r\n-")]
+    assert [c.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n") for c in chunks] == [data[0:10], data[500:510]]
+    assert b"Content-Range: bytes 500-509/1024" in chunks[1]
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.services.reminder_dispatcher import ReminderDispatcher
+from app.services.sms_gateway import SmsGateway
+
+
+class RecordingGateway(SmsGateway):
+    def __init__(self) -> None:
+        self.messages: list[tuple[str, str]] = []
+
+    async def send(self, phone: str, text: str) -> None:
+        self.messages.append((phone, text))
+
+
+def _create_course(client: TestClient, headers: dict[str, str], name: str, times: list[str], **extra) -> None:
+    med = client.post(
+        "/api/v1/medications/",
+        headers=headers,
+        json={"name": name, "quantity": "30 tabs", "dosage": "500mg"},
+    ).json()
+    res = client.post(
+        "/api/v1/appointments/",
+        headers=headers,
+        json={
+            "medication_id": med["id"],
+            "start_date": "2026-06-01",
+            "end_date": "2026-06-02",
+            "times": times,
+            "period_type": "daily",
+            **extra,
+        },
+    )
+    assert res.status_code == 200, res.text
+
+
+@pytest.mark.integration
+def test_dispatcher_batches_due_doses_per_phone(client: TestClient, auth_headers: dict[str, str], db_engine):
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Mom", "phone": "+79990000000"},
+    ).json()
+    _create_course(client, auth_headers, "Metformin", ["08:00", "20:00"])
+    _create_course(client, auth_headers, "Aspirin", ["08:00"], mode="virtual")
+    _create_course(client, auth_headers, "Insulin", ["08:00"], family_member_id=member["id"])
+
+    gateway = RecordingGateway()
+    dispatcher = ReminderDispatcher(session_factory=lambda: Session(db_engine), gateway=gateway, interval_seconds=60)
+
+    async def run() -> tuple[int, int]:
+        first = await dispatcher.tick(now=datetime(2026, 6, 1, 8, 0))
+        second = await dispatcher.tick(now=datetime(2026, 6, 1, 8, 1))
+        return first, second
+
+    assert asyncio.run(run()) == (2, 0)
+    assert dict(gateway.messages) == {
+        "+79990000000": "Пора принять: 08:00 Insulin",
+        "+7 999 123 45 67": "Пора принять: 08:00 Metformin; 08:00 Aspirin",
+    }
+    metrics = dispatcher.metrics.snapshot()
+    assert (metrics["ticks"], metrics["doses"], metrics["messages"]) == (2, 3, 2)
+
+    client.put("/api/v1/users/me", headers=auth_headers, json={"sms_notifications": False})
+    gateway.messages.clear()
+    assert asyncio.run(dispatcher.tick(now=datetime(2026, 6, 1, 20, 0))) == 0
+
+
+class FlakyGateway(RecordingGateway):
+    """Первая отправка на каждый из failing-телефонов падает."""
+
+    def __init__(self, failing: set[str]) -> None:
+        super().__init__()
+        self.failing = set(failing)
+
+    async def send(self, phone: str, text: str) -> None:
+        if phone in self.failing:
+            self.failing.discard(phone)
+            raise ConnectionError("gateway unavailable")
+        await super().send(phone, text)
+
+
+@pytest.mark.integration
+def test_dispatcher_retries_failed_messages_from_outbox(client: TestClient, auth_headers: dict[str, str], db_engine):
+    member = client.post(
+        "/api/v1/users/me/family",
+        headers=auth_headers,
+        json={"name": "Mom", "phone": "+79990000000"},
+    ).json()
+    _create_course(client, auth_headers, "Metformin", ["08:00"])
+    _create_course(client, auth_headers, "Insulin", ["08:00"], family_member_id=member["id"])
+
+    gateway = FlakyGateway(failing={"+79990000000"})
+    dispatcher = ReminderDispatcher(session_factory=lambda: Session(db_engine), gateway=gateway, interval_seconds=60)
+
+    async def run() -> tuple[int, int]:
+        return await dispatcher.tick(now=datetime(2026, 6, 1, 8, 0)), await dispatcher.tick(now=datetime(2026, 6, 1, 8, 1))
+
+    assert asyncio.run(run()) == (1, 1)
+    # Второй тик: новых доз нет, повторяется только недоставленное сообщение
+    assert gateway.messages == [
+        ("+7 999 123 45 67", "Пора принять: 08:00 Metformin"),
+        ("+79990000000", "Пора принять: 08:00 Insulin"),
+    ]
+    metrics = dispatcher.metrics.snapshot()
+    assert (metrics["messages"], metrics["failed_messages"]) == (2, 1)
+
+
+@pytest.mark.integration
+def test_only_lease_holder_dispatches_and_successor_catches_up(
+    client: TestClient, auth_headers: dict[str, str], db_engine
+):
+    _create_course(client, auth_headers, "Metformin", ["08:00", "08:05"])
+
+    first_gateway, second_gateway = RecordingGateway(), RecordingGateway()
+    first = ReminderDispatcher(session_factory=lambda: Session(db_engine), gateway=first_gateway, interval_seconds=60)
+    second = ReminderDispatcher(session_factory=lambda: Session(db_engine), gateway=second_gateway, interval_seconds=60)
+
+    async def run() -> list[int]:
+        return [
+            await first.tick(now=datetime(2026, 6, 1, 8, 0)),
+            # Второй процесс с тем же окном не рассылает: аренда у первого
+            await second.tick(now=datetime(2026, 6, 1, 8, 0, 30)),
+            await first.tick(now=datetime(2026, 6, 1, 8, 1)),
+            # Первый процесс остановился без release: аренда истекает, второй досылает дозу 08:05
+            await second.tick(now=datetime(2026, 6, 1, 8, 10)),
+        ]
+
+    assert asyncio.run(run()) == [1, 0, 0, 1]
+    assert first_gateway.messages == [("+7 999 123 45 67", "Пора принять: 08:00 Metformin")]
+    assert second_gateway.messages == [("+7 999 123 45 67", "Пора принять: 08:05 Metformin")]
+    assert second.metrics.standby_ticks == 1
+
+    second.release()
+    assert asyncio.run(first.tick(now=datetime(2026, 6, 1, 8, 11))) == 0
+    assert first.metrics.standby_ticks == 0
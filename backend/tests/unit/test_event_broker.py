@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.services.event_broker import RESYNC_EVENT, InProcessEventBroker
+
+
+@pytest.mark.unit
+def test_in_process_broker_delivers_per_user_and_unsubscribes():
+    broker = InProcessEventBroker()
+
+    async def run():
+        async with broker.subscribe(1) as first, broker.subscribe(1) as second, broker.subscribe(2) as other:
+            await broker.publish(1, {"type": "appointment.updated"})
+            received = (await first.next(0.1), await second.next(0.1), await other.next(0.01))
+            assert broker.subscriber_count() == 3
+        await broker.publish(1, {"type": "appointment.deleted"})
+        return received
+
+    assert asyncio.run(run()) == ({"type": "appointment.updated"}, {"type": "appointment.updated"}, None)
+    assert broker.subscriber_count() == 0
+
+
+@pytest.mark.unit
+def test_in_process_broker_replaces_backlog_of_slow_subscriber_with_resync():
+    broker = InProcessEventBroker(max_pending=2)
+
+    async def run():
+        async with broker.subscribe(1) as subscription:
+            for i in range(3):
+                await broker.publish(1, {"type": "appointment.updated", "n": i})
+            return await subscription.next(0.1), await subscription.next(0.01)
+
+    assert asyncio.run(run()) == (RESYNC_EVENT, None)
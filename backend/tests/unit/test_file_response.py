@@ -0,0 +1,24 @@
+import pytest
+
+from app.utils.file_response import MAX_RANGES, parse_range
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-9", [(0, 9)]),
+        ("bytes=-5", [(15, 19)]),
+        ("bytes=5-", [(5, 19)]),
+        ("bytes=10-99", [(10, 19)]),
+        ("bytes=0-2, 1-5,10-12", [(0, 5), (10, 12)]),
+        ("bytes=50-60", []),
+        ("bytes=5-2", None),
+        ("bytes=a-b", None),
+        ("items=0-1", None),
+        (None, None),
+        ("bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES + 1)), None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 20) == expected
@@ -0,0 +1,100 @@
+import io
+
+import pytest
+
+from app.services import object_storage
+from app.services.object_storage import (
+    S3_DELETE_BATCH,
+    LocalFilesystemStorage,
+    ObjectTooLargeError,
+    S3CompatibleStorage,
+)
+
+
+class _RecordingS3Client:
+    def __init__(self):
+        self.calls = []
+        self.parts = []
+        self.objects = {}
+        self.aborted = False
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts.append((PartNumber, Body))
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.objects[Key] = b"".join(body for _, body in self.parts)
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        self.calls.append(keys)
+        return {"Errors": [{"Key": k, "Code": "AccessDenied"} for k in keys if k.endswith("locked")]}
+
+
+def _s3_storage() -> S3CompatibleStorage:
+    storage = S3CompatibleStorage.__new__(S3CompatibleStorage)
+    storage.bucket = "files"
+    storage._client = _RecordingS3Client()
+    return storage
+
+
+@pytest.mark.unit
+def test_s3_delete_objects_batches_keys_and_returns_failures():
+    storage = _s3_storage()
+    keys = [f"k{i}" for i in range(S3_DELETE_BATCH + 5)] + ["k-locked"]
+
+    assert storage.delete_objects(keys) == ["k-locked"]
+    assert [len(batch) for batch in storage._client.calls] == [S3_DELETE_BATCH, 6]
+
+
+@pytest.mark.unit
+def test_local_delete_objects_ignores_missing_and_invalid_keys(tmp_path):
+    storage = LocalFilesystemStorage(tmp_path)
+    for i in range(5):
+        storage.put_object(f"a/{i}", b"x", "image/png")
+
+    assert storage.delete_objects([f"a/{i}" for i in range(5)] + ["a/missing", "../outside"]) == []
+    assert not list((tmp_path / "a").iterdir())
+
+
+@pytest.mark.unit
+def test_s3_put_stream_uses_bounded_multipart_parts(monkeypatch):
+    monkeypatch.setattr(object_storage, "S3_PART_BYTES", 10)
+    monkeypatch.setattr(object_storage, "STREAM_CHUNK_BYTES", 4)
+    storage = _s3_storage()
+    data = bytes(range(25))
+
+    assert storage.put_stream("big", io.BytesIO(data), "application/pdf", max_bytes=100) == 25
+    assert [len(body) for _, body in storage._client.parts] == [10, 10, 5]
+    assert storage._client.objects["big"] == data
+    assert [p["PartNumber"] for p in storage._client.completed] == [1, 2, 3]
+
+    assert storage.put_stream("small", io.BytesIO(b"tiny"), "image/png") == 4
+    assert storage._client.objects["small"] == b"tiny"
+
+    with pytest.raises(ObjectTooLargeError):
+        storage.put_stream("huge", io.BytesIO(bytes(40)), "application/pdf", max_bytes=30)
+    assert storage._client.aborted and "huge" not in storage._client.objects
+
+
+@pytest.mark.unit
+def test_local_put_stream_renames_complete_file_and_discards_oversized(tmp_path, monkeypatch):
+    monkeypatch.setattr(object_storage, "STREAM_CHUNK_BYTES", 3)
+    storage = LocalFilesystemStorage(tmp_path)
+
+    assert storage.put_stream("a/doc", io.BytesIO(b"0123456789"), "application/pdf", max_bytes=10) == 10
+    assert storage.read_bytes("a/doc") == b"0123456789"
+
+    with pytest.raises(ObjectTooLargeError):
+        storage.put_stream("a/big", io.BytesIO(b"01234567890"), "application/pdf", max_bytes=10)
+    assert sorted(p.name for p in (tmp_path / "a").iterdir()) == ["doc"]
@@ -0,0 +1,45 @@
+import pytest
+
+from app.services.response_cache import FileCacheStore, MemoryCacheStore, ResponseCache
+from app.utils.lru import LRUCache
+
+
+@pytest.mark.unit
+def test_file_store_invalidation_is_visible_to_other_workers(tmp_path):
+    first = ResponseCache(FileCacheStore(tmp_path), ttl_seconds=60, local=LRUCache(8))
+    second = ResponseCache(FileCacheStore(tmp_path), ttl_seconds=60, local=LRUCache(8))
+
+    key = first.key("medications.list", {"user": 1}, ["medications:1", "user:1"])
+    first.set(key, b"[1]")
+    assert second.get(second.key("medications.list", {"user": 1}, ["user:1", "medications:1"])) == b"[1]"
+
+    second.invalidate("medications:1")
+    assert first.get(first.key("medications.list", {"user": 1}, ["medications:1", "user:1"])) is None
+    assert (first.hits, first.misses, second.hits, second.invalidations) == (0, 1, 1, 1)
+
+
+@pytest.mark.unit
+def test_evicted_tag_version_does_not_revive_stale_entries():
+    cache = ResponseCache(MemoryCacheStore(max_entries=2), ttl_seconds=0)
+    key = cache.key("users.me", {"user": 1}, ["profile:1"])
+    cache.set(key, b"old")
+    cache.store.set("filler", b"x")  # вытесняет версию тега profile:1
+    cache.store.set("filler2", b"x")
+    assert cache.key("users.me", {"user": 1}, ["profile:1"]) != key
+    assert cache.metrics()["evictions"] >= 1
+
+
+@pytest.mark.unit
+def test_lru_cache_is_bounded_by_total_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.set("a", bytes(40))
+    cache.set("b", bytes(40))
+    cache.set("c", bytes(40))
+    assert cache.get("a") is None and len(cache) == 2 and cache.size_bytes == 80
+    cache.set("huge", bytes(101))
+    assert cache.get("huge") is None and cache.size_bytes == 80
+    cache.set("b", bytes(10))
+    assert cache.size_bytes == 50
+    assert cache.pop("c") == bytes(40) and cache.size_bytes == 10
+    cache.clear()
+    assert cache.size_bytes == 0 and len(cache) == 0